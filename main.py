@@ -13,21 +13,46 @@ def setup_results_folder():
     
     return results_dir  # Return path for use in other functions
 
-def zip_results(results_dir):
-    """Create a zip archive of the results folder for easy download or sharing."""
+# Outputs that are already compressed (or are archives of them); DEFLATE
+# only burns CPU on these, so they are stored as-is in the results zip.
+STORED_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.tar'}
+
+# Output folders under results/ that an archived run ships selectively.
+OUTPUT_FOLDERS = ("output_images", "output_shards")
+
+def zip_results(results_dir, archive_dirs=None):
+    """Create a zip archive of the results folder for easy download or sharing.
+    
+    With archive_dirs (the shard folders of an archived run), the outputs
+    are shipped as those tar shards plus their index.json, and the
+    per-image output_images folder and older shard folders are left out.
+    """
     import zipfile
     
     zip_filename = "results.zip"
     
     try:
+        if archive_dirs is None:
+            sources = [results_dir]
+            skipped = ()
+        else:
+            sources = [results_dir] + sorted(set(archive_dirs))
+            skipped = tuple(os.path.join(results_dir, folder) for folder in OUTPUT_FOLDERS)
+        
         # Walk through all files in the results directory and add them to the zip
         with zipfile.ZipFile(zip_filename, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for root, dirs, files in os.walk(results_dir):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    # Store relative paths in zip to preserve folder structure
-                    arcname = os.path.relpath(file_path, ".")
-                    zipf.write(file_path, arcname)
+            for source in sources:
+                for root, dirs, files in os.walk(source):
+                    if source == results_dir and root in skipped:
+                        dirs[:] = []  # Outputs come from archive_dirs instead
+                        continue
+                    for file in files:
+                        file_path = os.path.join(root, file)
+                        # Store relative paths in zip to preserve folder structure
+                        arcname = os.path.relpath(file_path, ".")
+                        stored = os.path.splitext(file)[1].lower() in STORED_EXTENSIONS
+                        zipf.write(file_path, arcname,
+                                   compress_type=zipfile.ZIP_STORED if stored else None)
         
         print(f"Results zip saved to: {zip_filename}")
         return zip_filename
@@ -37,7 +62,7 @@ def zip_results(results_dir):
         print(f"Failed to create zip: {e}")
         return None
 
-def save_json_results(mp_results, futures_results):
+def save_json_results(mp_results, futures_results, threads_results=None):
     """Save performance results as JSON files for analysis."""
     import json
     
@@ -56,9 +81,35 @@ def save_json_results(mp_results, futures_results):
     
     print(f"JSON results saved to: {mp_path}")
     print(f"JSON results saved to: {futures_path}")
+    
+    # Save thread pool results when that backend was run
+    if threads_results is not None:
+        threads_path = os.path.join("results", "performance_data", "threads_results.json")
+        with open(threads_path, 'w') as f:
+            json.dump(threads_results, f, indent=2)
+        print(f"JSON results saved to: {threads_path}")
 
-def run_all():
-    """Run the complete parallel image processing pipeline."""
+def run_all(filters=None, streaming=False, use_cache=False, repetitions=5, warmup=1,
+            preview_scales=(), archive=False, num_images=None, profile=False):
+    """Run the complete parallel image processing pipeline.
+    
+    filters optionally restricts the job to a subset of the five outputs,
+    e.g. ['gray', 'edges']; all filters run when it is None.
+    streaming=True runs both implementations as a three-stage
+    read/filter/write pipeline that overlaps disk I/O with compute.
+    use_cache=True reuses outputs of unchanged images from earlier runs via
+    the on-disk result cache; keep it off for benchmark numbers.
+    repetitions and warmup set how often each configuration is measured
+    and how many initial rounds are discarded.
+    preview_scales (e.g. (4,)) also benchmarks reduced-resolution decoding
+    at those scales and reports its throughput gain over full resolution.
+    archive=True writes the outputs as tar shards with an index instead of
+    one file per output, and the results zip ships those shards.
+    Every configuration runs on the same frozen copy of the dataset (or
+    of its first num_images images), see benchmark.prepare_input_set.
+    profile=True records per-stage timings in every run and plots where
+    the time per image goes (results/stage_breakdown.png).
+    """
     print("=" * 60)
     print("PARALLEL IMAGE PROCESSING")
     print("=" * 60)
@@ -73,40 +124,59 @@ def run_all():
     
     # Step 0.6: Add src folder to path to import custom modules
     sys.path.append('src')
-    from multiprocessing_impl import run_multiprocessing_experiment  # CPU-bound parallel implementation
-    from concurrent_futures_impl import run_futures_experiment       # Alternative parallel implementation using futures
-    from performance_analysis import plot_comparison                 # Analysis and plotting module
+    from benchmark import run_benchmark, backend_configs  # Repeated, randomized runs of every backend
+    from performance_analysis import plot_comparison, plot_stage_breakdown  # Analysis and plotting module
     
-    # ---------------- STEP 1: Multiprocessing Implementation ---------------- #
+    # ---------------- STEP 1-2: Benchmark all implementations ---------------- #
     print("\n" + "=" * 60)
-    print("STEP 1: Running Multiprocessing Implementation")
+    print("STEP 1-2: Benchmarking Multiprocessing, Concurrent.Futures and Thread Pool")
     print("=" * 60)
-    mp_results = run_multiprocessing_experiment("food101_subset")
-    # mp_results contains execution times for different numbers of processes
-    
-    # ---------------- STEP 2: Concurrent.Futures Implementation ---------------- #
-    print("\n" + "=" * 60)
-    print("STEP 2: Running Concurrent.Futures Implementation")
-    print("=" * 60)
-    futures_results = run_futures_experiment("food101_subset")
-    # futures_results contains execution times for different numbers of workers
+    # Every (backend, worker count) pair runs warmup + repetitions times in a
+    # shuffled order; reported times are medians with confidence intervals.
+    # The input is frozen into .cache/bench_input and warmed before the first run.
+    configs = backend_configs(filters=filters, streaming=streaming, use_cache=use_cache,
+                              preview_scales=preview_scales, archive=archive, profile=profile)
+    benchmark_results = run_benchmark("food101_subset", configs, repetitions=repetitions,
+                                      warmup=warmup, num_images=num_images)
+    mp_results = benchmark_results['Multiprocessing']
+    futures_results = benchmark_results['Concurrent.Futures']
+    threads_results = benchmark_results['Threads']
     
     # ---------------- STEP 3: Performance Analysis ---------------- #
     print("\n" + "=" * 60)
     print("STEP 3: Performance Analysis")
     print("=" * 60)
     # Generate plots and tables comparing execution time, speedup, and efficiency
-    plot_comparison(mp_results, futures_results)
+    plot_comparison(mp_results, futures_results, threads_results)
+    if profile:
+        # Decode, filter, encode and write time per image of every profiled run
+        plot_stage_breakdown(mp_results, futures_results, threads_results)
     
     # Save results as JSON files
-    save_json_results(mp_results, futures_results)
+    save_json_results(mp_results, futures_results, threads_results)
+    
+    # Append this session to the run history; compare it against an earlier
+    # one with `python src/run_store.py compare`
+    from run_store import RunStore
+    with RunStore() as store:
+        session = store.new_session()
+        for backend, backend_results in benchmark_results.items():
+            store.record_results(backend, backend_results, session)
+    print(f"Run history session: {session}")
     
     # ---------------- STEP 4: Create downloadable zip ---------------- #
     print("\n" + "=" * 60)
     print("STEP 4: Download Files")
     print("=" * 60)
-    # Create a zip of results folder for easy sharing
-    zip_results(results_dir)
+    # Create a zip of results folder for easy sharing; an archived run ships
+    # the shards of each configuration's last measured run
+    archive_dirs = None
+    if archive:
+        archive_dirs = [result['archive']['archive_dir']
+                        for backend_results in benchmark_results.values()
+                        for result in backend_results.values()
+                        if result.get('archive')]
+    zip_results(results_dir, archive_dirs)
     
     # ---------------- Pipeline Complete ---------------- #
     print("\n" + "=" * 60)
@@ -116,6 +186,7 @@ def run_all():
     print("results/")  # Top-level folder
     print("├── performance_comparison.png        # Performance graphs")
     print("├── performance_data/                 # JSON results from experiments")
+    print("├── run_history.sqlite                # Every recorded run, for regression checks")
     print("└── output_images/                    # All processed images generated by pipeline")
 
 if __name__ == "__main__":
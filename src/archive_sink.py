@@ -0,0 +1,92 @@
+import os
+import json
+import time
+import tarfile
+import threading
+
+# Per-run folders of tar shards that filter outputs are streamed into.
+ARCHIVE_ROOT = os.path.join("results", "output_shards")
+INDEX_NAME = "index.json"
+
+# Tar stores members in 512-byte blocks and ends with two empty blocks.
+BLOCK_SIZE = tarfile.BLOCKSIZE
+END_OF_ARCHIVE = b"\0" * (2 * BLOCK_SIZE)
+
+def new_archive_dir(root=ARCHIVE_ROOT):
+    """Create an empty folder for one run's archive shards"""
+    archive_dir = os.path.join(root, f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{time.perf_counter_ns()}")
+    os.makedirs(archive_dir)
+    return archive_dir
+
+def shard_path(archive_dir):
+    """Shard owned by the calling worker (process and thread), so no locking is needed"""
+    return os.path.join(archive_dir, f"shard-{os.getpid()}-{threading.get_native_id()}.tar")
+
+def tar_blocks(members):
+    """Tar header and padded data blocks of (name, data) members, without the end marker"""
+    mtime = time.time()
+    chunks = []
+    for name, data in members:
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = mtime
+        info.mode = 0o644
+        chunks.append(info.tobuf(format=tarfile.PAX_FORMAT))
+        chunks.append(data)
+        # Pad the data to a whole block.
+        chunks.append(b"\0" * (-len(data) % BLOCK_SIZE))
+    return b"".join(chunks)
+
+def append_members(archive_dir, members):
+    """
+    Append (name, data) members to the calling worker's tar shard
+
+    Members are written as raw tar blocks to a file opened in append mode
+    and closed again, like the stage profile files, so a terminated pool
+    loses nothing already written; finalize_archive adds the end-of-archive
+    marker once every worker is done. Returns the bytes appended.
+    """
+    payload = tar_blocks(members)
+    with open(shard_path(archive_dir), 'ab') as f:
+        f.write(payload)
+    return len(payload)
+
+def finalize_archive(archive_dir):
+    """
+    Close every shard of a finished run and write the member index
+
+    The index (index.json in archive_dir) maps each member name to its
+    shard, data offset and size, so single outputs can be read with one
+    seek (see read_member) without scanning the tar files. Only headers
+    are read here; member data is skipped over.
+    Returns a summary with the shard count, member count and total bytes.
+    """
+    index = {}
+    shards = sorted(name for name in os.listdir(archive_dir) if name.endswith(".tar"))
+    total_bytes = 0
+    for shard in shards:
+        path = os.path.join(archive_dir, shard)
+        with open(path, 'ab') as f:
+            f.write(END_OF_ARCHIVE)
+        with tarfile.open(path, 'r:') as tar:
+            for member in tar:
+                index[member.name] = {'shard': shard, 'offset': member.offset_data,
+                                      'size': member.size}
+                total_bytes += member.size
+
+    with open(os.path.join(archive_dir, INDEX_NAME), 'w') as f:
+        json.dump(index, f)
+    return {'archive_dir': archive_dir, 'shards': len(shards), 'members': len(index),
+            'bytes': total_bytes}
+
+def load_index(archive_dir):
+    """Read the member index written by finalize_archive"""
+    with open(os.path.join(archive_dir, INDEX_NAME), 'r') as f:
+        return json.load(f)
+
+def read_member(archive_dir, name, index=None):
+    """Return the bytes of one archived output, e.g. 'apple_pie_1_gray.jpg'"""
+    entry = (index if index is not None else load_index(archive_dir))[name]
+    with open(os.path.join(archive_dir, entry['shard']), 'rb') as f:
+        f.seek(entry['offset'])
+        return f.read(entry['size'])
@@ -0,0 +1,153 @@
+import time
+import itertools
+import concurrent.futures
+
+class AutoTuner:
+    # Picks the number of concurrent tasks (active workers) and the batch
+    # size at runtime from measured throughput. The pool itself keeps
+    # max_workers processes; using fewer workers simply means keeping fewer
+    # batches in flight, so no process is ever restarted.
+    #
+    # Probe: with the middle batch size, worker counts are tried in
+    # increasing order until one fails to beat the best so far by min_gain;
+    # then the other batch sizes are tried with the best worker count. A
+    # larger setting is adopted only if it is min_gain faster.
+    # Settled: throughput is measured over consecutive windows; the first
+    # window sets a baseline and a window that differs from it by more than
+    # drift_threshold (e.g. other workloads started sharing the host)
+    # starts a new probe.
+
+    def __init__(self, max_workers, batch_sizes=(1, 4, 16), trial_images=32,
+                 window_images=256, min_gain=0.05, drift_threshold=0.25):
+        self.worker_counts = sorted({2 ** i for i in range(max_workers.bit_length())
+                                     if 2 ** i < max_workers} | {max_workers})
+        self.batch_sizes = sorted(batch_sizes)
+        self.trial_images = trial_images
+        self.window_images = window_images
+        self.min_gain = min_gain
+        self.drift_threshold = drift_threshold
+
+        self.phase = 'probe'
+        self.retunes = 0
+        # (phase, workers, batch_size, images per second) of every measurement
+        self.history = []
+        self.baseline = None
+        self._search = self._probe()
+        self.workers, self.batch_size = next(self._search)
+        # Tasks are tagged with the epoch they were submitted in; only tasks
+        # of the current epoch count towards its measurement.
+        self.epoch = 0
+        # True while tasks of an earlier setting drain before a trial starts.
+        self.switching = True
+        self._start_time = None
+        self._images = 0
+
+    def _probe(self):
+        """Generator: yields (workers, batch_size) trials and is sent their throughput"""
+        batch_size = self.batch_sizes[len(self.batch_sizes) // 2]
+        best = None
+        for workers in self.worker_counts:
+            rate = yield workers, batch_size
+            if best is not None and rate < best[0] * (1 + self.min_gain):
+                break
+            best = (rate, workers, batch_size)
+        for batch_size in self.batch_sizes:
+            if batch_size == best[2]:
+                continue
+            rate = yield best[1], batch_size
+            if rate >= best[0] * (1 + self.min_gain):
+                best = (rate, best[1], batch_size)
+        return best
+
+    def start(self):
+        """Begin measuring the current setting (called once no older tasks are pending)"""
+        self.switching = False
+        self._start_time = time.perf_counter()
+        self._images = 0
+
+    def _measured_images(self):
+        if self.phase == 'probe':
+            # Every worker should see a couple of batches per trial.
+            return max(self.trial_images, 2 * self.workers * self.batch_size)
+        return max(self.window_images, 4 * self.workers * self.batch_size)
+
+    def _switch(self, workers, batch_size):
+        if (workers, batch_size) == (self.workers, self.batch_size):
+            self.start()
+            return
+        self.workers, self.batch_size = workers, batch_size
+        self.epoch += 1
+        self.switching = True
+
+    def completed(self, epoch, num_images):
+        """Account for a finished task of num_images submitted in epoch"""
+        if self.switching or epoch != self.epoch:
+            return
+        self._images += num_images
+        if self._images < self._measured_images():
+            return
+        rate = self._images / (time.perf_counter() - self._start_time)
+        self.history.append((self.phase, self.workers, self.batch_size, rate))
+
+        if self.phase == 'probe':
+            try:
+                self._switch(*self._search.send(rate))
+            except StopIteration as stop:
+                _, workers, batch_size = stop.value
+                print(f"Auto-tune: settled on {workers} workers, batch size {batch_size}")
+                self.phase = 'settled'
+                self.baseline = None
+                self._switch(workers, batch_size)
+        elif self.baseline is None:
+            self.baseline = rate
+            self.start()
+        elif abs(rate / self.baseline - 1) > self.drift_threshold:
+            print(f"Auto-tune: throughput drifted from {self.baseline:.1f} to {rate:.1f} "
+                  f"images/s, re-tuning")
+            self.retunes += 1
+            self.phase = 'probe'
+            self._search = self._probe()
+            self._switch(*next(self._search))
+        else:
+            self.start()
+
+    def summary(self):
+        """Final setting, number of re-tunes and every measurement"""
+        return {
+            'workers': self.workers,
+            'batch_size': self.batch_size,
+            'retunes': self.retunes,
+            'history': [{'phase': phase, 'workers': workers, 'batch_size': batch_size,
+                         'images_per_sec': rate}
+                        for phase, workers, batch_size, rate in self.history],
+        }
+
+def submit_adaptive(submit, func, image_paths, tuner, *args, **kwargs):
+    """
+    Submit func(batch, *args, **kwargs) over image_paths as the tuner directs
+
+    submit is an executor's submit method (see streaming_pipeline.pool_submitter
+    for a multiprocessing.Pool). Batches of tuner.batch_size paths are kept
+    tuner.workers deep in flight; when the tuner switches setting, submission
+    pauses until older tasks drain so each trial is measured on its own.
+    Yields (batch, future) pairs in completion order.
+    """
+    image_paths = iter(image_paths)
+    pending = {}
+    exhausted = False
+    while True:
+        if tuner.switching and not pending:
+            tuner.start()
+        while not exhausted and not tuner.switching and len(pending) < tuner.workers:
+            batch = list(itertools.islice(image_paths, tuner.batch_size))
+            if not batch:
+                exhausted = True
+                break
+            pending[submit(func, batch, *args, **kwargs)] = (tuner.epoch, batch)
+        if not pending:
+            return
+        done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+        for future in done:
+            epoch, batch = pending.pop(future)
+            tuner.completed(epoch, len(batch))
+            yield batch, future
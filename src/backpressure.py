@@ -0,0 +1,59 @@
+import threading
+import concurrent.futures
+
+# Marker returned by next() once the task iterator is used up.
+_EXHAUSTED = object()
+
+def bounded(iterable, semaphore, cancelled):
+    """
+    Yield items only while the semaphore has free slots
+    The consumer releases one slot per finished task. cancelled (an Event)
+    stops the generator so a blocked pool feeder thread can exit.
+    """
+    for item in iterable:
+        while not semaphore.acquire(timeout=0.1):
+            if cancelled.is_set():
+                return
+        yield item
+
+def imap_bounded(pool, func, tasks, max_in_flight):
+    """
+    pool.imap_unordered with at most max_in_flight tasks submitted at once
+
+    imap_unordered on its own drains the whole task iterable into the pool's
+    queue; gating the iterable with a semaphore keeps parent memory bounded.
+    Yields results as they complete.
+    """
+    semaphore = threading.Semaphore(max_in_flight)
+    cancelled = threading.Event()
+    try:
+        for result in pool.imap_unordered(func, bounded(tasks, semaphore, cancelled)):
+            semaphore.release()
+            yield result
+    finally:
+        cancelled.set()
+
+def submit_bounded(submit, func, tasks, max_in_flight, *args, **kwargs):
+    """
+    Submit func(task, *args, **kwargs) for each task with a bounded window
+
+    submit is an executor's submit method. At most max_in_flight futures are
+    outstanding; each completion refills the window. Yields (task, future)
+    pairs in completion order.
+    """
+    tasks = iter(tasks)
+    pending = {}
+
+    def refill():
+        while len(pending) < max_in_flight:
+            task = next(tasks, _EXHAUSTED)
+            if task is _EXHAUSTED:
+                return
+            pending[submit(func, task, *args, **kwargs)] = task
+
+    refill()
+    while pending:
+        done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+        for future in done:
+            yield pending.pop(future), future
+        refill()
@@ -0,0 +1,116 @@
+import itertools
+import math
+import os
+import time
+from image_filters import ImageProcessor, resolve_filters, filter_graph, check_point_ops
+from output_codecs import DEFAULT_CODEC
+
+def make_batches(image_paths, batch_size):
+    """Split a list of image paths into consecutive batches of batch_size"""
+    return [image_paths[i:i + batch_size] for i in range(0, len(image_paths), batch_size)]
+
+def iter_batches(image_paths, batch_size):
+    """Group any iterable of paths into lists of batch_size without materialising it"""
+    batch = []
+    for image_path in image_paths:
+        batch.append(image_path)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def peek_first(image_paths):
+    """
+    Return (first_path, paths) without losing the first item of an iterator
+    first_path is None when there are no paths; lists are returned unchanged.
+    """
+    if isinstance(image_paths, list):
+        return (image_paths[0] if image_paths else None), image_paths
+    image_paths = iter(image_paths)
+    first_path = next(image_paths, None)
+    if first_path is None:
+        return None, image_paths
+    return first_path, itertools.chain([first_path], image_paths)
+
+def noop_task(_):
+    """Empty task used to measure the cost of dispatching work to a pool"""
+    # Returning the PID forces a real round trip through the result queue.
+    return os.getpid()
+
+def measure_image_time(image_path, filters=None, filter_options=None):
+    """
+    Time one image in the current process as the run will process it
+    filter_options are the run's per-image options; preview_scale,
+    edge_precision, point_ops, tile_threshold and codecs shape the decode,
+    filter and encode work that is timed. Nothing is written, profiled or
+    traced.
+    """
+    options = filter_options or {}
+    filters = resolve_filters(filters)
+    graph = filter_graph(options.get('edge_precision'), check_point_ops(options.get('point_ops')))
+    codecs = options.get('codecs') or {}
+
+    start_time = time.perf_counter()
+    img = ImageProcessor.load_image(image_path, options.get('preview_scale'))
+    if img is None:
+        raise ValueError(f"Could not decode image: {image_path}")
+    outputs = ImageProcessor.run_filters(img, filters, options.get('tile_threshold'), graph=graph)
+    for name, result in outputs.items():
+        codec = codecs.get(name, DEFAULT_CODEC)
+        if codec.writes:
+            codec.encode(result)
+    return time.perf_counter() - start_time
+
+def choose_batch_size(task_overhead, image_time, num_images, num_workers,
+                      target_overhead=0.05, min_batches_per_worker=4):
+    """
+    Pick a batch size from measured per-task overhead and per-image cost
+
+    The batch is made large enough that dispatch overhead stays below
+    target_overhead of the batch's compute time, but small enough that every
+    worker still receives min_batches_per_worker batches for load balancing.
+    """
+    if num_images == 0:
+        return 1
+
+    # Smallest batch whose compute time amortises the fixed per-task cost.
+    if image_time > 0:
+        batch_size = math.ceil(task_overhead / (target_overhead * image_time))
+    else:
+        batch_size = num_images or 1
+
+    # Never make batches so large that some workers sit idle at the end.
+    # num_images is None when paths are streamed and the total is unknown.
+    if num_images is not None:
+        batch_size = min(batch_size, math.ceil(num_images / (num_workers * min_batches_per_worker)))
+    return max(1, batch_size)
+
+def auto_batch_size(run_noop_tasks, sample_path, num_images, num_workers, filters=None,
+                    filter_options=None):
+    """
+    Measure dispatch overhead with a pool and choose a batch size for it
+
+    run_noop_tasks(n) must push n noop_task calls through the pool one task
+    at a time and wait for them; its wall time gives the per-task overhead.
+    sample_path is timed with the run's filter_options to estimate per-image
+    cost (see measure_image_time); num_images may be None when the dataset
+    is streamed.
+    """
+    if sample_path is None:
+        return 1
+
+    # Per-task overhead seen by each worker: the pool runs num_workers
+    # tasks concurrently, so scale the wall time per task accordingly.
+    num_probe_tasks = num_workers * 16
+    start_time = time.perf_counter()
+    run_noop_tasks(num_probe_tasks)
+    task_overhead = (time.perf_counter() - start_time) * num_workers / num_probe_tasks
+
+    # Estimate the compute cost of one image from a sample image of the dataset.
+    image_time = measure_image_time(sample_path, filters, filter_options)
+
+    batch_size = choose_batch_size(task_overhead, image_time, num_images, num_workers)
+    print(f"Auto batch size: {batch_size} "
+          f"(task overhead {task_overhead * 1000:.2f} ms, image time {image_time * 1000:.2f} ms)")
+    return batch_size
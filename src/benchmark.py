@@ -0,0 +1,240 @@
+import io
+import os
+import sys
+import json
+import random
+import shutil
+import hashlib
+import contextlib
+import numpy as np
+from pathlib import Path
+from dataset_index import index_images
+from input_shards import read_source_bytes
+
+# Frozen copies of benchmark input subsets, one folder per (dataset, size).
+DEFAULT_INPUT_DIR = os.path.join(".cache", "bench_input")
+
+# Backend labels match performance_analysis.BACKEND_LABELS so plots line up.
+BACKENDS = ('Multiprocessing', 'Concurrent.Futures', 'Threads')
+
+def prepare_input_set(image_folder, num_images=None, input_dir=DEFAULT_INPUT_DIR, freeze=True):
+    """
+    Fix the benchmark input and pull it into the OS page cache
+
+    The images (the first num_images paths in sorted order, or all of them)
+    are copied once into input_dir and reused by later benchmarks of the
+    same set, so every run sees exactly the same files even if the dataset
+    folder changes. freeze=False benchmarks the folder in place instead.
+    Every file is then read once, so the first configuration does not pay
+    for cold disk reads that later ones skip.
+    Returns the folder to benchmark.
+    """
+    if freeze:
+        paths = sorted(index_images(image_folder))[:num_images]
+        # The set is identified by its source paths, so adding or removing
+        # images makes a new frozen copy.
+        set_key = "\n".join([os.path.abspath(image_folder)] + paths)
+        set_id = hashlib.sha1(set_key.encode()).hexdigest()[:16]
+        target = os.path.join(input_dir, set_id)
+        if not os.path.isdir(target):
+            tmp_dir = f"{target}.tmp"
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            os.makedirs(tmp_dir)
+            for i, path in enumerate(paths):
+                # The index prefix keeps names unique across dataset subfolders.
+                # Images of a packed dataset are unpacked into plain files.
+                with open(os.path.join(tmp_dir, f"{i:06d}_{os.path.basename(path)}"), 'wb') as f:
+                    f.write(read_source_bytes(path))
+            os.replace(tmp_dir, target)
+        image_folder = target
+
+    total_bytes = 0
+    image_paths = index_images(image_folder)
+    for path in image_paths:
+        # bytes() also pulls in every page of a memory-mapped packed image.
+        total_bytes += len(bytes(read_source_bytes(path)))
+    print(f"Input set: {image_folder} ({len(image_paths)} images, "
+          f"{total_bytes / 1024**2:.1f} MB warmed)")
+    return image_folder
+
+def bootstrap_ci(samples, confidence=0.95, resamples=10000, seed=0):
+    """Percentile bootstrap confidence interval for the median of samples"""
+    samples = np.asarray(samples, dtype=float)
+    if len(samples) == 0:
+        return 0.0, 0.0
+    if len(samples) == 1:
+        return float(samples[0]), float(samples[0])
+    rng = np.random.default_rng(seed)
+    medians = np.median(rng.choice(samples, size=(resamples, len(samples))), axis=1)
+    alpha = (1 - confidence) / 2
+    low, high = np.quantile(medians, [alpha, 1 - alpha])
+    return float(low), float(high)
+
+def summarize(samples, confidence=0.95):
+    """Median, spread and a bootstrap confidence interval of repeated timings"""
+    samples = np.asarray(samples, dtype=float)
+    ci_low, ci_high = bootstrap_ci(samples, confidence)
+    return {
+        'n': len(samples),
+        'median': float(np.median(samples)),
+        'mean': float(np.mean(samples)),
+        'stdev': float(np.std(samples, ddof=1)) if len(samples) > 1 else 0.0,
+        'min': float(np.min(samples)),
+        'max': float(np.max(samples)),
+        'confidence': confidence,
+        'ci_low': ci_low,
+        'ci_high': ci_high,
+        'samples': samples.tolist(),
+    }
+
+def preview_label(label, preview_scale):
+    """Benchmark label of a backend run in preview mode, e.g. 'Threads 1/4'"""
+    return f"{label} 1/{preview_scale}"
+
+def backend_configs(worker_counts=None, backends=BACKENDS, preview_scales=(), archive=False,
+                    **pipeline_options):
+    """
+    Benchmark configurations for every backend and worker count
+    Each scale in preview_scales (2, 4 or 8) adds the same configurations
+    with reduced-resolution decoding, labelled e.g. 'Threads 1/4', so the
+    summary can report the throughput gain over full resolution.
+    archive=True streams every run's outputs into tar shards (see
+    archive_sink) instead of one file per output.
+    Returns (label, num_workers, pipeline, options) tuples for run_benchmark.
+    """
+    from multiprocessing_impl import multiprocessing_pipeline
+    from concurrent_futures_impl import futures_pipeline
+    from threading_impl import threads_pipeline
+
+    pipelines = dict(zip(BACKENDS, (multiprocessing_pipeline, futures_pipeline, threads_pipeline)))
+    if archive:
+        pipeline_options = dict(pipeline_options, archive=True)
+    if worker_counts is None:
+        worker_counts = [1, 2, 4, 8]
+    configs = [(label, num_workers, pipelines[label], pipeline_options)
+               for label in backends for num_workers in worker_counts]
+    for scale in preview_scales:
+        configs += [(preview_label(label, scale), num_workers, pipelines[label],
+                     dict(pipeline_options, preview_scale=scale))
+                    for label in backends for num_workers in worker_counts]
+    return configs
+
+def run_benchmark(image_folder, configs, repetitions=5, warmup=1, seed=0, num_images=None,
+                  confidence=0.95, verbose=False):
+    """
+    Run every configuration repeatedly and summarise the timings
+
+    configs come from backend_configs. The input set is frozen and warmed
+    first (see prepare_input_set). Each round runs every configuration once
+    in a freshly shuffled order, so drift (thermal throttling, background
+    load, cache state) is spread over all configurations instead of
+    penalising whichever runs first. The first warmup rounds are discarded.
+
+    Returns {label: {num_workers: result}} in the pipelines' result schema,
+    with total_time and startup_time replaced by their medians and the full
+    samples and confidence intervals under total_time_stats and
+    startup_time_stats, and the number of failed images over all measured
+    runs under failed_images. Pipeline output is suppressed unless verbose
+    or a run had failures.
+    """
+    image_folder = prepare_input_set(image_folder, num_images)
+    rng = random.Random(seed)
+
+    samples = {(label, n): {'total_time': [], 'startup_time': []} for label, n, _, _ in configs}
+    failures = {(label, n): 0 for label, n, _, _ in configs}
+    last_results = {}
+    rounds = [('warmup', r) for r in range(warmup)] + [('run', r) for r in range(repetitions)]
+
+    for phase, r in rounds:
+        order = list(configs)
+        rng.shuffle(order)
+        for label, num_workers, pipeline, options in order:
+            print(f"[{phase} {r + 1}] {label} with {num_workers} workers")
+            captured = io.StringIO()
+            output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(captured)
+            try:
+                with output:
+                    result = pipeline(image_folder, num_workers, **options)
+            except BaseException:
+                sys.stdout.write(captured.getvalue())
+                raise
+            # Pipelines record an image that failed as a timing of 0; show
+            # the run's own output so the errors are not hidden.
+            failed = result['time_stats'].get('failed', 0)
+            if failed:
+                sys.stdout.write(captured.getvalue())
+                print(f"[{phase} {r + 1}] {label} with {num_workers} workers: {failed} images failed")
+            if phase == 'run':
+                failures[(label, num_workers)] += failed
+                for key in ('total_time', 'startup_time'):
+                    samples[(label, num_workers)][key].append(result[key])
+                last_results[(label, num_workers)] = result
+
+    # Report in configuration order (not the shuffled run order) so backends
+    # keep their colours and table columns in performance_analysis.
+    results = {}
+    for label, num_workers, _, _ in configs:
+        result = last_results[(label, num_workers)]
+        total = summarize(samples[(label, num_workers)]['total_time'], confidence)
+        startup = summarize(samples[(label, num_workers)]['startup_time'], confidence)
+        results.setdefault(label, {})[num_workers] = dict(
+            result,
+            total_time=total['median'],
+            startup_time=startup['median'],
+            total_time_stats=total,
+            startup_time_stats=startup,
+            failed_images=failures[(label, num_workers)],
+            repetitions=repetitions,
+            warmup=warmup,
+        )
+
+    print_summary(results)
+    return results
+
+def throughput(result):
+    """Images per second of a benchmark result (median time)"""
+    return result['num_images'] / result['total_time'] if result['total_time'] > 0 else 0
+
+def print_summary(results):
+    """
+    Print medians with confidence intervals for every configuration
+    Preview runs also show their throughput gain over the same backend and
+    worker count at full resolution, when that was benchmarked too.
+    """
+    print("\nBENCHMARK SUMMARY (median, confidence interval)")
+    print(f"{'Backend':<24} {'Workers':<8} {'Time (s)':<10} {'CI (s)':<18} "
+          f"{'Startup (s)':<12} {'Images/s':<10} {'Failed':<8} {'vs full res':<10}")
+    for label, backend_results in results.items():
+        for num_workers, result in sorted(backend_results.items()):
+            stats = result['total_time_stats']
+            ci = f"[{stats['ci_low']:.2f}, {stats['ci_high']:.2f}]"
+            gain = ""
+            scale = result.get('preview_scale')
+            if scale is not None:
+                suffix = f" 1/{scale}"
+                base = results.get(label[:-len(suffix)] if label.endswith(suffix) else None, {})
+                base = base.get(num_workers)
+                if base is not None and throughput(base) > 0:
+                    gain = f"{throughput(result) / throughput(base):.2f}x"
+            print(f"{label:<24} {num_workers:<8} {result['total_time']:<10.2f} {ci:<18} "
+                  f"{result['startup_time']:<12.3f} {throughput(result):<10.2f} "
+                  f"{result.get('failed_images', 0):<8} {gain:<10}")
+
+if __name__ == "__main__":
+    # Entry point for a standalone benchmark of all three backends.
+    import argparse
+    parser = argparse.ArgumentParser(description="Benchmark every backend and worker count")
+    parser.add_argument('--preview-scales', type=int, nargs='*', default=[],
+                        help="also benchmark reduced-resolution decoding at these scales (2, 4, 8)")
+    args = parser.parse_args()
+    dataset_path = "food101_subset"
+
+    if os.path.exists(dataset_path):
+        results = run_benchmark(dataset_path, backend_configs(preview_scales=args.preview_scales))
+
+        Path("results/performance_data").mkdir(parents=True, exist_ok=True)
+        with open('results/performance_data/benchmark_results.json', 'w') as f:
+            json.dump(results, f, indent=2)
+        print("Results saved to: results/performance_data/benchmark_results.json")
+    else:
+        print(f"Dataset path '{dataset_path}' not found!")
@@ -0,0 +1,431 @@
+import io
+import os
+import sys
+import glob
+import time
+import argparse
+import tempfile
+import contextlib
+import cv2
+import numpy as np
+from PIL import Image
+from image_filters import (ImageProcessor, DEFAULT_GRAPH, FILTER_NAMES, PATH_FILTERS,
+                           EDGE_PRECISIONS)
+
+# Runnable checks of the filters and pipelines, kept out of the modules
+# that worker processes import. Each check prints its findings and returns
+# an exit status: python src/checks.py <check> [dataset]
+
+# Brightness factors compared with PIL: darkening and brightening, on both
+# sides of the default, since float rounding differences depend on the factor.
+CONFORMANCE_FACTORS = (0.5, 0.7, 1.3, 1.5, 2.0)
+
+def check_pil_conformance(image_path, factors=CONFORMANCE_FACTORS):
+    """
+    Compare the OpenCV sharpening and brightness filters with the PIL ones
+    Returns the maximum absolute pixel difference for sharpening and for
+    brightness at each factor (keyed e.g. 'brightened x0.7')
+    """
+    img = ImageProcessor.load_image(image_path)
+    if img is None:
+        raise ValueError(f"Could not decode image: {image_path}")
+
+    # The PIL reference filters return RGB, so compare in RGB order.
+    def to_rgb(arr):
+        return cv2.cvtColor(arr, cv2.COLOR_BGR2RGB).astype(np.int16)
+
+    pil_sharpened = ImageProcessor.apply_sharpening(image_path).astype(np.int16)
+    diffs = {'sharpened': int(np.abs(to_rgb(ImageProcessor.sharpening_from_array(img)) - pil_sharpened).max())}
+    for factor in factors:
+        pil_brightened = ImageProcessor.apply_brightness_adjustment(image_path, factor).astype(np.int16)
+        brightened = to_rgb(ImageProcessor.brightness_from_array(img, factor))
+        diffs[f'brightened x{factor:g}'] = int(np.abs(brightened - pil_brightened).max())
+    return diffs
+
+
+def check_decode_once(image_path):
+    """
+    Compare the decode-once graph outputs with the original path-based filters
+    Returns the maximum and mean absolute difference and the fraction of
+    differing pixels for each filter. Only edges is expected to differ (see
+    apply_all_filters); the PIL-based filters are compared on RGB images only.
+    """
+    img = ImageProcessor.load_image(image_path)
+    if img is None:
+        raise ValueError(f"Could not decode image: {image_path}")
+    outputs = DEFAULT_GRAPH.run({'bgr': img}, FILTER_NAMES)
+    # The PIL reference filters return RGB; grayscale JPEGs decode to a single channel in PIL.
+    pil_filters = ('sharpened', 'brightened')
+    is_rgb = Image.open(image_path).mode == 'RGB'
+
+    diffs = {}
+    for name in FILTER_NAMES:
+        if name in pil_filters and not is_rgb:
+            continue
+        result = outputs[name]
+        if name in pil_filters:
+            result = cv2.cvtColor(result, cv2.COLOR_BGR2RGB)
+        diff = np.abs(result.astype(np.int16) - PATH_FILTERS[name](image_path))
+        diffs[name] = {'max_abs': int(diff.max()), 'mean_abs': float(diff.mean()),
+                       'differing': float(np.count_nonzero(diff) / diff.size)}
+    return diffs
+
+
+def edge_precision_error(image_path, precision):
+    """
+    Compare a reduced-precision edge map with the float64 reference
+    Returns the maximum and mean absolute difference, the fraction of
+    pixels that differ, and the peak bytes of arrays allocated by each mode
+    """
+    import tracemalloc
+    img = ImageProcessor.load_image(image_path)
+    if img is None:
+        raise ValueError(f"Could not decode image: {image_path}")
+    gray = ImageProcessor.grayscale_from_array(img)
+
+    # NumPy and the OpenCV bindings allocate their arrays through NumPy,
+    # so tracemalloc sees every full-frame intermediate of each mode.
+    def run(mode):
+        tracemalloc.start()
+        try:
+            edges = ImageProcessor.edge_detection_from_gray(gray, mode)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        return edges, peak
+
+    reference, reference_peak = run('float64')
+    edges, peak = run(precision)
+    diff = np.abs(edges.astype(np.int16) - reference)
+    return {
+        'max_abs': int(diff.max()),
+        'mean_abs': float(diff.mean()),
+        'differing': float(np.count_nonzero(diff) / diff.size),
+        'peak_bytes': peak,
+        'reference_peak_bytes': reference_peak,
+    }
+
+
+def run_conformance(dataset_path):
+    """
+    Conformance check: the OpenCV sharpening/brightness paths must match
+    the PIL reference implementations pixel for pixel on the dataset.
+    The reduced edge precisions are measured against float64: float32 must
+    match it exactly, while l1 differences are only reported. The
+    decode-once outputs must match the original path-based filters, apart
+    from edges (gray conversion instead of a grayscale decode), whose
+    difference is reported.
+    """
+    image_paths = sorted(glob.glob(f"{dataset_path}/*.jpg"))
+    worst = dict.fromkeys(['sharpened'] + [f'brightened x{f:g}' for f in CONFORMANCE_FACTORS], 0)
+    decode_once = {name: {'max_abs': 0, 'mean_abs': 0.0, 'differing': 0.0} for name in FILTER_NAMES}
+    # Error bounds of the reduced edge precisions against float64.
+    edge_error = {precision: {'max_abs': 0, 'mean_abs': 0.0, 'differing': 0.0,
+                              'peak_bytes': 0, 'reference_peak_bytes': 0}
+                  for precision in EDGE_PRECISIONS if precision != 'float64'}
+    for path in image_paths:
+        for precision, totals in edge_error.items():
+            error = edge_precision_error(path, precision)
+            totals['max_abs'] = max(totals['max_abs'], error['max_abs'])
+            for key in ('mean_abs', 'differing'):
+                totals[key] += error[key] / len(image_paths)
+            for key in ('peak_bytes', 'reference_peak_bytes'):
+                totals[key] = max(totals[key], error[key])
+        for name, error in check_decode_once(path).items():
+            totals = decode_once[name]
+            totals['max_abs'] = max(totals['max_abs'], error['max_abs'])
+            for key in ('mean_abs', 'differing'):
+                totals[key] += error[key] / len(image_paths)
+        # Grayscale JPEGs decode to a single channel in PIL, so only compare colour images.
+        if Image.open(path).mode != 'RGB':
+            continue
+        for name, diff in check_pil_conformance(path).items():
+            worst[name] = max(worst[name], diff)
+
+    print(f"Checked {len(image_paths)} images against PIL")
+    for name, diff in worst.items():
+        print(f"{name:<16} max abs difference: {diff}")
+    print("Edge precision vs float64 (l1 differences are expected and not a failure):")
+    for precision, totals in edge_error.items():
+        print(f"{precision:<12} max abs difference: {totals['max_abs']}, "
+              f"mean {totals['mean_abs']:.3f}, {totals['differing']:.2%} of pixels differ, "
+              f"peak intermediates {totals['peak_bytes'] / 2**20:.1f} MB "
+              f"(float64 {totals['reference_peak_bytes'] / 2**20:.1f} MB)")
+    print("Decode-once outputs vs path-based filters (edges differ by design):")
+    for name, totals in decode_once.items():
+        print(f"{name:<12} max abs difference: {totals['max_abs']}, "
+              f"mean {totals['mean_abs']:.3f}, {totals['differing']:.2%} of pixels differ")
+    exact = (all(diff == 0 for diff in worst.values()) and edge_error['float32']['max_abs'] == 0
+             and all(totals['max_abs'] == 0 for name, totals in decode_once.items() if name != 'edges'))
+    return 0 if exact else 1
+
+
+def run_cache_check(dataset_path):
+    """
+    Cache check: every backend must key the same outputs identically, so
+    rerunning a dataset on another backend is served entirely from the
+    cache. Runs in a temporary directory with a fresh cache.
+    """
+    from result_cache import count_entries
+    from threading_impl import threads_pipeline
+    from multiprocessing_impl import multiprocessing_pipeline
+    from concurrent_futures_impl import futures_pipeline
+
+    dataset_path = os.path.abspath(dataset_path)
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        try:
+            counts = {}
+            for name, pipeline in (('threads', threads_pipeline),
+                                   ('multiprocessing', multiprocessing_pipeline),
+                                   ('futures', futures_pipeline)):
+                with contextlib.redirect_stdout(None):
+                    pipeline(dataset_path, 2, use_cache=True)
+                counts[name] = count_entries()
+        finally:
+            os.chdir(cwd)
+
+    print(f"Cache entries after each backend: {counts}")
+    consistent = len(set(counts.values())) == 1
+    print("Every backend reused the first backend's entries" if consistent
+          else "Backends stored the same outputs under different keys")
+    return 0 if consistent else 1
+
+
+def _build_tree(root, num_dirs, files_per_dir):
+    """Synthetic dataset of empty .jpg files, 50 subfolders per top-level folder"""
+    for d in range(num_dirs):
+        directory = os.path.join(root, f"group{d // 50:04d}", f"dir{d:06d}")
+        os.makedirs(directory)
+        for f in range(files_per_dir):
+            open(os.path.join(directory, f"{f:05d}.jpg"), 'w').close()
+
+def _index_peak(root, manifest_dir):
+    """Peak traced bytes while streaming every path of a tree without keeping them"""
+    import tracemalloc
+    from dataset_index import iter_image_paths
+    tracemalloc.start()
+    try:
+        count = sum(1 for _ in iter_image_paths(root, manifest_dir=manifest_dir))
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return count, peak
+
+def _index_peak_list(root, index_images):
+    """Peak traced bytes of materialising every path, for comparison"""
+    import tracemalloc
+    tracemalloc.start()
+    try:
+        count = len(index_images(root, manifest_dir=None))
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return count, peak
+
+def run_index_memory_check(dataset_path=None, small_dirs=100, large_dirs=400, files_per_dir=100,
+                           max_bytes_per_file=16):
+    """
+    Index memory check: streaming a dataset (iter_image_paths, as windowed
+    runs do) must not hold per-file state. Synthetic trees of small_dirs and
+    large_dirs folders are indexed (first scan, then from saved listings)
+    and the growth of peak memory per extra file must stay below
+    max_bytes_per_file, against about 100 bytes for a list of the paths.
+    The dataset argument is unused.
+    """
+    from dataset_index import index_images
+    ok = True
+    with tempfile.TemporaryDirectory() as workdir:
+        small, large = os.path.join(workdir, 'small'), os.path.join(workdir, 'large')
+        _build_tree(small, small_dirs, files_per_dir)
+        _build_tree(large, large_dirs, files_per_dir)
+        # Warm up imports and caches so they are not counted as index memory.
+        _index_peak(small, None)
+
+        for label, manifest in (('scan', 'listings'), ('saved listings', 'listings'),
+                                ('no listings', None)):
+            peaks = []
+            for root in (small, large):
+                manifest_dir = os.path.join(workdir, manifest) if manifest else None
+                peaks.append(_index_peak(root, manifest_dir))
+            (small_count, small_peak), (large_count, large_peak) = peaks
+            per_file = (large_peak - small_peak) / (large_count - small_count)
+            ok &= per_file < max_bytes_per_file
+            print(f"{label:<15} peak {small_peak / 1024:.0f} KB for {small_count} files, "
+                  f"{large_peak / 1024:.0f} KB for {large_count} files "
+                  f"({per_file:.1f} bytes per extra file)")
+
+        list_count, list_peak = _index_peak_list(large, index_images)
+        print(f"{'full list':<15} peak {list_peak / 1024:.0f} KB for {list_count} files")
+    print("Index memory stays flat in the number of files" if ok
+          else f"Index memory grows by more than {max_bytes_per_file} bytes per file")
+    return 0 if ok else 1
+
+# Filter graph variants whose outputs are cached: the default graph, every
+# edge precision and a point operation chain.
+GOLDEN_VARIANTS = ((None, None), ('float32', None), ('l1', None),
+                   (None, (('brightness', 0.7),)), (None, (('brightness', 1.3),)),
+                   (None, (('contrast', 1.2), ('gamma', 0.8), ('brightness', 1.1))))
+
+# SHA-256 of golden_outputs() for each FILTER_CODE_VERSION. A change to any
+# filter's output must bump the version and record the new hash here.
+GOLDEN_OUTPUT_HASHES = {
+    '4': '0be323d3fe0e6452dfb33cdfeb4b3ac2936edf3070cfc4e268e08a12145e61f2',
+}
+
+def golden_image(height=128, width=128, seed=0):
+    """
+    Deterministic BGR test image: noisy gradients in the top half, where
+    rounding matters for point operations, and uniform noise in the bottom
+    half, which reaches the extreme Sobel responses of the edge filter
+    """
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    img = np.stack([x * 255 // (width - 1), y * 255 // (height - 1), (x + y) % 256], axis=-1)
+    img = img + rng.integers(-20, 21, img.shape)
+    img[height // 2:] = rng.integers(0, 256, img[height // 2:].shape)
+    return np.clip(img, 0, 255).astype(np.uint8)
+
+def golden_outputs():
+    """SHA-256 over every output of every GOLDEN_VARIANTS graph on golden_image"""
+    import hashlib
+    from image_filters import filter_graph
+    img = golden_image()
+    digest = hashlib.sha256()
+    for edge_precision, point_ops in GOLDEN_VARIANTS:
+        graph = filter_graph(edge_precision, point_ops)
+        outputs = ImageProcessor.run_filters(img, graph=graph)
+        for name in FILTER_NAMES:
+            output = np.ascontiguousarray(outputs[name])
+            digest.update(f"{edge_precision}:{point_ops}:{name}:{output.shape}:{output.dtype}".encode())
+            digest.update(output.tobytes())
+    return digest.hexdigest()
+
+def run_golden_check(dataset_path=None):
+    """
+    Golden output check: the filter outputs on a synthetic image must hash
+    to the value recorded for the current FILTER_CODE_VERSION, so outputs
+    cannot change without a version bump that invalidates the result cache.
+    The dataset argument is unused.
+    """
+    from image_filters import FILTER_CODE_VERSION
+    digest = golden_outputs()
+    expected = GOLDEN_OUTPUT_HASHES.get(FILTER_CODE_VERSION)
+    print(f"Filter code version {FILTER_CODE_VERSION}: outputs hash {digest}")
+    if expected is None:
+        print(f"No golden hash recorded for version {FILTER_CODE_VERSION}; add it to GOLDEN_OUTPUT_HASHES")
+        return 1
+    if digest != expected:
+        print(f"Outputs differ from version {FILTER_CODE_VERSION} ({expected}); "
+              f"bump FILTER_CODE_VERSION and record the new hash")
+        return 1
+    print("Filter outputs match the golden hash")
+    return 0
+
+def _process_tree(pid):
+    """pid and its descendants, read from /proc, children before parents"""
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            children = [int(child) for child in f.read().split()]
+    except OSError:
+        children = []
+    return [p for child in children for p in _process_tree(child)] + [pid]
+
+def _kill_workers_when_leased(address, authkey, victims, killed):
+    # Kill each victim worker (with its pool) as soon as it holds a batch,
+    # i.e. in the middle of a task, as a crashed node would.
+    import signal
+    from distributed import connect
+    queue = connect(address, authkey)
+    deadline = time.monotonic() + 60
+    while victims and time.monotonic() < deadline:
+        leased = set(queue.leases().values())
+        for worker_id in sorted(victims & leased):
+            for pid in _process_tree(queue.worker_summary()[worker_id]['pid']):
+                os.kill(pid, signal.SIGKILL)
+            victims.discard(worker_id)
+            killed.append(worker_id)
+        time.sleep(0.005)
+
+def _run_killed_cluster(dataset_path, num_workers, victims, heartbeat_timeout):
+    """Run a local coordinator and workers, killing the victims mid-task"""
+    import secrets
+    import threading
+    from multiprocessing import Process
+    from distributed import run_coordinator, run_worker
+    authkey = secrets.token_hex(16).encode()
+    num_images = len(glob.glob(os.path.join(dataset_path, '*.jpg')))
+    processes, killed = [], []
+
+    def start(address):
+        address = ('127.0.0.1', address[1])
+        for _ in range(num_workers):
+            process = Process(target=run_worker, args=(address, dataset_path, 1, authkey))
+            process.start()
+            processes.append(process)
+        threading.Thread(target=_kill_workers_when_leased,
+                         args=(address, authkey, set(victims), killed), daemon=True).start()
+
+    try:
+        result = run_coordinator(dataset_path, port=0, authkey=authkey,
+                                 batch_size=max(1, num_images // (2 * num_workers)),
+                                 min_workers=num_workers, heartbeat_timeout=heartbeat_timeout,
+                                 on_listen=start)
+    finally:
+        for process in processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+    return result, killed
+
+def run_requeue_check(dataset_path, heartbeat_timeout=3.0):
+    """
+    Distributed requeue check: a worker killed mid-task must have its
+    batch requeued and completed by another worker, and a coordinator
+    whose workers are all killed must stop with an error instead of
+    waiting forever. Uses the top-level images of the dataset.
+    """
+    num_images = len(glob.glob(os.path.join(dataset_path, '*.jpg')))
+    with contextlib.redirect_stdout(io.StringIO()):
+        result, killed = _run_killed_cluster(dataset_path, 2, {0}, heartbeat_timeout)
+    victim = result['workers'][0]
+    ok = (killed == [0] and result['requeued_batches'] >= 1 and victim['images'] == 0
+          and result['num_images'] == num_images)
+    print(f"One worker killed mid-task: {result['requeued_batches']} batches requeued, "
+          f"{result['num_images']} of {num_images} images processed")
+
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            _run_killed_cluster(dataset_path, 2, {0, 1}, heartbeat_timeout)
+        stopped = False
+        print("All workers killed: the coordinator finished without them")
+    except RuntimeError as e:
+        stopped = True
+        print(f"All workers killed: {e}")
+    ok &= stopped
+    print("Lost work is requeued and completed" if ok else "Lost work was not recovered")
+    return 0 if ok else 1
+
+CHECKS = {
+    'conformance': run_conformance,
+    'cache': run_cache_check,
+    'index-memory': run_index_memory_check,
+    'golden': run_golden_check,
+    'requeue': run_requeue_check,
+}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Filter and pipeline checks")
+    parser.add_argument('check', choices=[*CHECKS, 'all'])
+    parser.add_argument('dataset', nargs='?', default="food101_subset")
+    args = parser.parse_args(argv)
+
+    checks = CHECKS if args.check == 'all' else {args.check: CHECKS[args.check]}
+    failed = [name for name, check in checks.items() if check(args.dataset) != 0]
+    if failed:
+        print(f"Failed: {', '.join(failed)}")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,12 +1,26 @@
 import os
 import time
-import glob
 import concurrent.futures
-from image_filters import ImageProcessor
+from image_filters import (ImageProcessor, resolve_filters, check_preview_scale,
+                           check_edge_precision, check_point_ops, point_ops_label)
+from batching import make_batches, iter_batches, peek_first, auto_batch_size, noop_task
+from dataset_index import index_images, iter_image_paths
+from autotune import AutoTuner, submit_adaptive
+from backpressure import submit_bounded
+from running_stats import RunningStats
+from output_codecs import resolve_codecs
+from archive_sink import new_archive_dir, finalize_archive
+from stage_profile import new_profile_dir, collect_profile, print_profile
+from tracing import new_trace_dir, export_trace, print_trace_summary, write_events, span
+from result_cache import ResultCache
+from shared_buffers import share_resource_tracker
+from thread_budget import init_worker_threads, resolve_budget
+from tiling import DEFAULT_TILE_THRESHOLD
+from streaming_pipeline import run_streaming
 from pathlib import Path
 import multiprocessing
 
-def process_single_image_futures(image_path):
+def process_single_image_futures(image_path, filters=None, cache=None, **filter_options):
     """Process a single image with all filters"""
     # This function is executed in a separate process by the ProcessPoolExecutor.
     # It isolates image-level work so that each process handles one image independently.
@@ -15,7 +29,11 @@ def process_single_image_futures(image_path):
         # The processing time returned is used later for performance analysis.
         processing_time = ImageProcessor.apply_all_filters(
             image_path, 
-            output_dir="results/output_images"
+            output_dir="results/output_images",
+            decode_once=True,
+            filters=filters,
+            cache=cache,
+            **filter_options
         )
         return processing_time
     except Exception as e:
@@ -24,82 +42,317 @@ def process_single_image_futures(image_path):
         print(f"Error processing {image_path}: {e}")
         return 0
 
-def futures_pipeline(image_folder, num_workers=None):
+def process_image_batch_futures(image_paths, filters=None, cache=None, **filter_options):
+    """Process a batch of images in one task and return per-image timings"""
+    # One future per batch instead of per image amortises pickling, IPC
+    # and future bookkeeping over every image in the batch.
+    start_time = time.perf_counter()
+    timings = [process_single_image_futures(image_path, filters, cache, **filter_options)
+               for image_path in image_paths]
+    
+    # With tracing on, the batch appears as a span around its image tasks.
+    trace_dir = filter_options.get('trace_dir')
+    if trace_dir is not None:
+        write_events(trace_dir, [span(f"batch of {len(image_paths)}", 'batch', start_time,
+                                      time.perf_counter() - start_time)])
+    return timings
+
+def futures_pipeline(image_folder, num_workers=None, filters=None, batch_size=None,
+                     streaming=False, shared_memory=False, use_cache=False,
+                     cpu_budget=None, threads_per_worker=None,
+                     tile_threshold=DEFAULT_TILE_THRESHOLD,
+                     max_in_flight=None, profile=False, trace=False, adaptive=False,
+                     output_format=None, archive=False,
+                     preview_scale=None, edge_precision=None, point_ops=None):
     """
     Process all images using concurrent.futures ProcessPoolExecutor
+    
+    filters selects which outputs to produce (all five when None).
+    batch_size sends that many images per task; 'auto' picks it from the
+    measured per-task overhead, and None keeps one image per task.
+    streaming=True overlaps disk reads, filtering and JPEG writes in a
+    three-stage pipeline (batch_size does not apply in that mode).
+    shared_memory=True (streaming only) returns filter outputs through a
+    recycled shared memory buffer pool instead of pickling the arrays.
+    use_cache=True serves unchanged images from the content-addressed result
+    cache in .cache/results (leave it off when benchmarking; it is not used
+    in streaming mode).
+    cpu_budget caps the total threads used (default: all cores): each
+    worker's OpenCV thread count is set to cpu_budget // workers. Use
+    threads_per_worker to set that count directly instead.
+    tile_threshold (pixels, default 16 megapixels) splits larger images
+    into tiles that are filtered in parallel threads inside the worker,
+    with the same output as a full-frame run; None disables tiling.
+    max_in_flight bounds how many tasks (images, or batches when batching)
+    are submitted but unfinished at any time. Paths are then streamed from
+    the indexer and timings are aggregated on the fly, so parent memory
+    stays flat in the number of images (it grows only with the number of
+    directories, see dataset_index.iter_image_paths); processing_times is left empty and time_stats summarises them.
+    total_time is the steady-state wall time; pool startup is reported
+    separately as startup_time.
+    profile=True times every decode, filter and imwrite in the workers and
+    adds the per-stage summary (stage_profile) and, unless max_in_flight
+    is set, the per-image records (stage_records) to the results.
+    trace=True records every task (and its stages) with its worker PID on
+    one monotonic clock and exports a Chrome/Perfetto trace to
+    results/traces/; trace_summary gives each worker's utilisation and
+    idle tail.
+    adaptive=True tunes the number of active workers (up to num_workers)
+    and the batch size at runtime: a probe phase measures images per second
+    for several settings, the fastest is kept, and a drift in throughput
+    triggers a new probe (see autotune.AutoTuner; pass a dict of its options
+    instead of True to change them). batch_size is then ignored, and the
+    probes, final setting and re-tunes are returned under tuning.
+    output_format sets how outputs are stored: one spec for all of them or
+    a dict per filter, e.g. {'gray': 'png:9', 'edges': 'jpeg:60'}, with
+    jpeg[:quality], png[:compression], webp[:quality], npy (raw array)
+    or none (computed but not written, for compute-only benchmarks); see
+    output_codecs. With profile=True the stage profile reports encode
+    time and bytes written per codec.
+    archive=True streams the outputs into one tar shard per worker under
+    results/output_shards/ instead of writing separate files, and indexes
+    every member by shard and offset once the run ends (see archive_sink);
+    the shard folder and totals are returned under archive.
+    preview_scale 2, 4 or 8 decodes every image at that fraction of its
+    width and height (JPEG DCT-domain scaling via cv2.IMREAD_REDUCED_*)
+    and runs the filters on the smaller image, for previews and thumbnails.
+    edge_precision 'float32' or 'l1' computes edge detection without
+    float64 intermediates, lowering peak memory per worker; float32 gives
+    the same output and l1 an approximation (see image_filters.EDGE_PRECISIONS).
+    point_ops sets the brightened output's chain of brightness, contrast
+    and gamma steps, e.g. 'brightness=1.2,gamma=0.8', compiled into one
+    cached lookup table (default: brightness=1.5).
     """
-    # Define supported image file extensions to be processed.
-    image_extensions = ['*.jpg', '*.jpeg', '*.png']
-    image_paths = []
+    # Validate the filter selection up front rather than once per image.
+    filters = resolve_filters(filters)
+    preview_scale = check_preview_scale(preview_scale)
+    edge_precision = check_edge_precision(edge_precision)
+    point_ops = check_point_ops(point_ops)
+    
+    # Per-image options forwarded to ImageProcessor.apply_all_filters.
+    # With profiling on, workers append per-stage timings to a per-run folder.
+    profile_dir = new_profile_dir() if profile else None
+    # With tracing on, every task is also recorded as a timeline span.
+    trace_dir = new_trace_dir() if trace else None
+    # Encoder of every output; outputs set to 'none' are computed but never written.
+    codecs = resolve_codecs(output_format, filters)
+    # With archiving on, outputs are appended to per-worker tar shards.
+    archive_dir = new_archive_dir() if archive else None
+    filter_options = {'tile_threshold': tile_threshold, 'profile_dir': profile_dir,
+                      'trace_dir': trace_dir, 'codecs': codecs, 'archive_dir': archive_dir,
+                      'preview_scale': preview_scale, 'edge_precision': edge_precision,
+                      'point_ops': point_ops}
     
-    # Recursively search the dataset folder for images matching the extensions.
-    for ext in image_extensions:
-        image_paths.extend(glob.glob(os.path.join(image_folder, '**', ext), recursive=True))
+    # The cache is passed to every worker; each one reads and writes entries directly.
+    cache = ResultCache() if use_cache else None
+    if cache is not None and streaming:
+        print("Result cache is not used in streaming mode")
+    if adaptive and streaming:
+        print("Adaptive tuning is not used in streaming mode")
     
-    # Log the total number of images discovered in the dataset.
-    print(f"Found {len(image_paths)} images to process")
+    # Index the dataset in a single scandir pass (case-insensitive extensions,
+    # symlink duplicates removed); unchanged folders come from the saved manifest.
+    windowed = max_in_flight is not None
+    if windowed:
+        # Pull paths lazily so the full list never exists in the parent; the
+        # indexer itself keeps per-directory, not per-file, state.
+        image_paths = iter_image_paths(image_folder)
+        print(f"Streaming images with at most {max_in_flight} tasks in flight")
+    else:
+        image_paths = index_images(image_folder)
+        
+        # Log the total number of images discovered in the dataset.
+        print(f"Found {len(image_paths)} images to process")
+    
+    # Timings are summarised incrementally instead of from a full list.
+    times = RunningStats()
+    tuner = None
     
     # If the number of workers is not specified, default to the number of CPU cores.
     # This choice maximizes CPU utilization for CPU-bound image processing tasks.
     if num_workers is None:
         num_workers = multiprocessing.cpu_count()
     
+    # Limit each worker's internal thread pools so workers x threads stays
+    # within the CPU budget (all cores by default) instead of oversubscribing them.
+    cpu_budget, threads_per_worker = resolve_budget(num_workers, cpu_budget, threads_per_worker)
+    initializer, initargs = init_worker_threads, (threads_per_worker,)
+    
     # Ensure the output directory exists before starting parallel execution.
     Path("results/output_images").mkdir(parents=True, exist_ok=True)
     
-    # Record the wall-clock start time for overall performance measurement.
-    start_time = time.time()
+    # Workers must share the parent's resource tracker to attach to its buffers.
+    if shared_memory:
+        share_resource_tracker()
+    
+    # Executor startup is timed separately so total_time measures steady-state work.
+    pool_start = time.perf_counter()
     
     # Initialize a ProcessPoolExecutor to enable true parallelism
     # by distributing work across multiple CPU processes.
-    with concurrent.futures.ProcessPoolExecutor(max_workers=num_workers) as executor:
-        # Submit one task per image to the executor.
-        # Each future is mapped back to its corresponding image path.
-        future_to_image = {
-            executor.submit(process_single_image_futures, img_path): img_path 
-            for img_path in image_paths
-        }
+    with concurrent.futures.ProcessPoolExecutor(max_workers=num_workers, initializer=initializer,
+                                                initargs=initargs) as executor:
+        # Workers are spawned on demand; one empty task each brings them all up.
+        list(executor.map(noop_task, range(num_workers)))
+        startup_time = time.perf_counter() - pool_start
+        
+        # Record the wall-clock start time for overall performance measurement.
+        start_time = time.perf_counter()
         
-        # Collect results asynchronously as each task completes.
-        # This avoids waiting for tasks in submission order.
-        results = []
-        for future in concurrent.futures.as_completed(future_to_image):
-            img_path = future_to_image[future]
-            try:
-                # Retrieve the processing time returned by the worker process.
-                result = future.result()
-                results.append(result)
-            except Exception as e:
-                # Handle unexpected execution errors at the future level.
-                print(f"Image {img_path} generated exception: {e}")
-                results.append(0)
+        if streaming:
+            # I/O threads prefetch bytes, the executor filters, writer threads encode.
+            results = run_streaming(image_paths, executor.submit, num_workers, filters,
+                                    queue_size=max_in_flight, shared_memory=shared_memory,
+                                    filter_options=filter_options,
+                                    stats=times if windowed else None)
+        else:
+            if adaptive:
+                # Batches sized and submitted as the tuner directs (see below).
+                task_func, tasks = process_image_batch_futures, None
+            elif batch_size is None:
+                # One task per image.
+                task_func, tasks = process_single_image_futures, image_paths
+            else:
+                if batch_size == 'auto':
+                    # Probe the executor with empty tasks to measure dispatch overhead.
+                    # The dataset size is unknown when paths are streamed.
+                    sample_path, image_paths = peek_first(image_paths)
+                    batch_size = auto_batch_size(
+                        lambda n: list(executor.map(noop_task, range(n))),
+                        sample_path, None if windowed else len(image_paths), num_workers, filters,
+                        filter_options
+                    )
+                
+                # One task per batch of paths.
+                task_func = process_image_batch_futures
+                tasks = iter_batches(image_paths, batch_size) if windowed else make_batches(image_paths, batch_size)
+            
+            if adaptive:
+                # Vary the active workers and batch size, re-tuning when throughput drifts.
+                tuner = AutoTuner(num_workers, **(adaptive if isinstance(adaptive, dict) else {}))
+                completed = submit_adaptive(executor.submit, task_func, image_paths, tuner,
+                                            filters, cache, **filter_options)
+            elif windowed:
+                # Keep at most max_in_flight futures pending, refilling as each completes.
+                completed = submit_bounded(executor.submit, task_func, tasks, max_in_flight,
+                                           filters, cache, **filter_options)
+            else:
+                # Submit every task up front; each future maps back to its image path(s).
+                future_to_image = {
+                    executor.submit(task_func, task, filters, cache, **filter_options): task
+                    for task in tasks
+                }
+                # Collect results asynchronously as each task completes.
+                # This avoids waiting for tasks in submission order.
+                completed = ((future_to_image[future], future)
+                             for future in concurrent.futures.as_completed(future_to_image))
+            
+            results = []
+            for img_path, future in completed:
+                try:
+                    # Retrieve the processing time(s) returned by the worker process.
+                    result = future.result()
+                    timings = result if task_func is process_image_batch_futures else [result]
+                except Exception as e:
+                    # Handle unexpected execution errors at the future level.
+                    print(f"Image {img_path} generated exception: {e}")
+                    timings = [0] * len(img_path) if task_func is process_image_batch_futures else [0]
+                times.extend(timings)
+                if not windowed:
+                    results.extend(timings)
     
     # Compute total wall-clock execution time for the entire pipeline.
-    total_time = time.time() - start_time
+    total_time = time.perf_counter() - start_time
+    
+    # Export the task timeline with pool startup and the steady-state run as parent spans.
+    trace_file, trace_summary = None, None
+    if trace_dir is not None:
+        trace_file = f"results/traces/futures-{num_workers}.json"
+        trace_summary = export_trace(trace_dir, trace_file, [('pool startup', pool_start, startup_time),
+                                                             ('run', start_time, total_time)])
+    
+    # Enforce the cache size cap once, in the parent, after all workers finished.
+    if cache is not None:
+        removed, cache_bytes = cache.evict()
+        print(f"Result cache: {cache_bytes / 1024**2:.1f} MB, {removed} entries evicted")
+    
+    # Close the shards and index their members once no worker can append.
+    archive_summary = None
+    if archive_dir is not None:
+        archive_summary = finalize_archive(archive_dir)
+    
+    # Merge the workers' stage records now that every task has finished.
+    stage_profile, stage_records = None, None
+    if profile_dir is not None:
+        stage_profile, stage_records = collect_profile(profile_dir, keep_records=not windowed)
     
     # Aggregate individual processing times to derive summary statistics.
-    total_processing_time = sum(results)
-    avg_time_per_image = total_processing_time / len(results) if results else 0
+    if streaming and not windowed:
+        times.extend(results)
+    total_processing_time = times.total
+    avg_time_per_image = times.mean
     
     # Display performance metrics for the current worker configuration.
     print(f"\n=== Concurrent.Futures Results ===")
     print(f"Number of workers: {num_workers}")
-    print(f"Total images processed: {len(image_paths)}")
+    if tuner is not None:
+        print(f"Mode: adaptive, ended with {tuner.workers} workers and batch size "
+              f"{tuner.batch_size} ({tuner.retunes} re-tunes)")
+    else:
+        print(f"Mode: {'streaming' if streaming else 'batch size ' + str(batch_size or 1)}")
+    print(f"OpenCV threads per worker: {threads_per_worker} (CPU budget {cpu_budget})")
+    if preview_scale is not None:
+        print(f"Preview decode: 1/{preview_scale} scale")
+    if edge_precision is not None:
+        print(f"Edge precision: {edge_precision}")
+    if point_ops is not None:
+        print(f"Point operations: {point_ops_label(point_ops)}")
+    print(f"Total images processed: {times.count}")
+    print(f"Pool startup time: {startup_time:.2f} seconds")
     print(f"Total wall-clock time: {total_time:.2f} seconds")
     print(f"Total processing time (sum): {total_processing_time:.2f} seconds")
     print(f"Average time per image: {avg_time_per_image:.2f} seconds")
+    if archive_summary is not None:
+        print(f"Archived {archive_summary['members']} outputs in {archive_summary['shards']} shards "
+              f"({archive_summary['bytes'] / 1024**2:.1f} MB): {archive_dir}")
+    if stage_profile is not None:
+        print_profile(stage_profile)
+    if trace_summary is not None:
+        print_trace_summary(trace_summary)
     
     # Return structured results for downstream analysis and comparison.
     return {
         'num_workers': num_workers,
-        'num_images': len(image_paths),
+        'num_images': times.count,
         'total_time': total_time,
+        'startup_time': startup_time,
+        'filters': filters,
+        'batch_size': batch_size,
+        'streaming': streaming,
+        'shared_memory': shared_memory,
+        'use_cache': use_cache,
+        'cpu_budget': cpu_budget,
+        'threads_per_worker': threads_per_worker,
+        'tile_threshold': tile_threshold,
+        'max_in_flight': max_in_flight,
+        'output_format': {name: codec.label for name, codec in codecs.items()},
+        'archive': archive_summary,
+        'preview_scale': preview_scale,
+        'edge_precision': edge_precision,
+        'point_ops': point_ops_label(point_ops),
+        'tuning': tuner.summary() if tuner is not None else None,
+        'time_stats': times.as_dict(),
+        'stage_profile': stage_profile,
+        'stage_records': stage_records,
+        'trace_file': trace_file,
+        'trace_summary': trace_summary,
         'processing_times': results
     }
 
-def run_futures_experiment(image_folder, worker_counts=None):
+def run_futures_experiment(image_folder, worker_counts=None, **pipeline_options):
     """
     Run concurrent.futures with different worker counts
+    Extra keyword options (e.g. filters, batch_size, streaming) are passed to every pipeline run.
     """
     # Define default worker configurations to evaluate scalability.
     if worker_counts is None:
@@ -114,7 +367,7 @@ def run_futures_experiment(image_folder, worker_counts=None):
         print('='*50)
         
         # Run the parallel pipeline and store the performance results.
-        result = futures_pipeline(image_folder, num_workers)
+        result = futures_pipeline(image_folder, num_workers, **pipeline_options)
         results[num_workers] = result
         
         # Introduce a short delay to reduce resource contention
@@ -0,0 +1,166 @@
+import os
+import json
+import hashlib
+
+# Image types picked up by the indexer; matched case-insensitively (.JPG too).
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+# Manifests from previous scans: one folder per dataset, holding one small
+# JSON listing per directory so no scan ever loads or rewrites them all.
+DEFAULT_MANIFEST_DIR = os.path.join(".cache", "index")
+
+# Layout of a directory listing; listings of another version are rescanned.
+MANIFEST_VERSION = 2
+
+def manifest_path(image_folder, manifest_dir=DEFAULT_MANIFEST_DIR):
+    """Folder of per-directory manifests for a dataset folder"""
+    folder_id = hashlib.sha1(os.path.abspath(image_folder).encode()).hexdigest()[:16]
+    return os.path.join(manifest_dir, folder_id)
+
+def listing_name(rel):
+    """File name of the saved listing of one directory (relative to the dataset)"""
+    return hashlib.sha1(rel.encode()).hexdigest()[:16] + ".json"
+
+def load_listing(path):
+    """Load a saved directory listing, or None if it is missing or unreadable"""
+    try:
+        with open(path, 'r') as f:
+            listing = json.load(f)
+        if isinstance(listing, dict) and listing.get('version') == MANIFEST_VERSION:
+            return listing
+    except (OSError, ValueError):
+        pass
+    return None
+
+def save_listing(path, listing):
+    """Write a listing atomically so an interrupted run never corrupts it"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(listing, f)
+    os.replace(tmp_path, path)
+
+def _scan_directory(directory, extensions, root):
+    """
+    List one directory with a single os.scandir pass
+    Returns (files, subdirs) where files are [name, size, mtime_ns, dev, ino,
+    aliased]; aliased marks symlinks and hard-linked files, the only files
+    that can be reached through more than one path. A symlink to an image
+    inside root (the real path of the dataset) is left out, since the
+    image is indexed under its own path.
+    """
+    files = []
+    subdirs = []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            try:
+                # Follow symlinks so linked folders and files are indexed too;
+                # duplicates are removed later by device/inode.
+                if entry.is_dir():
+                    subdirs.append((entry.is_symlink(), entry.name))
+                elif entry.is_file() and os.path.splitext(entry.name)[1].lower() in extensions:
+                    st = entry.stat()
+                    if entry.is_symlink():
+                        target = os.path.realpath(entry.path)
+                        if (target.startswith(root + os.sep)
+                                and os.path.splitext(target)[1].lower() in extensions):
+                            continue
+                    aliased = entry.is_symlink() or st.st_nlink > 1
+                    files.append([entry.name, st.st_size, st.st_mtime_ns, st.st_dev, st.st_ino,
+                                  aliased])
+            except OSError:
+                # Broken symlinks or files removed mid-scan are skipped.
+                continue
+    # Visit real subdirectories before symlinked ones so the canonical path
+    # of a linked folder is the one that survives deduplication.
+    files.sort()
+    subdirs.sort()
+    return files, [name for is_link, name in subdirs]
+
+def iter_image_paths(image_folder, extensions=IMAGE_EXTENSIONS, manifest_dir=DEFAULT_MANIFEST_DIR):
+    """
+    Yield every image path under image_folder, streaming as directories are read
+
+    Each directory is listed once with os.scandir. Directories whose mtime is
+    unchanged since the last run are served from their saved listing instead
+    of being rescanned. Symlinked folders and files are deduplicated by inode.
+    Pass manifest_dir=None to always scan without reading or writing listings.
+    A packed dataset (see input_shards) yields references into its shards
+    instead, in the order they are stored.
+
+    Memory grows with the number of directories (the ones already visited
+    and those waiting to be visited) and with the largest single directory,
+    not with the number of files: listings are read and written one
+    directory at a time, and only aliased files (symlinks, hard links) are
+    remembered for deduplication, since any other file can only be reached
+    through its directory, which is itself visited once.
+    """
+    from input_shards import is_packed_dataset, iter_packed_refs
+    if is_packed_dataset(image_folder):
+        yield from iter_packed_refs(image_folder)
+        return
+
+    extensions = sorted(ext.lower() for ext in extensions)
+    root = os.path.realpath(image_folder)
+    listings_dir = manifest_path(image_folder, manifest_dir) if manifest_dir else None
+
+    seen_dirs = set()
+    seen_aliases = set()
+    # Listing files written or confirmed by this scan; the rest are stale.
+    visited_listings = set()
+    stack = [image_folder]
+    while stack:
+        directory = stack.pop()
+        try:
+            st = os.stat(directory)
+        except OSError:
+            continue
+
+        # A directory reached twice through symlinks is only indexed once.
+        dir_id = (st.st_dev, st.st_ino)
+        if dir_id in seen_dirs:
+            continue
+        seen_dirs.add(dir_id)
+
+        # Reuse the previous listing when the directory has not changed;
+        # adding, removing or renaming entries always updates its mtime.
+        rel = os.path.relpath(directory, image_folder)
+        listing_path = None
+        cached = None
+        if listings_dir:
+            name = listing_name(rel)
+            visited_listings.add(name)
+            listing_path = os.path.join(listings_dir, name)
+            cached = load_listing(listing_path)
+        if (cached is not None and cached['rel'] == rel and cached['mtime_ns'] == st.st_mtime_ns
+                and cached['extensions'] == extensions):
+            files, subdirs = cached['files'], cached['subdirs']
+        else:
+            files, subdirs = _scan_directory(directory, extensions, root)
+            if listing_path:
+                save_listing(listing_path, {'version': MANIFEST_VERSION, 'rel': rel,
+                                            'extensions': extensions, 'mtime_ns': st.st_mtime_ns,
+                                            'files': files, 'subdirs': subdirs})
+
+        for name, size, mtime_ns, dev, ino, aliased in files:
+            if aliased:
+                if (dev, ino) in seen_aliases:
+                    continue
+                seen_aliases.add((dev, ino))
+            yield os.path.join(directory, name)
+
+        # Push in reverse so subdirectories are visited in listing order.
+        stack.extend(os.path.join(directory, name) for name in reversed(subdirs))
+
+    # Drop listings of directories that no longer exist.
+    if listings_dir and os.path.isdir(listings_dir):
+        for name in os.listdir(listings_dir):
+            if name not in visited_listings:
+                try:
+                    os.remove(os.path.join(listings_dir, name))
+                except OSError:
+                    pass
+
+def index_images(image_folder, **kwargs):
+    """Return the list of image paths under image_folder (see iter_image_paths)"""
+    return list(iter_image_paths(image_folder, **kwargs))
@@ -0,0 +1,476 @@
+import os
+import sys
+import time
+import socket
+import secrets
+import ipaddress
+import argparse
+import threading
+import collections
+from functools import partial
+from multiprocessing import Pool, Process, cpu_count
+from multiprocessing.managers import BaseManager
+from pathlib import Path
+from image_filters import resolve_filters
+from batching import make_batches
+from dataset_index import index_images
+from multiprocessing_impl import process_single_image
+from running_stats import RunningStats
+from thread_budget import init_worker_threads, resolve_budget
+from tiling import DEFAULT_TILE_THRESHOLD
+
+# Manager connections exchange pickles, so anyone holding the key can run
+# code on the coordinator and the workers. Every node reads the shared key
+# from this environment variable; there is deliberately no built-in default.
+AUTHKEY_ENV = 'CST435_AUTHKEY'
+DEFAULT_PORT = 50000
+
+# Workers ping the coordinator every HEARTBEAT_INTERVAL seconds; a worker
+# silent for HEARTBEAT_TIMEOUT seconds is declared dead and its batches requeued.
+HEARTBEAT_INTERVAL = 2.0
+HEARTBEAT_TIMEOUT = 10.0
+
+class WorkQueue:
+    # Lives in the coordinator's manager process and is shared with the
+    # coordinator and the workers through proxies. Every method is called
+    # from a manager server thread, so all state is guarded by one lock.
+    # Batches are leased to a worker until it reports them complete; leases
+    # held by a dead worker go back to the queue.
+
+    def __init__(self, batches, job, min_workers=1, heartbeat_timeout=HEARTBEAT_TIMEOUT):
+        self._lock = threading.Lock()
+        self._batches = dict(enumerate(batches))
+        self._pending = collections.deque(self._batches)
+        self._leases = {}       # batch_id -> worker_id
+        self._completed = set()
+        self._workers = {}      # worker_id -> info dict
+        self._job = job
+        self._min_workers = min_workers
+        self._heartbeat_timeout = heartbeat_timeout
+        self.num_batches = len(self._batches)
+        self.times = RunningStats()
+        self.requeued = 0
+        self.started = threading.Event()
+        self.finished = threading.Event()
+        self.start_time = None
+        self.finish_time = None
+        if not self._batches:
+            self.finished.set()
+
+    def register(self, host, pid, processes):
+        """Add a worker and return (worker_id, job options)"""
+        with self._lock:
+            worker_id = len(self._workers)
+            self._workers[worker_id] = {
+                'host': host, 'pid': pid, 'processes': processes,
+                'last_seen': time.monotonic(), 'alive': True, 'images': 0, 'busy_time': 0.0,
+            }
+            # The clock starts once enough nodes have joined, so node-scaling
+            # runs do not include the time spent waiting for workers to connect.
+            if len(self._workers) >= self._min_workers and not self.started.is_set():
+                self.start_time = time.perf_counter()
+                self.started.set()
+            return worker_id, self._job
+
+    def heartbeat(self, worker_id):
+        """Record that a worker is still alive; False tells it to stop"""
+        with self._lock:
+            worker = self._workers[worker_id]
+            worker['last_seen'] = time.monotonic()
+            return worker['alive'] and not self.finished.is_set()
+
+    def next_batch(self, worker_id):
+        """
+        Lease the next batch to a worker
+        Returns (batch_id, paths), 'wait' while no batch can be handed out
+        yet, or None once every batch is complete.
+        """
+        with self._lock:
+            if self.finished.is_set() or not self._workers[worker_id]['alive']:
+                return None
+            if not self.started.is_set():
+                return 'wait'
+            while self._pending:
+                batch_id = self._pending.popleft()
+                # A requeued batch may have been finished by its original owner.
+                if batch_id in self._completed:
+                    continue
+                self._leases[batch_id] = worker_id
+                return batch_id, self._batches[batch_id]
+            return 'wait'
+
+    def complete(self, worker_id, batch_id, timings):
+        """Accept per-image timings for a batch; duplicates are ignored"""
+        with self._lock:
+            if batch_id in self._completed:
+                return
+            self._completed.add(batch_id)
+            self._leases.pop(batch_id, None)
+            self.times.extend(timings)
+            worker = self._workers[worker_id]
+            worker['images'] += len(timings)
+            worker['busy_time'] += sum(timings)
+            if len(self._completed) == len(self._batches):
+                self.finish_time = time.perf_counter()
+                self.finished.set()
+
+    def wait_finished(self, timeout):
+        """Wait up to timeout seconds for every batch to complete; True once they have"""
+        return self.finished.wait(timeout)
+
+    def leases(self):
+        """Batches currently leased, as {batch_id: worker_id}"""
+        with self._lock:
+            return dict(self._leases)
+
+    def all_workers_lost(self):
+        """Whether workers have registered and every one of them has been declared dead"""
+        with self._lock:
+            return bool(self._workers) and not any(w['alive'] for w in self._workers.values())
+
+    def reap(self):
+        """Declare silent workers dead and requeue their leased batches"""
+        with self._lock:
+            now = time.monotonic()
+            for worker_id, worker in self._workers.items():
+                if worker['alive'] and now - worker['last_seen'] > self._heartbeat_timeout:
+                    worker['alive'] = False
+                    lost = [b for b, owner in self._leases.items() if owner == worker_id]
+                    for batch_id in lost:
+                        del self._leases[batch_id]
+                        # Requeued work goes to the front so it is not delayed to the end.
+                        self._pending.appendleft(batch_id)
+                    self.requeued += len(lost)
+                    print(f"Worker {worker_id} ({worker['host']}:{worker['pid']}) timed out; "
+                          f"requeued {len(lost)} batches")
+
+    def worker_summary(self):
+        with self._lock:
+            return {worker_id: {k: v for k, v in worker.items() if k != 'last_seen'}
+                    for worker_id, worker in self._workers.items()}
+
+    def summary(self):
+        """Totals of the run, copied out of the manager process"""
+        with self._lock:
+            end = self.finish_time if self.finish_time is not None else time.perf_counter()
+            return {
+                'total_time': end - self.start_time if self.start_time is not None else 0.0,
+                'requeued': self.requeued,
+                'completed_batches': len(self._completed),
+                'count': self.times.count,
+                'total': self.times.total,
+                'mean': self.times.mean,
+                'time_stats': self.times.as_dict(),
+            }
+
+# The coordinator's WorkQueue, created in its manager process by _init_work_queue.
+_work_queue = None
+
+def _init_work_queue(*args):
+    global _work_queue
+    _work_queue = WorkQueue(*args)
+
+def _get_work_queue():
+    return _work_queue
+
+class CoordinatorManager(BaseManager):
+    pass
+
+CoordinatorManager.register('get_queue', callable=_get_work_queue)
+
+class WorkerManager(BaseManager):
+    pass
+
+WorkerManager.register('get_queue')
+
+def env_authkey():
+    """Shared key from CST435_AUTHKEY, or None if it is not set"""
+    key = os.environ.get(AUTHKEY_ENV)
+    return key.encode() if key else None
+
+def is_loopback(host):
+    """Whether host only accepts connections from this machine"""
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+def coordinator_authkey(host, authkey=None):
+    """
+    Key for a coordinator bound to host: the given one, else CST435_AUTHKEY
+    Without either, binding to a non-loopback address is refused; on
+    loopback a random key is generated and printed for local workers.
+    """
+    if authkey is None:
+        authkey = env_authkey()
+    if authkey is not None:
+        return authkey
+    if not is_loopback(host):
+        raise ValueError(f"Refusing to listen on {host} without a shared key: "
+                         f"set {AUTHKEY_ENV} on the coordinator and every worker")
+    authkey = secrets.token_hex(16).encode()
+    print(f"Generated key for this run; start workers with {AUTHKEY_ENV}={authkey.decode()}")
+    return authkey
+
+def connect(address, authkey, retries=30):
+    """Connect to a coordinator, retrying while it starts up; returns the WorkQueue proxy"""
+    manager = WorkerManager(address=address, authkey=authkey)
+    for attempt in range(retries):
+        try:
+            manager.connect()
+            return manager.get_queue()
+        except ConnectionRefusedError:
+            if attempt == retries - 1:
+                raise
+            time.sleep(1)
+
+def run_coordinator(image_folder, host='127.0.0.1', port=DEFAULT_PORT, authkey=None,
+                    batch_size=16, min_workers=1, filters=None,
+                    tile_threshold=DEFAULT_TILE_THRESHOLD,
+                    heartbeat_timeout=HEARTBEAT_TIMEOUT, on_listen=None):
+    """
+    Own the image index and hand batches of paths to worker nodes over TCP
+
+    Paths are sent relative to image_folder so each node can mount the
+    dataset at its own location. Timing starts once min_workers have
+    registered and ends when every batch is complete. on_listen(address)
+    is called with the bound address (useful with port=0).
+    Workers silent for heartbeat_timeout seconds are declared dead and
+    their batches requeued; once every registered worker is dead the run
+    stops with a RuntimeError instead of waiting forever.
+    tile_threshold is forwarded to the workers as in the single-node
+    pipelines; None disables tiling.
+    The coordinator listens on loopback by default; listening on another
+    address requires a key (authkey or CST435_AUTHKEY, see coordinator_authkey).
+    Returns results in the same schema as the single-node pipelines.
+    """
+    filters = resolve_filters(filters)
+    authkey = coordinator_authkey(host, authkey)
+    image_paths = [os.path.relpath(p, image_folder) for p in index_images(image_folder)]
+    print(f"Found {len(image_paths)} images to process")
+
+    job = {'filters': filters, 'tile_threshold': tile_threshold}
+    batches = make_batches(image_paths, batch_size)
+
+    # The WorkQueue lives in the manager's server process; the coordinator
+    # and the workers all reach it through proxies.
+    manager = CoordinatorManager(address=(host, port), authkey=authkey)
+    manager.start(_init_work_queue, (batches, job, min_workers, heartbeat_timeout))
+    try:
+        work = manager.get_queue()
+        print(f"Coordinator listening on {manager.address[0]}:{manager.address[1]} "
+              f"({len(batches)} batches, waiting for {min_workers} workers)")
+        if on_listen is not None:
+            on_listen(manager.address)
+
+        # Check heartbeats until every batch has been reported complete.
+        while not work.wait_finished(HEARTBEAT_INTERVAL):
+            work.reap()
+            if work.all_workers_lost():
+                unfinished = len(batches) - work.summary()['completed_batches']
+                raise RuntimeError(f"Every worker has been silent for more than {heartbeat_timeout} "
+                                   f"seconds; {unfinished} of {len(batches)} batches are unfinished")
+        summary = work.summary()
+        workers = work.worker_summary()
+        # Leave time for workers to see the finished flag before closing.
+        time.sleep(HEARTBEAT_INTERVAL)
+    finally:
+        manager.shutdown()
+
+    print(f"\n=== Distributed Results ===")
+    print(f"Number of nodes: {len(workers)}")
+    print(f"Total images processed: {summary['count']}")
+    print(f"Batches requeued from dead workers: {summary['requeued']}")
+    print(f"Total wall-clock time: {summary['total_time']:.2f} seconds")
+    print(f"Total processing time (sum): {summary['total']:.2f} seconds")
+    print(f"Average time per image: {summary['mean']:.2f} seconds")
+
+    return {
+        'num_nodes': len(workers),
+        'num_images': summary['count'],
+        'total_time': summary['total_time'],
+        'filters': filters,
+        'batch_size': batch_size,
+        'tile_threshold': tile_threshold,
+        'requeued_batches': summary['requeued'],
+        'workers': workers,
+        'time_stats': summary['time_stats'],
+        'processing_times': []
+    }
+
+def _heartbeat_loop(address, authkey, worker_id, stop):
+    # Heartbeats use their own manager connection, separate from the work loop.
+    queue = connect(address, authkey)
+    while not stop.wait(HEARTBEAT_INTERVAL):
+        try:
+            if not queue.heartbeat(worker_id):
+                stop.set()
+        except (OSError, EOFError):
+            stop.set()
+
+def run_worker(address, image_folder, num_processes=None, authkey=None):
+    """
+    Pull batches from a coordinator and filter them with a local process pool
+    Per-image timings are reported back after every batch.
+    authkey defaults to CST435_AUTHKEY, which must match the coordinator's key.
+    """
+    if authkey is None:
+        authkey = env_authkey()
+    if authkey is None:
+        raise ValueError(f"Set {AUTHKEY_ENV} to the coordinator's key")
+    if num_processes is None:
+        num_processes = cpu_count()
+    Path("results/output_images").mkdir(parents=True, exist_ok=True)
+
+    # Start the pool before registering so its startup is not counted in the run time.
+    processed = 0
+    stop = threading.Event()
+    # Split this node's cores between its processes, as the single-node pipelines do.
+    _, threads_per_worker = resolve_budget(num_processes)
+    with Pool(processes=num_processes, initializer=init_worker_threads,
+              initargs=(threads_per_worker,)) as pool:
+        queue = connect(address, authkey)
+        worker_id, job = queue.register(socket.gethostname(), os.getpid(), num_processes)
+        print(f"Worker {worker_id} connected to {address[0]}:{address[1]} "
+              f"with {num_processes} processes")
+        threading.Thread(target=_heartbeat_loop, args=(address, authkey, worker_id, stop),
+                         daemon=True).start()
+
+        worker = partial(process_single_image, filters=job['filters'],
+                         tile_threshold=job['tile_threshold'])
+        try:
+            while not stop.is_set():
+                lease = queue.next_batch(worker_id)
+                if lease is None:
+                    break
+                if lease == 'wait':
+                    time.sleep(0.2)
+                    continue
+                batch_id, rel_paths = lease
+                timings = pool.map(worker, [os.path.join(image_folder, p) for p in rel_paths])
+                queue.complete(worker_id, batch_id, timings)
+                processed += len(timings)
+        except (OSError, EOFError):
+            # The coordinator went away; nothing more can be reported.
+            print(f"Worker {worker_id} lost its coordinator")
+        finally:
+            stop.set()
+    print(f"Worker {worker_id} finished after {processed} images")
+    return processed
+
+def run_local_cluster(image_folder, num_nodes, processes_per_node=1, **coordinator_options):
+    """
+    Run a coordinator here and num_nodes worker processes on localhost
+    Each worker stands in for one machine with processes_per_node cores.
+    """
+    workers = []
+    # The key is handed to the local workers directly, so a fresh one is used per run.
+    authkey = coordinator_options.pop('authkey', None) or secrets.token_hex(16).encode()
+
+    def start_workers(address):
+        # Workers connect through loopback, just as remote nodes would over the network.
+        address = ('127.0.0.1', address[1])
+        for _ in range(num_nodes):
+            process = Process(target=run_worker,
+                              args=(address, image_folder, processes_per_node, authkey))
+            process.start()
+            workers.append(process)
+
+    try:
+        return run_coordinator(image_folder, host='127.0.0.1', port=0, authkey=authkey,
+                               min_workers=num_nodes, on_listen=start_workers,
+                               **coordinator_options)
+    finally:
+        for process in workers:
+            process.join(timeout=HEARTBEAT_TIMEOUT)
+            if process.is_alive():
+                process.terminate()
+
+def run_distributed_experiment(image_folder, node_counts=None, processes_per_node=1,
+                               **coordinator_options):
+    """
+    Run the coordinator with different numbers of localhost worker nodes
+    Results are keyed by node count, like the other experiments.
+    """
+    if node_counts is None:
+        node_counts = [1, 2, 4]
+
+    results = {}
+    for num_nodes in node_counts:
+        print(f"\n{'='*50}")
+        print(f"Running with {num_nodes} nodes x {processes_per_node} processes...")
+        print('='*50)
+
+        results[num_nodes] = run_local_cluster(image_folder, num_nodes, processes_per_node,
+                                               **coordinator_options)
+
+        # Short pause between runs, as in the other experiments.
+        time.sleep(2)
+
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Multi-node image processing over TCP")
+    sub = parser.add_subparsers(dest='role', required=True)
+
+    coord = sub.add_parser('coordinator', help="serve batches of the dataset to workers")
+    coord.add_argument('--dataset', default="food101_subset")
+    coord.add_argument('--host', default='127.0.0.1',
+                       help=f"address to listen on; anything but loopback requires {AUTHKEY_ENV}")
+    coord.add_argument('--port', type=int, default=DEFAULT_PORT)
+    coord.add_argument('--batch-size', type=int, default=16)
+    coord.add_argument('--min-workers', type=int, default=1)
+    coord.add_argument('--filters', default=None, help="comma-separated filter names")
+
+    work = sub.add_parser('worker', help="process batches from a coordinator")
+    work.add_argument('--dataset', default="food101_subset", help="dataset path on this node")
+    work.add_argument('--host', required=True, help="coordinator address")
+    work.add_argument('--port', type=int, default=DEFAULT_PORT)
+    work.add_argument('--processes', type=int, default=None)
+
+    local = sub.add_parser('local', help="node-scaling experiment with workers on localhost")
+    local.add_argument('--dataset', default="food101_subset")
+    local.add_argument('--nodes', default="1,2,4", help="comma-separated node counts")
+    local.add_argument('--processes', type=int, default=1, help="processes per node")
+
+    args = parser.parse_args(argv)
+
+    if args.role == 'worker':
+        if env_authkey() is None:
+            print(f"Set {AUTHKEY_ENV} to the coordinator's key.")
+            sys.exit(1)
+        run_worker((args.host, args.port), args.dataset, args.processes)
+        return
+
+    if not os.path.exists(args.dataset):
+        print(f"Dataset path '{args.dataset}' not found!")
+        sys.exit(1)
+
+    if args.role == 'coordinator':
+        if env_authkey() is None and not is_loopback(args.host):
+            print(f"Listening on {args.host} requires a shared key: set {AUTHKEY_ENV} "
+                  f"on the coordinator and every worker.")
+            sys.exit(1)
+        try:
+            result = run_coordinator(args.dataset, args.host, args.port,
+                                     batch_size=args.batch_size, min_workers=args.min_workers,
+                                     filters=args.filters)
+        except RuntimeError as e:
+            print(e)
+            sys.exit(1)
+        results = {result['num_nodes']: result}
+    else:
+        node_counts = [int(n) for n in args.nodes.split(',')]
+        results = run_distributed_experiment(args.dataset, node_counts, args.processes)
+
+    # Saved next to the single-node results; performance_analysis plots node speedup from it.
+    import json
+    Path("results/performance_data").mkdir(parents=True, exist_ok=True)
+    with open('results/performance_data/distributed_results.json', 'w') as f:
+        json.dump(results, f, indent=2)
+    print("Results saved to: results/performance_data/distributed_results.json")
+
+if __name__ == "__main__":
+    main()
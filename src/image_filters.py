@@ -1,6 +1,145 @@
 import cv2
 import numpy as np
+from functools import lru_cache
 from PIL import Image, ImageFilter, ImageEnhance
+from output_codecs import DEFAULT_CODEC
+from input_shards import is_packed_ref, read_packed, read_source_bytes
+from stage_profile import stage
+
+# Integer form of PIL's ImageFilter.SHARPEN kernel (scale 16, offset 0).
+SHARPEN_KERNEL = np.array([[-2, -2, -2],
+                           [-2, 32, -2],
+                           [-2, -2, -2]], dtype=np.float32)
+SHARPEN_SCALE_SHIFT = 4  # divide by 16
+
+# Decode flags for preview scales. For JPEGs, libjpeg then scales the DCT
+# blocks while decoding (1/2, 1/4 or 1/8 of the size in each dimension),
+# so a reduced decode is far cheaper than decoding in full and resizing.
+PREVIEW_DECODE_FLAGS = {
+    None: cv2.IMREAD_COLOR,
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+def check_preview_scale(preview_scale):
+    """Validate a preview scale (None for full resolution, or 2, 4 or 8)"""
+    if preview_scale not in PREVIEW_DECODE_FLAGS:
+        raise ValueError(f"Unsupported preview scale: {preview_scale}. Available: 2, 4, 8")
+    return None if preview_scale == 1 else preview_scale
+
+# Arithmetic used for the Sobel gradient magnitude of edge detection.
+# float64: 64-bit float Sobel and NumPy sqrt (the reference output).
+# float32: exact int16 Sobel and cv2.magnitude in float32, rounded so the
+#          result matches the reference exactly (see EDGE_FLOAT32_BIAS).
+# l1:      |dx| + |dy| scaled by EDGE_L1_WEIGHT in saturating 8-bit
+#          arithmetic; an approximation with no float frames at all.
+# checks.edge_precision_error measures the difference from float64 on an image.
+EDGE_PRECISIONS = ('float64', 'float32', 'l1')
+
+# cv2.magnitude is not correctly rounded in float32: an exact root such as
+# 122 can come back as 121.99999 and truncate to 121. Where it matters
+# (below 255), an inexact root is at least about 2e-3 from the next
+# integer, so adding 1e-3 before truncating fixes exact roots without
+# rounding any other value up. Checked against float64 for every (dx, dy)
+# pair a 3x3 Sobel of 8-bit input can produce.
+EDGE_FLOAT32_BIAS = 1e-3
+
+# Scale applied to |dx| and |dy| in l1 mode. The L1 norm overestimates the
+# magnitude by up to sqrt(2); 0.75 gave the lowest mean error on the dataset.
+EDGE_L1_WEIGHT = 0.75
+
+def check_edge_precision(edge_precision):
+    """Validate an edge precision (None for the float64 reference)"""
+    if edge_precision is not None and edge_precision not in EDGE_PRECISIONS:
+        raise ValueError(f"Unknown edge precision: {edge_precision}. "
+                         f"Available: {', '.join(EDGE_PRECISIONS)}")
+    return None if edge_precision == 'float64' else edge_precision
+
+# Bump whenever a filter's output changes so cached results are invalidated,
+# and record the new golden hash (python src/checks.py golden).
+FILTER_CODE_VERSION = "4"
+
+@lru_cache(maxsize=None)
+def _print_once(message):
+    # Notices about ignored options, printed once per process, not per image.
+    print(message)
+
+# Point operations: functions of the pixel level alone, so any chain of them
+# compiles into one 256-entry lookup table applied with a single cv2.LUT
+# pass. Each maps float levels in [0, 255] to new float levels; adding an
+# entry here is all a new point filter needs.
+POINT_OPS = {
+    # Scale towards black, as PIL's ImageEnhance.Brightness does.
+    'brightness': lambda levels, factor: levels * factor,
+    # Scale the distance from mid-grey. PIL's ImageEnhance.Contrast pivots
+    # on the image's mean instead, which no fixed table can reproduce.
+    'contrast': lambda levels, factor: 128 + (levels - 128) * factor,
+    # Power law on normalised levels; values below 1 brighten the midtones.
+    'gamma': lambda levels, gamma: 255 * (levels / 255) ** gamma,
+}
+
+# Chain behind the brightened output (PIL-equivalent brightness 1.5).
+DEFAULT_POINT_OPS = (('brightness', 1.5),)
+
+def check_point_ops(point_ops):
+    """
+    Normalise a chain of point operations to a tuple of (name, value) pairs
+    point_ops is a spec such as 'brightness=1.2,gamma=0.8', a dict or a
+    sequence of pairs, applied in order. Returns None for the default chain.
+    """
+    if point_ops is None:
+        return None
+    if isinstance(point_ops, str):
+        pairs = []
+        for item in point_ops.split(','):
+            name, sep, value = item.partition('=')
+            if not sep:
+                raise ValueError(f"Invalid point operation: {item.strip()} (expected name=value)")
+            pairs.append((name.strip(), value))
+        point_ops = pairs
+    elif isinstance(point_ops, dict):
+        point_ops = point_ops.items()
+    
+    ops = []
+    for name, value in point_ops:
+        if name not in POINT_OPS:
+            raise ValueError(f"Unknown point operation: {name}. Available: {', '.join(POINT_OPS)}")
+        value = float(value)
+        if name == 'gamma' and value <= 0:
+            raise ValueError(f"gamma must be positive, got {value}")
+        ops.append((name, value))
+    if not ops:
+        raise ValueError("No point operations given")
+    ops = tuple(ops)
+    return None if ops == DEFAULT_POINT_OPS else ops
+
+def point_ops_label(ops):
+    """Spec string of a point operation chain, e.g. 'brightness=1.2,gamma=0.8'"""
+    return ','.join(f"{name}={value:g}" for name, value in (ops or DEFAULT_POINT_OPS))
+
+@lru_cache(maxsize=64)
+def point_lut(ops):
+    """
+    256-entry lookup table for a tuple of (name, value) point operations
+    Levels stay in float through the chain and are clipped to [0, 255]
+    after every step, like separate 8-bit passes, but truncated to 8 bits
+    only once at the end, so rounding does not accumulate. The table is
+    computed in float32 because PIL's blend is: for brightness alone this
+    reproduces ImageEnhance.Brightness (a blend against black, truncated)
+    exactly, where float64 differs by one level at some factors.
+    """
+    levels = np.arange(256, dtype=np.float32)
+    for name, value in ops:
+        levels = np.clip(POINT_OPS[name](levels, np.float32(value)), 0, 255)
+    lut = levels.astype(np.uint8)
+    lut.flags.writeable = False
+    return lut
+
+def brightness_lut(factor):
+    """256-entry lookup table equivalent to PIL's ImageEnhance.Brightness"""
+    return point_lut((('brightness', factor),))
 
 class ImageProcessor:
     # This class groups all image filtering operations into a single, reusable component.
@@ -17,8 +156,7 @@ class ImageProcessor:
         
         # Convert the image to grayscale using OpenCV's optimized implementation,
         # which internally applies the luminance-based conversion.
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        return gray
+        return ImageProcessor.grayscale_from_array(img)
     
     @staticmethod
     def apply_gaussian_blur(image_path):
@@ -31,8 +169,7 @@ class ImageProcessor:
         
         # Apply a 3x3 Gaussian blur to reduce noise and smooth the image.
         # A small kernel is used to balance smoothing with detail preservation.
-        blurred = cv2.GaussianBlur(img, (3, 3), 0)
-        return blurred
+        return ImageProcessor.gaussian_blur_from_array(img)
     
     @staticmethod
     def apply_edge_detection(image_path):
@@ -43,18 +180,9 @@ class ImageProcessor:
             # Return None if image loading fails.
             return None
         
-        # Apply Sobel operators in the horizontal (x) and vertical (y) directions.
-        sobel_x = cv2.Sobel(img, cv2.CV_64F, 1, 0, ksize=3)
-        sobel_y = cv2.Sobel(img, cv2.CV_64F, 0, 1, ksize=3)
-        
-        # Compute the gradient magnitude to combine edge responses
-        # from both directions into a single edge map.
-        magnitude = np.sqrt(sobel_x**2 + sobel_y**2)
-        
-        # Clip values to valid image range and convert to 8-bit format.
-        magnitude = np.uint8(np.clip(magnitude, 0, 255))
-        
-        return magnitude
+        # Apply Sobel operators in both directions and combine them
+        # into a single 8-bit gradient magnitude map.
+        return ImageProcessor.edge_detection_from_gray(img)
     
     @staticmethod
     def apply_sharpening(image_path):
@@ -97,44 +225,504 @@ class ImageProcessor:
         return brightened_np
     
     @staticmethod
-    def apply_all_filters(image_path, output_dir="processed"):
+    def load_image(image_path, preview_scale=None):
+        """
+        Decode an image from disk once so it can be shared by every filter
+        preview_scale 2, 4 or 8 decodes at that fraction of the full size.
+        """
+        # OpenCV decodes into a BGR array, which is the layout every
+        # array-based filter below expects as input.
+        if is_packed_ref(image_path):
+            # Decode straight from the memory-mapped shard.
+            return ImageProcessor.decode_image_bytes(read_packed(image_path), preview_scale)
+        return cv2.imread(image_path, PREVIEW_DECODE_FLAGS[preview_scale])
+    
+    @staticmethod
+    def decode_image_bytes(data, preview_scale=None):
+        """Decode an encoded image (e.g. JPEG bytes read ahead of time) into BGR"""
+        buffer = np.frombuffer(data, dtype=np.uint8)
+        return cv2.imdecode(buffer, PREVIEW_DECODE_FLAGS[preview_scale])
+    
+    @staticmethod
+    def run_filters(img, filters=None, tile_threshold=None, timer=None, graph=None):
+        """
+        Run the selected filters on a decoded BGR image and return their outputs
+        Images with at least tile_threshold pixels are split into tiles that
+        are filtered in parallel and stitched back together.
+        timer is an optional StageTimer that records each filter's time.
+        graph defaults to DEFAULT_GRAPH (see filter_graph for variants).
+        """
+        filters = resolve_filters(filters)
+        graph = DEFAULT_GRAPH if graph is None else graph
+        if tile_threshold is not None and img.shape[0] * img.shape[1] >= tile_threshold:
+            from tiling import run_filters_tiled
+            # Tiles of every filter overlap in time, so only the total is meaningful.
+            with stage(timer, 'filter:tiled'):
+                return run_filters_tiled(img, filters, graph)
+        return graph.run({'bgr': img}, filters, timer)
+    
+    @staticmethod
+    def encode_output(result, codec=DEFAULT_CODEC):
+        """Encode one filter output with an OutputCodec (JPEG by default)"""
+        return codec.encode(result)
+    
+    @staticmethod
+    def save_outputs(image_path, outputs, output_dir, timer=None, codecs=None, archive_dir=None):
+        """
+        Encode and write filter outputs as <stem>_<filter><ext> in output_dir
+        codecs maps filter names to OutputCodecs (see output_codecs); outputs
+        without one are written as default JPEGs, and 'none' outputs are
+        skipped. With archive_dir the outputs are appended, under the same
+        names, to the calling worker's tar shard instead (see archive_sink).
+        timer is an optional StageTimer that records each encode and write,
+        plus the encode time and bytes of every codec.
+        """
+        import time
+        from pathlib import Path
+        
+        # Create the output directory if it does not already exist.
+        if archive_dir is None:
+            Path(output_dir).mkdir(exist_ok=True)
+        
+        # Extract the base filename without the extension for naming outputs.
+        filename = Path(image_path).stem
+        
+        # Write each filtered image to disk with descriptive suffixes.
+        members = []
+        for name, result in outputs.items():
+            codec = codecs.get(name, DEFAULT_CODEC) if codecs else DEFAULT_CODEC
+            if not codec.writes:
+                continue
+            output_name = f"{filename}_{name}{codec.ext}"
+            encode_start = time.perf_counter()
+            with stage(timer, f'encode:{name}'):
+                data = codec.encode(result)
+            if timer is not None:
+                timer.add_output(codec.label, time.perf_counter() - encode_start, len(data))
+            
+            if archive_dir is not None:
+                members.append((output_name, data))
+            else:
+                with stage(timer, f'write:{name}'):
+                    with open(f"{output_dir}/{output_name}", 'wb') as f:
+                        f.write(data)
+        
+        # All outputs of the image go into the shard with a single append.
+        if members:
+            from archive_sink import append_members
+            with stage(timer, 'write:archive'):
+                append_members(archive_dir, members)
+    
+    @staticmethod
+    def grayscale_from_array(img):
+        """Grayscale conversion on an already decoded BGR image"""
+        return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    
+    @staticmethod
+    def gaussian_blur_from_array(img):
+        """3x3 Gaussian blur on an already decoded image"""
+        return cv2.GaussianBlur(img, (3, 3), 0)
+    
+    @staticmethod
+    def edge_detection_from_gray(gray, precision='float64'):
+        """
+        Sobel edge detection on an already converted grayscale image
+        precision selects the magnitude arithmetic (see EDGE_PRECISIONS).
+        """
+        if precision == 'float32':
+            # 3x3 Sobel responses of 8-bit input fit in int16 exactly and
+            # convert to float32 exactly; only the square root is inexact.
+            sobel_x = cv2.Sobel(gray, cv2.CV_16S, 1, 0, ksize=3)
+            sobel_y = cv2.Sobel(gray, cv2.CV_16S, 0, 1, ksize=3)
+            magnitude = cv2.magnitude(sobel_x.astype(np.float32), sobel_y.astype(np.float32))
+            # Nudge exact roots back up, then clip in place and truncate
+            # like the float64 path.
+            magnitude += EDGE_FLOAT32_BIAS
+            np.minimum(magnitude, 255, out=magnitude)
+            return magnitude.astype(np.uint8)
+        if precision == 'l1':
+            # Scaled absolute gradients, saturated to 8 bits and added with saturation.
+            sobel_x = cv2.Sobel(gray, cv2.CV_16S, 1, 0, ksize=3)
+            sobel_y = cv2.Sobel(gray, cv2.CV_16S, 0, 1, ksize=3)
+            return cv2.add(cv2.convertScaleAbs(sobel_x, alpha=EDGE_L1_WEIGHT),
+                           cv2.convertScaleAbs(sobel_y, alpha=EDGE_L1_WEIGHT))
+        
+        # Apply Sobel operators in the horizontal (x) and vertical (y) directions.
+        sobel_x = cv2.Sobel(gray, cv2.CV_64F, 1, 0, ksize=3)
+        sobel_y = cv2.Sobel(gray, cv2.CV_64F, 0, 1, ksize=3)
+        
+        # Compute the gradient magnitude to combine edge responses
+        # from both directions into a single edge map.
+        magnitude = np.sqrt(sobel_x**2 + sobel_y**2)
+        
+        # Clip values to valid image range and convert to 8-bit format.
+        return np.uint8(np.clip(magnitude, 0, 255))
+    
+    @staticmethod
+    def sharpening_from_array(img):
+        """OpenCV equivalent of PIL's SHARPEN filter on a decoded image"""
+        # Accumulate the integer kernel in 16 bits; the largest possible
+        # magnitude (32 * 255) fits comfortably in int16.
+        acc = cv2.filter2D(img, cv2.CV_16S, SHARPEN_KERNEL)
+        
+        # PIL divides by the kernel scale and rounds half up, which is an
+        # add-then-shift in integer arithmetic. Saturate back to 8 bits.
+        acc += 1 << (SHARPEN_SCALE_SHIFT - 1)
+        np.right_shift(acc, SHARPEN_SCALE_SHIFT, out=acc)
+        sharpened = np.clip(acc, 0, 255, out=acc).astype(np.uint8)
+        
+        # PIL leaves the outermost rows and columns untouched.
+        sharpened[0], sharpened[-1] = img[0], img[-1]
+        sharpened[:, 0], sharpened[:, -1] = img[:, 0], img[:, -1]
+        
+        # If the input is grayscale, convert it to a 3-channel image
+        # to maintain consistent output formats across filters.
+        if sharpened.ndim == 2:
+            sharpened = cv2.cvtColor(sharpened, cv2.COLOR_GRAY2BGR)
+        return sharpened
+    
+    @staticmethod
+    def brightness_from_array(img, factor=1.5):
+        """Brightness adjustment on a decoded image using a lookup table"""
+        # A single saturating table lookup per pixel, matching PIL's output
+        # while keeping the BGR channel order of the input.
+        return ImageProcessor.point_ops_from_array(img, (('brightness', factor),))
+    
+    @staticmethod
+    def point_ops_from_array(img, ops=DEFAULT_POINT_OPS):
+        """Apply a chain of point operations (see POINT_OPS) in one table lookup"""
+        adjusted = cv2.LUT(img, point_lut(tuple(ops)))
+        if adjusted.ndim == 2:
+            adjusted = cv2.cvtColor(adjusted, cv2.COLOR_GRAY2BGR)
+        return adjusted
+    
+    @staticmethod
+    def apply_all_filters(image_path, output_dir="processed", decode_once=True, filters=None,
+                          cache=None, tile_threshold=None, profile_dir=None, trace_dir=None,
+                          codecs=None, archive_dir=None, preview_scale=None, edge_precision=None,
+                          point_ops=None):
         """
-        Apply all 5 filters sequentially to one image
+        Apply the selected filters (all 5 by default) to one image
         Returns processing time
+        
+        With decode_once=True the image is decoded a single time and the
+        filter graph computes every shared intermediate only once;
+        decode_once=False keeps the original behaviour of letting each
+        filter load the file itself. The outputs are the same except for
+        edges: they are computed from the colour decode converted to gray,
+        not from a separate IMREAD_GRAYSCALE decode, which for JPEGs returns
+        the stored luma without the colour round trip. On the sample set
+        about 4% of edge pixels differ, by at most 53 levels and 0.12 on
+        average (see checks.check_decode_once).
+        
+        cache is an optional ResultCache; outputs already cached for this
+        image content, filter and parameters are served from it and only
+        the missing filters are computed (decode_once mode only).
+        
+        Images with at least tile_threshold pixels are filtered as tiles in
+        parallel threads (decode_once mode only); None disables tiling.
+        
+        preview_scale 2, 4 or 8 decodes the image at that fraction of its
+        width and height and filters the smaller image, for previews and
+        thumbnails (decode_once mode only).
+        
+        edge_precision 'float32' (same output) or 'l1' (approximate)
+        computes edge detection with smaller intermediates than the float64
+        default (see EDGE_PRECISIONS; decode_once mode only).
+        
+        point_ops replaces the brightness 1.5 of the brightened output with
+        another chain of brightness, contrast and gamma steps (see
+        check_point_ops), applied as one lookup table (decode_once mode only).
+        
+        codecs maps filters to output formats (see save_outputs); outputs
+        with the 'none' codec are computed but neither encoded nor written.
+        archive_dir streams the outputs into tar shards instead of separate
+        files in output_dir (see archive_sink).
+        
+        profile_dir enables per-stage instrumentation: the decode, each
+        filter, encode and write are timed and appended, with the worker PID
+        and image size, to a per-process file in profile_dir (see
+        stage_profile). trace_dir records the task and its stages as
+        timeline spans for Chrome trace export (see tracing). When both are
+        None no timers are created at all.
         """
         import time
         
         # Record the start time to measure total processing duration.
-        start_time = time.time()
+        start_time = time.perf_counter()
+        
+        # Validate the requested filter names before doing any work.
+        filters = resolve_filters(filters)
+        graph = filter_graph(edge_precision, check_point_ops(point_ops))
+        
+        timer = None
+        if profile_dir is not None or trace_dir is not None:
+            from stage_profile import StageTimer
+            timer = StageTimer(image_path)
         
-        # Apply each filter independently using the original image path.
-        # This design ensures filters do not depend on the output of previous filters.
-        gray = ImageProcessor.apply_grayscale(image_path)
-        blurred = ImageProcessor.apply_gaussian_blur(image_path)
-        edges = ImageProcessor.apply_edge_detection(image_path)
-        sharpened = ImageProcessor.apply_sharpening(image_path)
-        brightened = ImageProcessor.apply_brightness_adjustment(image_path)
+        if cache is not None and not decode_once:
+            _print_once("Result cache is not used with decode_once=False")
+        
+        if decode_once and cache is not None:
+            # Content-addressed path: only compute what the cache lacks.
+            ImageProcessor._apply_cached(image_path, output_dir, filters, cache, tile_threshold, timer,
+                                         codecs, archive_dir, preview_scale, graph)
+            outputs = None
+        elif decode_once:
+            # Decode the file once and let the graph derive everything else
+            # from it, e.g. edge detection reuses the grayscale result.
+            with stage(timer, 'decode'):
+                img = ImageProcessor.load_image(image_path, preview_scale)
+            if img is None:
+                raise ValueError(f"Could not decode image: {image_path}")
+            if timer is not None:
+                timer.set_shape(img)
+            outputs = ImageProcessor.run_filters(img, filters, tile_threshold, timer, graph)
+        else:
+            # Apply each filter independently using the original image path.
+            # This design ensures filters do not depend on the output of previous filters.
+            if is_packed_ref(image_path):
+                raise ValueError("decode_once=False needs image files, not a packed dataset")
+            if preview_scale is not None:
+                raise ValueError("preview_scale requires decode_once=True")
+            if edge_precision is not None:
+                raise ValueError("edge_precision requires decode_once=True")
+            if check_point_ops(point_ops) is not None:
+                raise ValueError("point_ops requires decode_once=True")
+            outputs = {name: PATH_FILTERS[name](image_path) for name in filters}
         
         # Save all filtered outputs if an output directory is specified.
-        if output_dir:
-            import os
-            from pathlib import Path
-            
-            # Create the output directory if it does not already exist.
-            Path(output_dir).mkdir(exist_ok=True)
-            
-            # Extract the base filename without the extension for naming outputs.
-            filename = Path(image_path).stem
-            
-            # Write each filtered image to disk with descriptive suffixes.
-            cv2.imwrite(f"{output_dir}/{filename}_gray.jpg", gray)
-            cv2.imwrite(f"{output_dir}/{filename}_blurred.jpg", blurred)
-            cv2.imwrite(f"{output_dir}/{filename}_edges.jpg", edges)
-            cv2.imwrite(f"{output_dir}/{filename}_sharpened.jpg", sharpened)
-            cv2.imwrite(f"{output_dir}/{filename}_brightened.jpg", brightened)
+        if (output_dir or archive_dir) and outputs is not None:
+            ImageProcessor.save_outputs(image_path, outputs, output_dir, timer, codecs, archive_dir)
         
         # Capture the end time after all processing and saving is complete.
-        end_time = time.time()
+        end_time = time.perf_counter()
+        
+        if timer is not None:
+            timer.add('total', end_time - start_time)
+            if profile_dir is not None:
+                timer.write(profile_dir)
+            if trace_dir is not None:
+                from tracing import write_task_trace
+                write_task_trace(trace_dir, image_path, start_time, end_time, timer)
         
         # Return total processing time for performance evaluation.
         return end_time - start_time
+    
+    @staticmethod
+    def _apply_cached(image_path, output_dir, filters, cache, tile_threshold=None, timer=None,
+                      codecs=None, archive_dir=None, preview_scale=None, graph=None):
+        """Serve outputs from the result cache and compute only the misses"""
+        import time
+        import shutil
+        from pathlib import Path
+        from result_cache import hash_bytes
+        
+        # Hash the encoded source once; the same bytes are decoded on a miss.
+        with stage(timer, 'read'):
+            data = read_source_bytes(image_path)
+        with stage(timer, 'cache'):
+            source_hash = hash_bytes(data)
+        
+        if output_dir and archive_dir is None:
+            Path(output_dir).mkdir(exist_ok=True)
+        filename = Path(image_path).stem
+        # (name, bytes) of every output when streaming into an archive shard
+        members = []
+        
+        # The encoding is part of the cached entry, so non-default codecs key
+        # on their spec too; outputs that are never written are not cached.
+        # Codecs are compared by label: worker processes receive pickled
+        # copies, never the DEFAULT_CODEC object itself.
+        codecs = {name: codecs.get(name, DEFAULT_CODEC) if codecs else DEFAULT_CODEC
+                  for name in filters}
+        graph = DEFAULT_GRAPH if graph is None else graph
+        keys = {}
+        for name in filters:
+            params = graph.signature(name)
+            if preview_scale is not None:
+                params = [params, f"1/{preview_scale}"]
+            if codecs[name].label != DEFAULT_CODEC.label:
+                params = [params, codecs[name].label]
+            keys[name] = cache.key(source_hash, name, params) if codecs[name].writes else None
+        
+        # Copy every cached output into place and remember which are missing.
+        missing = []
+        with stage(timer, 'cache'):
+            for name, key in keys.items():
+                cached_path = cache.get(key) if key is not None else None
+                if cached_path is None:
+                    missing.append(name)
+                elif archive_dir is not None:
+                    with open(cached_path, 'rb') as f:
+                        members.append((f"{filename}_{name}{codecs[name].ext}", f.read()))
+                elif output_dir:
+                    shutil.copyfile(cached_path, f"{output_dir}/{filename}_{name}{codecs[name].ext}")
+        
+        # Compute only the missing filters, then store and write their encodings.
+        outputs = {}
+        if missing:
+            with stage(timer, 'decode'):
+                img = ImageProcessor.decode_image_bytes(data, preview_scale)
+            if img is None:
+                raise ValueError(f"Could not decode image: {image_path}")
+            if timer is not None:
+                timer.set_shape(img)
+            outputs = ImageProcessor.run_filters(img, missing, tile_threshold, timer, graph)
+        for name, result in outputs.items():
+            codec = codecs[name]
+            if not codec.writes:
+                continue
+            encode_start = time.perf_counter()
+            with stage(timer, f'encode:{name}'):
+                encoded = codec.encode(result)
+            if timer is not None:
+                timer.add_output(codec.label, time.perf_counter() - encode_start, len(encoded))
+            with stage(timer, 'cache'):
+                cache.put(keys[name], encoded)
+            if archive_dir is not None:
+                members.append((f"{filename}_{name}{codec.ext}", encoded))
+            elif output_dir:
+                with stage(timer, f'write:{name}'):
+                    with open(f"{output_dir}/{filename}_{name}{codec.ext}", 'wb') as f:
+                        f.write(encoded)
+        
+        if members:
+            from archive_sink import append_members
+            with stage(timer, 'write:archive'):
+                append_members(archive_dir, members)
+
+
+class FilterNode:
+    # One step of the filter graph: the named inputs it consumes, the function
+    # that produces its result, fixed keyword parameters for that function,
+    # whether the result is a user-visible output or only an intermediate,
+    # and the halo: how many pixels of neighbourhood its kernel reads.
+    
+    def __init__(self, inputs, func, params=None, output=True, halo=0):
+        self.inputs = tuple(inputs)
+        self.func = func
+        self.params = dict(params or {})
+        self.output = output
+        self.halo = halo
+
+
+class FilterGraph:
+    # A small declarative filter engine. Each node names the values it needs
+    # ("bgr" for the decoded image, "gray", ...) and run() evaluates only the
+    # nodes required for the requested outputs, computing each one once.
+    
+    def __init__(self):
+        self.nodes = {}
+    
+    def add(self, name, inputs, func, params=None, output=True, halo=0):
+        """Register a node; inputs refer to other nodes or to run() sources"""
+        self.nodes[name] = FilterNode(inputs, func, params, output, halo)
+    
+    def halo(self, name):
+        """Total border a node needs around a tile, including its inputs' halos"""
+        if name not in self.nodes:
+            return 0
+        node = self.nodes[name]
+        return node.halo + max((self.halo(dep) for dep in node.inputs), default=0)
+    
+    def signature(self, name):
+        """
+        Everything that determines a node's result apart from the image:
+        its name, parameters and, recursively, those of its inputs
+        """
+        if name not in self.nodes:
+            # Sources such as the decoded image are identified by name only.
+            return name
+        node = self.nodes[name]
+        return {
+            'name': name,
+            'params': node.params,
+            'inputs': [self.signature(dep) for dep in node.inputs],
+        }
+    
+    def output_names(self):
+        """Names of every node that produces a user-visible output"""
+        return [name for name, node in self.nodes.items() if node.output]
+    
+    def run(self, sources, targets, timer=None):
+        """
+        Evaluate the requested targets given precomputed sources
+        Returns a dict mapping each target name to its result
+        timer is an optional StageTimer; each node's own time (excluding
+        its inputs) is recorded as "filter:<name>".
+        """
+        # Values already available, starting with the sources (e.g. the decoded image).
+        # Every computed node is memoised here so shared intermediates run once.
+        values = dict(sources)
+        
+        def compute(name):
+            if name not in values:
+                if name not in self.nodes:
+                    raise KeyError(f"No source or filter named '{name}'")
+                node = self.nodes[name]
+                args = [compute(dep) for dep in node.inputs]
+                with stage(timer, f'filter:{name}'):
+                    values[name] = node.func(*args, **node.params)
+            return values[name]
+        
+        return {name: compute(name) for name in targets}
+
+
+def build_default_graph(edge_precision=None, point_ops=None):
+    """Filter graph for the five standard filters"""
+    graph = FilterGraph()
+    graph.add('gray', ['bgr'], ImageProcessor.grayscale_from_array)
+    graph.add('blurred', ['bgr'], ImageProcessor.gaussian_blur_from_array, halo=1)
+    # The precision is a node parameter, so it is part of the cache signature;
+    # the float64 default adds none and keeps existing cache entries valid.
+    edge_params = {'precision': edge_precision} if edge_precision is not None else None
+    graph.add('edges', ['gray'], ImageProcessor.edge_detection_from_gray, edge_params, halo=1)
+    graph.add('sharpened', ['bgr'], ImageProcessor.sharpening_from_array, halo=1)
+    if point_ops is None:
+        graph.add('brightened', ['bgr'], ImageProcessor.brightness_from_array, {'factor': 1.5})
+    else:
+        # Another chain of point operations behind the same output.
+        graph.add('brightened', ['bgr'], ImageProcessor.point_ops_from_array, {'ops': point_ops})
+    return graph
+
+
+DEFAULT_GRAPH = build_default_graph()
+
+@lru_cache(maxsize=None)
+def filter_graph(edge_precision=None, point_ops=None):
+    """
+    Standard filter graph, or a variant with another edge precision or
+    point operation chain (a tuple from check_point_ops)
+    """
+    edge_precision = check_edge_precision(edge_precision)
+    point_ops = check_point_ops(point_ops)
+    if edge_precision is None and point_ops is None:
+        return DEFAULT_GRAPH
+    return build_default_graph(edge_precision, point_ops)
+
+# Names of the standard outputs, in the order they are written to disk.
+FILTER_NAMES = tuple(DEFAULT_GRAPH.output_names())
+
+# Path-based equivalents used when decode_once is disabled.
+PATH_FILTERS = {
+    'gray': ImageProcessor.apply_grayscale,
+    'blurred': ImageProcessor.apply_gaussian_blur,
+    'edges': ImageProcessor.apply_edge_detection,
+    'sharpened': ImageProcessor.apply_sharpening,
+    'brightened': ImageProcessor.apply_brightness_adjustment,
+}
+
+
+def resolve_filters(filters=None):
+    """Return the list of filters to run, defaulting to all of them"""
+    if filters is None:
+        return list(FILTER_NAMES)
+    if isinstance(filters, str):
+        filters = [f.strip() for f in filters.split(',') if f.strip()]
+    unknown = [f for f in filters if f not in FILTER_NAMES]
+    if unknown:
+        raise ValueError(f"Unknown filter(s): {', '.join(unknown)}. "
+                         f"Available: {', '.join(FILTER_NAMES)}")
+    return list(filters)
+
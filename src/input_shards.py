@@ -0,0 +1,116 @@
+import os
+import re
+import mmap
+import argparse
+from functools import lru_cache
+from archive_sink import INDEX_NAME, tar_blocks, finalize_archive, load_index
+
+# Packed datasets use the output archive layout (see archive_sink): tar
+# shards plus an index.json of member offsets, so the shards are plain tar
+# files and an archived run can itself be used as input.
+DEFAULT_SHARD_BYTES = 256 * 1024 ** 2
+
+# A packed image travels through the pipelines as a reference string in
+# place of a file path: <pack_dir>/<shard>.tar@<offset>+<size>/<name>,
+# where name is the member's path relative to the packed folder. The image
+# file name stays the last path component, so output naming (Path.stem)
+# and trace labels work unchanged, and workers need no index.
+_REF_PATTERN = re.compile(r'^(.+\.tar)@(\d+)\+(\d+)/(.+)$')
+
+def pack_dataset(image_folder, pack_dir, shard_bytes=DEFAULT_SHARD_BYTES):
+    """
+    Pack every image under image_folder into tar shards of about shard_bytes
+
+    Images are read in sorted order and written sequentially, so a run over
+    the pack reads each shard front to back. Outputs are named after the
+    image's file name, so images in different subfolders with the same name
+    (e.g. a/1.jpg and b/1.jpg) are rejected before anything is written.
+    Returns the summary of archive_sink.finalize_archive.
+    """
+    from pathlib import Path
+    from dataset_index import index_images
+    if os.path.exists(os.path.join(pack_dir, INDEX_NAME)):
+        raise FileExistsError(f"Packed dataset already exists: {pack_dir}")
+
+    paths = sorted(index_images(image_folder))
+    seen = {}
+    for path in paths:
+        stem = Path(path).stem
+        if stem in seen:
+            raise ValueError(f"{path} and {seen[stem]} would write the same outputs; "
+                             f"rename one before packing")
+        seen[stem] = path
+    os.makedirs(pack_dir, exist_ok=True)
+
+    shard_index = 0
+    shard = None
+    try:
+        for path in paths:
+            if shard is None or shard.tell() >= shard_bytes:
+                if shard is not None:
+                    shard.close()
+                shard = open(os.path.join(pack_dir, f"shard-{shard_index:05d}.tar"), 'wb')
+                shard_index += 1
+            with open(path, 'rb') as f:
+                data = f.read()
+            name = os.path.relpath(path, image_folder).replace(os.sep, '/')
+            shard.write(tar_blocks([(name, data)]))
+    finally:
+        if shard is not None:
+            shard.close()
+    return finalize_archive(pack_dir)
+
+def is_packed_dataset(path):
+    """True if path is a folder of shards with an index (see pack_dataset)"""
+    return os.path.isfile(os.path.join(path, INDEX_NAME))
+
+def iter_packed_refs(pack_dir):
+    """Yield a reference for every image of a packed dataset, in on-disk order"""
+    index = load_index(pack_dir)
+    for name, entry in sorted(index.items(), key=lambda item: (item[1]['shard'], item[1]['offset'])):
+        shard = os.path.join(pack_dir, entry['shard'])
+        yield f"{shard}@{entry['offset']}+{entry['size']}/{name}"
+
+def is_packed_ref(image_path):
+    return '@' in image_path and _REF_PATTERN.match(image_path) is not None
+
+@lru_cache(maxsize=64)
+def _map_shard(shard):
+    # One read-only mapping per shard and process, kept for the process's
+    # lifetime; the file descriptor is not needed once mapped.
+    with open(shard, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if hasattr(mapped, 'madvise'):
+        mapped.madvise(mmap.MADV_SEQUENTIAL)
+    return mapped
+
+def read_packed(ref):
+    """Bytes of a packed image as a memoryview into the mapped shard (no copy)"""
+    shard, offset, size, _ = _REF_PATTERN.match(ref).groups()
+    offset, size = int(offset), int(size)
+    return memoryview(_map_shard(shard))[offset:offset + size]
+
+def read_source_bytes(image_path):
+    """
+    Encoded bytes of an input image, whether a file or a packed reference
+    Packed images come back as a zero-copy memoryview; convert it with
+    bytes() before sending it to another process.
+    """
+    if is_packed_ref(image_path):
+        return read_packed(image_path)
+    with open(image_path, 'rb') as f:
+        return f.read()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pack an image folder into indexed tar shards")
+    parser.add_argument('image_folder')
+    parser.add_argument('pack_dir')
+    parser.add_argument('--shard-mb', type=int, default=DEFAULT_SHARD_BYTES // 1024 ** 2)
+    args = parser.parse_args(argv)
+
+    summary = pack_dataset(args.image_folder, args.pack_dir, args.shard_mb * 1024 ** 2)
+    print(f"Packed {summary['members']} images ({summary['bytes'] / 1024**2:.1f} MB) "
+          f"into {summary['shards']} shards: {args.pack_dir}")
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,26 @@
 import os
 import time
-import glob
 from multiprocessing import Pool, cpu_count
-from image_filters import ImageProcessor
+from functools import partial
+from image_filters import (ImageProcessor, resolve_filters, check_preview_scale,
+                           check_edge_precision, check_point_ops, point_ops_label)
+from batching import make_batches, iter_batches, peek_first, auto_batch_size, noop_task
+from dataset_index import index_images, iter_image_paths
+from autotune import AutoTuner, submit_adaptive
+from backpressure import imap_bounded
+from running_stats import RunningStats
+from output_codecs import resolve_codecs
+from archive_sink import new_archive_dir, finalize_archive
+from stage_profile import new_profile_dir, collect_profile, print_profile
+from tracing import new_trace_dir, export_trace, print_trace_summary, write_events, span
+from result_cache import ResultCache
+from shared_buffers import share_resource_tracker
+from thread_budget import init_worker_threads, resolve_budget
+from tiling import DEFAULT_TILE_THRESHOLD
+from streaming_pipeline import run_streaming, pool_submitter
 from pathlib import Path
 
-def process_single_image(image_path):
+def process_single_image(image_path, filters=None, cache=None, **filter_options):
     """Process a single image with all filters"""
     # This function is executed by individual worker processes in the pool.
     # Each process handles one image independently to enable parallel execution.
@@ -14,7 +29,11 @@ def process_single_image(image_path):
         # The returned processing time is used for performance evaluation.
         processing_time = ImageProcessor.apply_all_filters(
             image_path, 
-            output_dir="results/output_images"
+            output_dir="results/output_images",
+            decode_once=True,
+            filters=filters,
+            cache=cache,
+            **filter_options
         )
         return processing_time
     except Exception as e:
@@ -23,65 +42,305 @@ def process_single_image(image_path):
         print(f"Error processing {image_path}: {e}")
         return 0
 
-def multiprocessing_pipeline(image_folder, num_processes=None):
+def process_image_batch(image_paths, filters=None, cache=None, **filter_options):
+    """Process a batch of images in one task and return per-image timings"""
+    # Carrying several paths per task amortises pickling, IPC and scheduling
+    # costs over the whole batch instead of paying them for every image.
+    start_time = time.perf_counter()
+    timings = [process_single_image(image_path, filters, cache, **filter_options)
+               for image_path in image_paths]
+    
+    # With tracing on, the batch appears as a span around its image tasks.
+    trace_dir = filter_options.get('trace_dir')
+    if trace_dir is not None:
+        write_events(trace_dir, [span(f"batch of {len(image_paths)}", 'batch', start_time,
+                                      time.perf_counter() - start_time)])
+    return timings
+
+def multiprocessing_pipeline(image_folder, num_processes=None, filters=None, batch_size=None,
+                             streaming=False, shared_memory=False, use_cache=False,
+                             cpu_budget=None, threads_per_worker=None,
+                             tile_threshold=DEFAULT_TILE_THRESHOLD,
+                             max_in_flight=None, profile=False, trace=False, adaptive=False,
+                             output_format=None, archive=False,
+                             preview_scale=None, edge_precision=None, point_ops=None):
     """
     Process all images using multiprocessing.Pool
+    
+    filters selects which outputs to produce (all five when None).
+    batch_size sends that many images per task; 'auto' picks it from the
+    measured per-task overhead, and None keeps one image per task.
+    streaming=True overlaps disk reads, filtering and JPEG writes in a
+    three-stage pipeline (batch_size does not apply in that mode).
+    shared_memory=True (streaming only) returns filter outputs through a
+    recycled shared memory buffer pool instead of pickling the arrays.
+    use_cache=True serves unchanged images from the content-addressed result
+    cache in .cache/results (leave it off when benchmarking; it is not used
+    in streaming mode).
+    cpu_budget caps the total threads used (default: all cores): each
+    worker's OpenCV thread count is set to cpu_budget // workers. Use
+    threads_per_worker to set that count directly instead.
+    tile_threshold (pixels, default 16 megapixels) splits larger images
+    into tiles that are filtered in parallel threads inside the worker,
+    with the same output as a full-frame run; None disables tiling.
+    max_in_flight bounds how many tasks (images, or batches when batching)
+    are submitted but unfinished at any time. Paths are then streamed from
+    the indexer and timings are aggregated on the fly, so parent memory
+    stays flat in the number of images (it grows only with the number of
+    directories, see dataset_index.iter_image_paths); processing_times is left empty and time_stats summarises them.
+    total_time is the steady-state wall time; pool startup is reported
+    separately as startup_time.
+    profile=True times every decode, filter and imwrite in the workers and
+    adds the per-stage summary (stage_profile) and, unless max_in_flight
+    is set, the per-image records (stage_records) to the results.
+    trace=True records every task (and its stages) with its worker PID on
+    one monotonic clock and exports a Chrome/Perfetto trace to
+    results/traces/; trace_summary gives each worker's utilisation and
+    idle tail.
+    adaptive=True tunes the number of active workers (up to num_processes)
+    and the batch size at runtime: a probe phase measures images per second
+    for several settings, the fastest is kept, and a drift in throughput
+    triggers a new probe (see autotune.AutoTuner; pass a dict of its options
+    instead of True to change them). batch_size is then ignored, and the
+    probes, final setting and re-tunes are returned under tuning.
+    output_format sets how outputs are stored: one spec for all of them or
+    a dict per filter, e.g. {'gray': 'png:9', 'edges': 'jpeg:60'}, with
+    jpeg[:quality], png[:compression], webp[:quality], npy (raw array)
+    or none (computed but not written, for compute-only benchmarks); see
+    output_codecs. With profile=True the stage profile reports encode
+    time and bytes written per codec.
+    archive=True streams the outputs into one tar shard per worker under
+    results/output_shards/ instead of writing separate files, and indexes
+    every member by shard and offset once the run ends (see archive_sink);
+    the shard folder and totals are returned under archive.
+    preview_scale 2, 4 or 8 decodes every image at that fraction of its
+    width and height (JPEG DCT-domain scaling via cv2.IMREAD_REDUCED_*)
+    and runs the filters on the smaller image, for previews and thumbnails.
+    edge_precision 'float32' or 'l1' computes edge detection without
+    float64 intermediates, lowering peak memory per worker; float32 gives
+    the same output and l1 an approximation (see image_filters.EDGE_PRECISIONS).
+    point_ops sets the brightened output's chain of brightness, contrast
+    and gamma steps, e.g. 'brightness=1.2,gamma=0.8', compiled into one
+    cached lookup table (default: brightness=1.5).
     """
-    # Define supported image formats to include in the dataset.
-    image_extensions = ['*.jpg', '*.jpeg', '*.png']
-    image_paths = []
+    # Validate the filter selection up front rather than once per image.
+    filters = resolve_filters(filters)
+    preview_scale = check_preview_scale(preview_scale)
+    edge_precision = check_edge_precision(edge_precision)
+    point_ops = check_point_ops(point_ops)
+    
+    # Per-image options forwarded to ImageProcessor.apply_all_filters.
+    # With profiling on, workers append per-stage timings to a per-run folder.
+    profile_dir = new_profile_dir() if profile else None
+    # With tracing on, every task is also recorded as a timeline span.
+    trace_dir = new_trace_dir() if trace else None
+    # Encoder of every output; outputs set to 'none' are computed but never written.
+    codecs = resolve_codecs(output_format, filters)
+    # With archiving on, outputs are appended to per-worker tar shards.
+    archive_dir = new_archive_dir() if archive else None
+    filter_options = {'tile_threshold': tile_threshold, 'profile_dir': profile_dir,
+                      'trace_dir': trace_dir, 'codecs': codecs, 'archive_dir': archive_dir,
+                      'preview_scale': preview_scale, 'edge_precision': edge_precision,
+                      'point_ops': point_ops}
     
-    # Recursively search the dataset directory for all matching image files.
-    for ext in image_extensions:
-        image_paths.extend(glob.glob(os.path.join(image_folder, '**', ext), recursive=True))
+    # The cache is passed to every worker; each one reads and writes entries directly.
+    cache = ResultCache() if use_cache else None
+    if cache is not None and streaming:
+        print("Result cache is not used in streaming mode")
+    if adaptive and streaming:
+        print("Adaptive tuning is not used in streaming mode")
     
-    # Log the number of images discovered for processing.
-    print(f"Found {len(image_paths)} images to process")
+    # Index the dataset in a single scandir pass (case-insensitive extensions,
+    # symlink duplicates removed); unchanged folders come from the saved manifest.
+    windowed = max_in_flight is not None
+    if windowed:
+        # Pull paths lazily so the full list never exists in the parent; the
+        # indexer itself keeps per-directory, not per-file, state.
+        image_paths = iter_image_paths(image_folder)
+        print(f"Streaming images with at most {max_in_flight} tasks in flight")
+    else:
+        image_paths = index_images(image_folder)
+        
+        # Log the number of images discovered for processing.
+        print(f"Found {len(image_paths)} images to process")
+    
+    # Timings are summarised incrementally instead of from a full list.
+    times = RunningStats()
+    tuner = None
     
     # If the number of processes is not specified, default to the CPU core count.
     # This choice aims to maximize parallel CPU utilization for compute-heavy tasks.
     if num_processes is None:
         num_processes = cpu_count()
     
+    # Limit each worker's internal thread pools so workers x threads stays
+    # within the CPU budget (all cores by default) instead of oversubscribing them.
+    cpu_budget, threads_per_worker = resolve_budget(num_processes, cpu_budget, threads_per_worker)
+    initializer, initargs = init_worker_threads, (threads_per_worker,)
+    
     # Ensure the output directory exists before starting parallel processing.
     Path("results/output_images").mkdir(parents=True, exist_ok=True)
     
-    # Record the wall-clock start time for overall execution measurement.
-    start_time = time.time()
+    # Workers must share the parent's resource tracker to attach to its buffers.
+    if shared_memory:
+        share_resource_tracker()
+    
+    # Pool startup is timed separately so total_time measures steady-state work.
+    pool_start = time.perf_counter()
     
     # Create a multiprocessing pool where each process applies filters to images.
     # The pool manages task distribution and process lifecycle automatically.
-    with Pool(processes=num_processes) as pool:
-        # Distribute image paths across worker processes using map.
-        # This blocks until all images have been processed.
-        results = pool.map(process_single_image, image_paths)
+    with Pool(processes=num_processes, initializer=initializer, initargs=initargs) as pool:
+        # One empty task per worker waits until the processes are up and running.
+        pool.map(noop_task, range(num_processes), chunksize=1)
+        startup_time = time.perf_counter() - pool_start
+        
+        # Record the wall-clock start time for overall execution measurement.
+        start_time = time.perf_counter()
+        
+        if streaming:
+            # I/O threads prefetch bytes, the pool filters, writer threads encode.
+            results = run_streaming(image_paths, pool_submitter(pool), num_processes, filters,
+                                    queue_size=max_in_flight, shared_memory=shared_memory,
+                                    filter_options=filter_options,
+                                    stats=times if windowed else None)
+        elif adaptive:
+            # Vary the active workers and batch size, re-tuning when throughput drifts.
+            tuner = AutoTuner(num_processes, **(adaptive if isinstance(adaptive, dict) else {}))
+            worker = partial(process_image_batch, filters=filters, cache=cache, **filter_options)
+            results = []
+            for _, future in submit_adaptive(pool_submitter(pool), worker, image_paths, tuner):
+                if windowed:
+                    times.extend(future.result())
+                else:
+                    results.extend(future.result())
+        elif batch_size is None and windowed:
+            # Consume results as they finish while at most max_in_flight are pending.
+            worker = partial(process_single_image, filters=filters, cache=cache, **filter_options)
+            for processing_time in imap_bounded(pool, worker, image_paths, max_in_flight):
+                times.add(processing_time)
+            results = []
+        elif batch_size is None:
+            # Distribute image paths across worker processes using map.
+            # This blocks until all images have been processed.
+            worker = partial(process_single_image, filters=filters, cache=cache, **filter_options)
+            results = pool.map(worker, image_paths)
+        else:
+            if batch_size == 'auto':
+                # Probe the pool with empty tasks to measure dispatch overhead.
+                # The dataset size is unknown when paths are streamed.
+                sample_path, image_paths = peek_first(image_paths)
+                batch_size = auto_batch_size(
+                    lambda n: pool.map(noop_task, range(n), chunksize=1),
+                    sample_path, None if windowed else len(image_paths), num_processes, filters,
+                    filter_options
+                )
+            
+            worker = partial(process_image_batch, filters=filters, cache=cache, **filter_options)
+            if windowed:
+                for batch in imap_bounded(pool, worker, iter_batches(image_paths, batch_size),
+                                          max_in_flight):
+                    times.extend(batch)
+                results = []
+            else:
+                # Each task carries a whole batch and returns one timing per image,
+                # so flatten the per-batch lists back into per-image results.
+                batches = make_batches(image_paths, batch_size)
+                batch_results = pool.map(worker, batches, chunksize=1)
+                results = [t for batch in batch_results for t in batch]
     
     # Calculate total wall-clock time taken by the multiprocessing pipeline.
-    total_time = time.time() - start_time
+    total_time = time.perf_counter() - start_time
+    
+    # Export the task timeline with pool startup and the steady-state run as parent spans.
+    trace_file, trace_summary = None, None
+    if trace_dir is not None:
+        trace_file = f"results/traces/multiprocessing-{num_processes}.json"
+        trace_summary = export_trace(trace_dir, trace_file, [('pool startup', pool_start, startup_time),
+                                                             ('run', start_time, total_time)])
+    
+    # Enforce the cache size cap once, in the parent, after all workers finished.
+    if cache is not None:
+        removed, cache_bytes = cache.evict()
+        print(f"Result cache: {cache_bytes / 1024**2:.1f} MB, {removed} entries evicted")
+    
+    # Close the shards and index their members once no worker can append.
+    archive_summary = None
+    if archive_dir is not None:
+        archive_summary = finalize_archive(archive_dir)
+    
+    # Merge the workers' stage records now that every task has finished.
+    stage_profile, stage_records = None, None
+    if profile_dir is not None:
+        stage_profile, stage_records = collect_profile(profile_dir, keep_records=not windowed)
     
     # Aggregate individual processing times to compute summary statistics.
-    total_processing_time = sum(results)
-    avg_time_per_image = total_processing_time / len(results) if results else 0
+    if not windowed:
+        times.extend(results)
+    total_processing_time = times.total
+    avg_time_per_image = times.mean
     
     # Display performance metrics for the current process configuration.
     print(f"\n=== Multiprocessing Results ===")
     print(f"Number of processes: {num_processes}")
-    print(f"Total images processed: {len(image_paths)}")
+    if tuner is not None:
+        print(f"Mode: adaptive, ended with {tuner.workers} workers and batch size "
+              f"{tuner.batch_size} ({tuner.retunes} re-tunes)")
+    else:
+        print(f"Mode: {'streaming' if streaming else 'batch size ' + str(batch_size or 1)}")
+    print(f"OpenCV threads per worker: {threads_per_worker} (CPU budget {cpu_budget})")
+    if preview_scale is not None:
+        print(f"Preview decode: 1/{preview_scale} scale")
+    if edge_precision is not None:
+        print(f"Edge precision: {edge_precision}")
+    if point_ops is not None:
+        print(f"Point operations: {point_ops_label(point_ops)}")
+    print(f"Total images processed: {times.count}")
+    print(f"Pool startup time: {startup_time:.2f} seconds")
     print(f"Total wall-clock time: {total_time:.2f} seconds")
     print(f"Total processing time (sum): {total_processing_time:.2f} seconds")
     print(f"Average time per image: {avg_time_per_image:.2f} seconds")
+    if archive_summary is not None:
+        print(f"Archived {archive_summary['members']} outputs in {archive_summary['shards']} shards "
+              f"({archive_summary['bytes'] / 1024**2:.1f} MB): {archive_dir}")
+    if stage_profile is not None:
+        print_profile(stage_profile)
+    if trace_summary is not None:
+        print_trace_summary(trace_summary)
     
     # Return structured results for comparison with other parallel approaches.
     return {
         'num_processes': num_processes,
-        'num_images': len(image_paths),
+        'num_images': times.count,
         'total_time': total_time,
+        'startup_time': startup_time,
+        'filters': filters,
+        'batch_size': batch_size,
+        'streaming': streaming,
+        'shared_memory': shared_memory,
+        'use_cache': use_cache,
+        'cpu_budget': cpu_budget,
+        'threads_per_worker': threads_per_worker,
+        'tile_threshold': tile_threshold,
+        'max_in_flight': max_in_flight,
+        'output_format': {name: codec.label for name, codec in codecs.items()},
+        'archive': archive_summary,
+        'preview_scale': preview_scale,
+        'edge_precision': edge_precision,
+        'point_ops': point_ops_label(point_ops),
+        'tuning': tuner.summary() if tuner is not None else None,
+        'time_stats': times.as_dict(),
+        'stage_profile': stage_profile,
+        'stage_records': stage_records,
+        'trace_file': trace_file,
+        'trace_summary': trace_summary,
         'processing_times': results
     }
 
-def run_multiprocessing_experiment(image_folder, process_counts=None):
+def run_multiprocessing_experiment(image_folder, process_counts=None, **pipeline_options):
     """
     Run multiprocessing with different process counts
+    Extra keyword options (e.g. filters, batch_size, streaming) are passed to every pipeline run.
     """
     # Define default process counts to evaluate scalability behavior.
     if process_counts is None:
@@ -96,7 +355,7 @@ def run_multiprocessing_experiment(image_folder, process_counts=None):
         print('='*50)
         
         # Run the pipeline and store the resulting performance data.
-        result = multiprocessing_pipeline(image_folder, num_procs)
+        result = multiprocessing_pipeline(image_folder, num_procs, **pipeline_options)
         results[num_procs] = result
         
         # Introduce a short delay to reduce system load between experiments.
@@ -0,0 +1,89 @@
+import io
+import cv2
+import numpy as np
+
+# Formats an output can be stored in, with their file extension and the
+# OpenCV encoder parameter their optional level sets.
+CODEC_FORMATS = {
+    'jpeg': ('.jpg', cv2.IMWRITE_JPEG_QUALITY),   # quality 0-100, OpenCV default 95
+    'png': ('.png', cv2.IMWRITE_PNG_COMPRESSION),  # compression 0-9, OpenCV default 1
+    'webp': ('.webp', cv2.IMWRITE_WEBP_QUALITY),   # quality 1-100, above 100 is lossless
+    'npy': ('.npy', None),                         # raw array, lossless and uncompressed
+    'none': (None, None),                          # computed but never encoded or written
+}
+FORMAT_ALIASES = {'jpg': 'jpeg'}
+
+class OutputCodec:
+    # How one filter output is stored: an image format with an optional
+    # encoder level, a raw .npy array, or nothing at all. Plain attributes
+    # only, so codecs pickle cheaply to worker processes.
+
+    def __init__(self, format='jpeg', level=None):
+        format = FORMAT_ALIASES.get(format, format)
+        if format not in CODEC_FORMATS:
+            raise ValueError(f"Unknown output format: {format}. "
+                             f"Available: {', '.join(CODEC_FORMATS)}")
+        if level is not None and CODEC_FORMATS[format][1] is None:
+            raise ValueError(f"Output format {format} takes no level")
+        self.format = format
+        self.level = level
+        self.ext = CODEC_FORMATS[format][0]
+
+    @property
+    def label(self):
+        """Spec string of the codec, e.g. 'jpeg:80' or 'png'"""
+        return self.format if self.level is None else f"{self.format}:{self.level}"
+
+    @property
+    def writes(self):
+        return self.format != 'none'
+
+    def encode(self, result):
+        """Encode one filter output; returns the bytes of its file"""
+        if self.format == 'npy':
+            buffer = io.BytesIO()
+            np.save(buffer, result)
+            return buffer.getvalue()
+        param = CODEC_FORMATS[self.format][1]
+        params = [] if self.level is None else [param, self.level]
+        ok, encoded = cv2.imencode(self.ext, result, params)
+        if not ok:
+            raise ValueError(f"{self.label} encoding failed")
+        return encoded.tobytes()
+
+    def __repr__(self):
+        return f"OutputCodec({self.label!r})"
+
+# Default OpenCV JPEG, the format every output used before codecs were configurable.
+DEFAULT_CODEC = OutputCodec()
+
+def parse_codec(spec):
+    """Build an OutputCodec from a spec such as 'png', 'jpeg:80' or 'none'"""
+    if isinstance(spec, OutputCodec):
+        return spec
+    format, _, level = spec.strip().lower().partition(':')
+    if level and not level.isdigit():
+        raise ValueError(f"Invalid level in output format: {spec}")
+    return OutputCodec(format, int(level) if level else None)
+
+def resolve_codecs(output_format=None, filters=None):
+    """
+    Map every selected filter to its OutputCodec
+
+    output_format is None (default JPEG everywhere), one spec for every
+    output (e.g. 'none' for a compute-only benchmark), or a dict from
+    filter name to spec, e.g. {'gray': 'png:9', 'edges': 'jpeg:60'};
+    filters missing from the dict keep the default JPEG.
+    """
+    from image_filters import resolve_filters
+    filters = resolve_filters(filters)
+    if output_format is None:
+        return {name: DEFAULT_CODEC for name in filters}
+    if not isinstance(output_format, dict):
+        codec = parse_codec(output_format)
+        return {name: codec for name in filters}
+    unknown = [name for name in output_format if name not in filters]
+    if unknown:
+        raise ValueError(f"Output format given for filter(s) not being run: {', '.join(unknown)}")
+    return {name: parse_codec(output_format[name]) if name in output_format else DEFAULT_CODEC
+            for name in filters}
@@ -3,6 +3,12 @@ import matplotlib.pyplot as plt
 import numpy as np
 import os
 
+# Display settings for each backend, in the order results are passed in.
+BACKEND_LABELS = ['Multiprocessing', 'Concurrent.Futures', 'Threads']
+BACKEND_ABBREVIATIONS = ['MP', 'Fut', 'Thr']
+BACKEND_COLORS = ['blue', 'orange', 'green', 'red', 'purple', 'brown']
+BACKEND_MARKERS = ['o', 's', '^', 'D', 'v', 'P']
+
 def load_results():
     """Load performance results from JSON files for both implementations:
     - Multiprocessing (mp_results)
@@ -25,6 +31,22 @@ def load_results():
     
     return mp_results, futures_results
 
+def load_all_results():
+    """Load the saved results of every backend that has a JSON file.
+    
+    Returns:
+        dict: Results keyed by backend label, in BACKEND_LABELS order.
+    """
+    files = ['multiprocessing_results.json', 'futures_results.json', 'threads_results.json']
+    all_results = {}
+    for label, filename in zip(BACKEND_LABELS, files):
+        try:
+            with open(os.path.join('results', 'performance_data', filename), 'r') as f:
+                all_results[label] = json.load(f)
+        except (OSError, ValueError):
+            continue  # Skip backends that have not been run
+    return all_results
+
 def calculate_speedup(results):
     """Calculate speedup for each process count based on baseline (single process/worker).
     
@@ -52,13 +74,12 @@ def calculate_speedup(results):
     processes = sorted(processes)
     
     # Determine baseline key for single process
+    # (JSON-loaded results have string keys, in-memory results int keys)
     baseline_key = None
-    if 1 in processes:
+    if 1 in results:
         baseline_key = 1
     elif '1' in results:
         baseline_key = '1'
-    elif 1 in results: 
-        baseline_key = 1
     
     if baseline_key is None:
         return speedups  # Cannot calculate speedup without baseline
@@ -99,37 +120,195 @@ def calculate_efficiency(speedups):
     
     return efficiencies
 
-def plot_comparison(mp_results, futures_results):
+def get_total_time(results, p):
+    """Execution time for process count p, accepting int or string keys"""
+    if p in results:
+        return results[p]['total_time']
+    if str(p) in results:
+        return results[str(p)]['total_time']
+    return None
+
+def get_time_errors(results, processes):
+    """Asymmetric error bars from benchmark confidence intervals, or None
+    
+    Results from benchmark.run_benchmark carry total_time_stats; single-shot
+    results do not, and are plotted without error bars.
+    """
+    lower, upper = [], []
+    for p in processes:
+        result = results.get(p, results.get(str(p)))
+        stats = result.get('total_time_stats') if result else None
+        if stats is None:
+            lower.append(0)
+            upper.append(0)
+        else:
+            lower.append(max(0, result['total_time'] - stats['ci_low']))
+            upper.append(max(0, stats['ci_high'] - result['total_time']))
+    return [lower, upper] if any(lower) or any(upper) else None
+
+# Scaling models fitted to measured speedups (n = number of workers):
+#   Amdahl:    S(n) = 1 / (s + (1 - s) / n)             s = serial fraction
+#   Gustafson: S(n) = s + (1 - s) * n                   s = serial fraction of scaled work
+#   USL:       S(n) = n / (1 + a(n - 1) + b n(n - 1))   a = contention, b = coherency
+# Gustafson assumes the workload grows with n; on these fixed-size runs it is
+# an optimistic bound. USL's coherency term lets speedup peak and fall.
+SCALING_MODELS = ('amdahl', 'gustafson', 'usl')
+
+def _speedup_points(speedups):
+    """Worker counts and speedups as float arrays sorted by worker count"""
+    points = sorted((int(p), s) for p, s in speedups.items() if s > 0)
+    n = np.array([p for p, _ in points], dtype=float)
+    return n, np.array([s for _, s in points], dtype=float)
+
+def predict_speedup(fit, n):
+    """Speedup of a fitted model (see fit_scaling_models) at worker count(s) n"""
+    n = np.asarray(n, dtype=float)
+    if fit['model'] == 'amdahl':
+        s = fit['serial_fraction']
+        return 1 / (s + (1 - s) / n)
+    if fit['model'] == 'gustafson':
+        s = fit['serial_fraction']
+        return s + (1 - s) * n
+    return n / (1 + fit['contention'] * (n - 1) + fit['coherency'] * n * (n - 1))
+
+def _fit_usl(n, speedup):
+    """Non-negative least squares of n/S - 1 = a(n - 1) + b n(n - 1)"""
+    y = n / speedup - 1
+    columns = np.column_stack([n - 1, n * (n - 1)])
+    best = (0.0, 0.0)
+    best_error = np.sum(y ** 2)
+    # With two parameters, trying both terms and each term alone is exact NNLS.
+    for mask in ([0, 1], [0], [1]):
+        coef = np.zeros(2)
+        coef[mask] = np.linalg.lstsq(columns[:, mask], y, rcond=None)[0]
+        error = np.sum((columns @ coef - y) ** 2)
+        if np.all(coef >= 0) and error < best_error:
+            best, best_error = tuple(coef), error
+    return best
+
+def fit_scaling_models(speedups):
+    """Fit Amdahl's law, Gustafson's law and the Universal Scalability Law
+    
+    Args:
+        speedups (dict): Output of calculate_speedup.
+    
+    Returns:
+        dict: Fit per model name with its parameters and the RMSE of the
+        fitted against the measured speedups; {} with fewer than two points.
+        USL fits also report peak_workers, the worker count with the
+        highest predicted speedup (None when speedup never peaks). Every fit
+        records max_measured_workers, the largest worker count it was fitted on.
+    """
+    n, speedup = _speedup_points(speedups)
+    if len(n) < 2 or n.max() <= 1:
+        return {}
+    
+    fits = {}
+    # Amdahl is not linear in s; a fine grid search is exact enough and
+    # minimises the error in speedup itself rather than a transformed one.
+    grid = np.linspace(0, 1, 10001)
+    errors = [np.sum((1 / (s + (1 - s) / n) - speedup) ** 2) for s in grid]
+    fits['amdahl'] = {'model': 'amdahl', 'serial_fraction': float(grid[int(np.argmin(errors))])}
+    
+    # Gustafson: n - S = s(n - 1), least squares through the origin
+    s = np.sum((n - speedup) * (n - 1)) / np.sum((n - 1) ** 2)
+    fits['gustafson'] = {'model': 'gustafson', 'serial_fraction': float(np.clip(s, 0, 1))}
+    
+    contention, coherency = _fit_usl(n, speedup)
+    fits['usl'] = {'model': 'usl', 'contention': float(contention), 'coherency': float(coherency),
+                   'peak_workers': (int(round(np.sqrt((1 - contention) / coherency)))
+                                    if coherency > 0 and contention < 1 else None)}
+    
+    for fit in fits.values():
+        fit['rmse'] = float(np.sqrt(np.mean((predict_speedup(fit, n) - speedup) ** 2)))
+        fit['max_measured_workers'] = int(n.max())
+    return fits
+
+# Recommendations extrapolate at most this factor beyond the largest measured
+# worker count. Gustafson's efficiency never falls below 1 - s, so without a
+# cap it would recommend max_workers on almost any measurement.
+EXTRAPOLATION_FACTOR = 2
+
+def recommendation_cap(fit, max_workers=256):
+    """Largest worker count recommend_workers considers for a fit"""
+    measured = fit.get('max_measured_workers')
+    return max_workers if measured is None else min(max_workers, EXTRAPOLATION_FACTOR * measured)
+
+def recommend_workers(fit, efficiency_threshold=0.7, max_workers=256):
+    """Largest worker count whose predicted efficiency stays at or above the threshold
+    
+    Returns 1 when even two workers fall below it. The search stops at
+    EXTRAPOLATION_FACTOR times the largest measured worker count (and at
+    max_workers): beyond the measured range the prediction is only as
+    good as the model.
+    """
+    n = np.arange(1, recommendation_cap(fit, max_workers) + 1)
+    efficient = n[predict_speedup(fit, n) / n >= efficiency_threshold]
+    return int(efficient.max()) if len(efficient) else 1
+
+def print_scaling_analysis(labels, fits, efficiency_threshold=0.7, predict_at=(16, 32, 64)):
+    """Print fitted parameters, predicted speedups and recommended worker counts"""
+    print(f"\nSCALING MODELS (recommendation: most workers with efficiency >= {efficiency_threshold:.0%}, "
+          f"up to {EXTRAPOLATION_FACTOR}x the measured range):")
+    header = f"{'Backend':<20} {'Model':<10} {'Parameters':<30} {'RMSE':<7} "
+    header += "".join(f"{'S(' + str(p) + ')':<8} " for p in predict_at) + "Workers"
+    print(header)
+    for label, backend_fits in zip(labels, fits):
+        for name, fit in backend_fits.items():
+            if name == 'usl':
+                params = f"a={fit['contention']:.3f} b={fit['coherency']:.4f}"
+                if fit['peak_workers'] is not None:
+                    params += f" peak@{fit['peak_workers']}"
+            else:
+                params = f"serial={fit['serial_fraction']:.3f}"
+            line = f"{label:<20} {name:<10} {params:<30} {fit['rmse']:<7.3f} "
+            line += "".join(f"{predict_speedup(fit, p):<8.2f} " for p in predict_at)
+            workers = recommend_workers(fit, efficiency_threshold)
+            # '+': still efficient at the cap, so the true limit lies beyond the trusted range.
+            print(line + (f"{workers}+" if workers == recommendation_cap(fit) else str(workers)))
+
+def plot_comparison(*backend_results, labels=None, efficiency_threshold=0.7):
     """Generate performance comparison plots and summary table.
     
     Plots include:
     1. Execution Time Comparison (bars)
-    2. Speedup Comparison (line plot)
+    2. Speedup Comparison (line plot, with fitted scaling models)
     3. Efficiency Comparison (line plot)
     4. Performance Summary Table
     
     Args:
-        mp_results (dict): Multiprocessing results.
-        futures_results (dict): Concurrent.Futures results.
+        *backend_results (dict): Results of each backend, e.g.
+            plot_comparison(mp_results, futures_results, threads_results).
+        labels (list): Display names for the backends; defaults to
+            BACKEND_LABELS in order.
+        efficiency_threshold (float): Efficiency the recommended worker
+            count must still reach (see recommend_workers).
     """
-    if not mp_results and not futures_results:
+    if labels is None:
+        labels = [BACKEND_LABELS[i] if i < len(BACKEND_LABELS) else f'Backend {i + 1}'
+                  for i in range(len(backend_results))]
+    abbreviations = [BACKEND_ABBREVIATIONS[BACKEND_LABELS.index(label)] if label in BACKEND_LABELS
+                     else label[:4] for label in labels]
+    colors = [BACKEND_COLORS[i % len(BACKEND_COLORS)] for i in range(len(labels))]
+    markers = [BACKEND_MARKERS[i % len(BACKEND_MARKERS)] for i in range(len(labels))]
+    
+    if not any(backend_results):
         print("No results to plot!")
         return
     
-    # Compute speedup and efficiency for both implementations
-    mp_speedups = calculate_speedup(mp_results)
-    futures_speedups = calculate_speedup(futures_results)
+    # Compute speedup and efficiency for every backend
+    speedups = [calculate_speedup(results) for results in backend_results]
     
-    if not mp_speedups and not futures_speedups:
+    if not any(speedups):
         print("No valid data to calculate speedups.")
         return
     
-    mp_efficiencies = calculate_efficiency(mp_speedups)
-    futures_efficiencies = calculate_efficiency(futures_speedups)
+    efficiencies = [calculate_efficiency(s) for s in speedups]
+    fits = [fit_scaling_models(s) for s in speedups]
     
     # Collect all unique process counts for plotting
     all_processes = set()
-    for d in [mp_speedups, futures_speedups]:
+    for d in speedups:
         all_processes.update(d.keys())
     
     processes = sorted(all_processes)
@@ -138,49 +317,36 @@ def plot_comparison(mp_results, futures_results):
         print("No process data available for plotting.")
         return
     
-    # Prepare data lists for plotting
-    mp_times = []
-    futures_times = []
-    mp_speedup_vals = []
-    futures_speedup_vals = []
-    mp_eff_vals = []
-    futures_eff_vals = []
-    
-    for p in processes:
-        # Retrieve execution times for each process count
-        mp_time = None
-        futures_time = None
-        
-        if p in mp_results:
-            mp_time = mp_results[p]['total_time']
-        elif str(p) in mp_results:
-            mp_time = mp_results[str(p)]['total_time']
-        
-        if p in futures_results:
-            futures_time = futures_results[p]['total_time']
-        elif str(p) in futures_results:
-            futures_time = futures_results[str(p)]['total_time']
-        
-        mp_times.append(mp_time if mp_time is not None else 0)
-        futures_times.append(futures_time if futures_time is not None else 0)
-        
-        # Append calculated speedup and efficiency
-        mp_speedup_vals.append(mp_speedups.get(p, 0))
-        futures_speedup_vals.append(futures_speedups.get(p, 0))
-        mp_eff_vals.append(mp_efficiencies.get(p, 0))
-        futures_eff_vals.append(futures_efficiencies.get(p, 0))
+    # Prepare per-backend data lists for plotting (0 marks a missing value)
+    times = []
+    speedup_vals = []
+    eff_vals = []
+    for results, backend_speedups, backend_effs in zip(backend_results, speedups, efficiencies):
+        backend_times = []
+        for p in processes:
+            t = get_total_time(results, p)
+            backend_times.append(t if t is not None else 0)
+        times.append(backend_times)
+        speedup_vals.append([backend_speedups.get(p, 0) for p in processes])
+        eff_vals.append([backend_effs.get(p, 0) for p in processes])
     
     # Create 2x2 subplots for all visualizations
     fig, axes = plt.subplots(2, 2, figsize=(14, 12))
     
     # ---------------- Execution Time Comparison ---------------- #
     ax1 = axes[0, 0]
-    if any(t > 0 for t in mp_times) or any(t > 0 for t in futures_times):
+    if any(t > 0 for backend_times in times for t in backend_times):
         x_pos = np.arange(len(processes))
-        width = 0.35
+        # Split the bar group width evenly between backends
+        width = 0.7 / len(labels)
         
-        bars1 = ax1.bar(x_pos - width/2, mp_times, width, label='Multiprocessing', alpha=0.8, color='blue')
-        bars2 = ax1.bar(x_pos + width/2, futures_times, width, label='Concurrent.Futures', alpha=0.8, color='orange')
+        all_bars = []
+        for i, backend_times in enumerate(times):
+            offset = (i - (len(labels) - 1) / 2) * width
+            # Benchmark results get confidence-interval error bars
+            all_bars.append(ax1.bar(x_pos + offset, backend_times, width, label=labels[i],
+                                    alpha=0.8, color=colors[i], capsize=3,
+                                    yerr=get_time_errors(backend_results[i], processes)))
         
         ax1.set_xlabel('Number of Processes/Workers', fontsize=12)
         ax1.set_ylabel('Execution Time (seconds)', fontsize=12)
@@ -191,7 +357,7 @@ def plot_comparison(mp_results, futures_results):
         ax1.grid(True, alpha=0.3, linestyle='--')
         
         # Annotate bars with actual execution times
-        for bars in [bars1, bars2]:
+        for bars in all_bars:
             for bar in bars:
                 height = bar.get_height()
                 if height > 0:
@@ -204,15 +370,26 @@ def plot_comparison(mp_results, futures_results):
     
     # ---------------- Speedup Comparison ---------------- #
     ax2 = axes[0, 1]
-    if any(s > 0 for s in mp_speedup_vals) or any(s > 0 for s in futures_speedup_vals):
+    if any(s > 0 for vals in speedup_vals for s in vals):
         # Plot observed speedup lines
-        ax2.plot(processes, mp_speedup_vals, 'o-', label='Multiprocessing', 
-                linewidth=2, markersize=8, color='blue')
-        ax2.plot(processes, futures_speedup_vals, 's-', label='Concurrent.Futures', 
-                linewidth=2, markersize=8, color='orange')
+        for i, vals in enumerate(speedup_vals):
+            ax2.plot(processes, vals, f'{markers[i]}-', label=labels[i],
+                    linewidth=2, markersize=8, color=colors[i])
         # Ideal linear speedup line
         ax2.plot(processes, processes, '--', label='Ideal Speedup', 
                 alpha=0.5, color='gray', linewidth=2)
+        # Fitted scaling models, extended past the measured worker counts
+        fit_x = np.linspace(1, max(processes) * 1.5, 200)
+        fit_styles = {'amdahl': ':', 'gustafson': (0, (4, 2)), 'usl': '-.'}
+        fit_names = {'amdahl': 'Amdahl fit', 'gustafson': 'Gustafson fit', 'usl': 'USL fit'}
+        for i, backend_fits in enumerate(fits):
+            for name, fit in backend_fits.items():
+                ax2.plot(fit_x, predict_speedup(fit, fit_x), linestyle=fit_styles[name],
+                        color=colors[i], alpha=0.6, linewidth=1.5)
+        # One gray legend entry per model; the colour identifies the backend
+        for name in SCALING_MODELS:
+            if any(name in backend_fits for backend_fits in fits):
+                ax2.plot([], [], linestyle=fit_styles[name], color='gray', label=fit_names[name])
         
         ax2.set_xlabel('Number of Processes/Workers', fontsize=12)
         ax2.set_ylabel('Speedup', fontsize=12)
@@ -220,14 +397,13 @@ def plot_comparison(mp_results, futures_results):
         ax2.legend(fontsize=11)
         ax2.grid(True, alpha=0.3, linestyle='--')
         
-        # Annotate speedup points
-        for i, (mp_val, fut_val) in enumerate(zip(mp_speedup_vals, futures_speedup_vals)):
-            if mp_val > 0:
-                ax2.text(processes[i], mp_val + 0.05, f'{mp_val:.2f}', 
-                        ha='center', va='bottom', fontsize=9)
-            if fut_val > 0:
-                ax2.text(processes[i], fut_val - 0.1, f'{fut_val:.2f}', 
-                        ha='center', va='top', fontsize=9)
+        # Annotate speedup points, alternating above and below the markers
+        for b, vals in enumerate(speedup_vals):
+            for i, val in enumerate(vals):
+                if val > 0:
+                    above = b % 2 == 0
+                    ax2.text(processes[i], val + (0.05 if above else -0.1), f'{val:.2f}',
+                            ha='center', va='bottom' if above else 'top', fontsize=9)
     else:
         ax2.text(0.5, 0.5, 'No speedup data available', 
                 ha='center', va='center', transform=ax2.transAxes, fontsize=12)
@@ -235,12 +411,11 @@ def plot_comparison(mp_results, futures_results):
     
     # ---------------- Efficiency Comparison ---------------- #
     ax3 = axes[1, 0]
-    if any(e > 0 for e in mp_eff_vals) or any(e > 0 for e in futures_eff_vals):
+    if any(e > 0 for vals in eff_vals for e in vals):
         # Plot efficiency lines
-        ax3.plot(processes, mp_eff_vals, 'o-', label='Multiprocessing', 
-                linewidth=2, markersize=8, color='blue')
-        ax3.plot(processes, futures_eff_vals, 's-', label='Concurrent.Futures', 
-                linewidth=2, markersize=8, color='orange')
+        for i, vals in enumerate(eff_vals):
+            ax3.plot(processes, vals, f'{markers[i]}-', label=labels[i],
+                    linewidth=2, markersize=8, color=colors[i])
         # Ideal efficiency line (1.0)
         ax3.axhline(y=1, color='r', linestyle='--', alpha=0.5, label='Ideal Efficiency', linewidth=2)
         
@@ -250,14 +425,13 @@ def plot_comparison(mp_results, futures_results):
         ax3.legend(fontsize=11)
         ax3.grid(True, alpha=0.3, linestyle='--')
         
-        # Annotate efficiency points
-        for i, (mp_val, fut_val) in enumerate(zip(mp_eff_vals, futures_eff_vals)):
-            if mp_val > 0:
-                ax3.text(processes[i], mp_val + 0.02, f'{mp_val:.2f}', 
-                        ha='center', va='bottom', fontsize=9)
-            if fut_val > 0:
-                ax3.text(processes[i], fut_val - 0.03, f'{fut_val:.2f}', 
-                        ha='center', va='top', fontsize=9)
+        # Annotate efficiency points, alternating above and below the markers
+        for b, vals in enumerate(eff_vals):
+            for i, val in enumerate(vals):
+                if val > 0:
+                    above = b % 2 == 0
+                    ax3.text(processes[i], val + (0.02 if above else -0.03), f'{val:.2f}',
+                            ha='center', va='bottom' if above else 'top', fontsize=9)
     else:
         ax3.text(0.5, 0.5, 'No efficiency data available', 
                 ha='center', va='center', transform=ax3.transAxes, fontsize=12)
@@ -268,27 +442,25 @@ def plot_comparison(mp_results, futures_results):
     ax4.axis('tight')
     ax4.axis('off')
     
-    # Prepare table showing execution time, speedup, efficiency
+    # Prepare table showing execution time, speedup, efficiency for each backend
+    def fmt(value):
+        return f"{value:.2f}" if value > 0 else "N/A"
+    
     table_data = []
-    headers = ['Proc', 'MP Time(s)', 'Fut Time(s)', 'MP Speedup', 'Fut Speedup', 'MP Eff', 'Fut Eff']
+    headers = (['Proc'] + [f'{a} Time(s)' for a in abbreviations]
+               + [f'{a} Speedup' for a in abbreviations] + [f'{a} Eff' for a in abbreviations])
     
     for i, p in enumerate(processes):
-        row = [
-            str(p),
-            f"{mp_times[i]:.2f}" if mp_times[i] > 0 else "N/A",
-            f"{futures_times[i]:.2f}" if futures_times[i] > 0 else "N/A",
-            f"{mp_speedup_vals[i]:.2f}" if mp_speedup_vals[i] > 0 else "N/A",
-            f"{futures_speedup_vals[i]:.2f}" if futures_speedup_vals[i] > 0 else "N/A",
-            f"{mp_eff_vals[i]:.2f}" if mp_eff_vals[i] > 0 else "N/A",
-            f"{futures_eff_vals[i]:.2f}" if futures_eff_vals[i] > 0 else "N/A"
-        ]
+        row = ([str(p)] + [fmt(t[i]) for t in times]
+               + [fmt(s[i]) for s in speedup_vals] + [fmt(e[i]) for e in eff_vals])
         table_data.append(row)
     
     if table_data:
+        col_width = 0.9 / (len(headers) - 1)
         table = ax4.table(cellText=table_data, colLabels=headers, 
-                         cellLoc='center', loc='center', colWidths=[0.1, 0.15, 0.15, 0.15, 0.15, 0.15, 0.15])
+                         cellLoc='center', loc='center', colWidths=[0.1] + [col_width] * (len(headers) - 1))
         table.auto_set_font_size(False)
-        table.set_fontsize(9)
+        table.set_fontsize(9 if len(labels) <= 2 else 7)
         table.scale(1, 1.8)
         
         # Style table header row
@@ -319,17 +491,184 @@ def plot_comparison(mp_results, futures_results):
     print("="*50)
     
     print("\nSPEEDUP ANALYSIS:")
-    print(f"{'Processes':<10} {'MP Time':<12} {'MP Speedup':<12} {'Fut Time':<12} {'Fut Speedup':<12}")
+    header = f"{'Processes':<10} "
+    for a in abbreviations:
+        header += f"{a + ' Time':<12} {a + ' Speedup':<12} "
+    print(header.rstrip())
     for i, p in enumerate(processes):
-        print(f"{p:<10} {mp_times[i]:<12.2f} {mp_speedup_vals[i]:<12.2f} "
-              f"{futures_times[i]:<12.2f} {futures_speedup_vals[i]:<12.2f}")
+        line = f"{p:<10} "
+        for b in range(len(labels)):
+            line += f"{times[b][i]:<12.2f} {speedup_vals[b][i]:<12.2f} "
+        print(line.rstrip())
     
     print("\nEFFICIENCY ANALYSIS:")
-    print(f"{'Processes':<10} {'MP Efficiency':<15} {'Fut Efficiency':<15}")
+    header = f"{'Processes':<10} "
+    for a in abbreviations:
+        header += f"{a + ' Efficiency':<15} "
+    print(header.rstrip())
     for i, p in enumerate(processes):
-        print(f"{p:<10} {mp_eff_vals[i]:<15.2f} {futures_eff_vals[i]:<15.2f}")
+        line = f"{p:<10} "
+        for b in range(len(labels)):
+            line += f"{eff_vals[b][i]:<15.2f} "
+        print(line.rstrip())
+    
+    if any(fits):
+        print_scaling_analysis(labels, fits, efficiency_threshold)
         
+def load_distributed_results():
+    """Load the node-scaling results written by distributed.py, or {} if absent."""
+    try:
+        with open(os.path.join('results', 'performance_data', 'distributed_results.json'), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def plot_node_speedup(results):
+    """Plot execution time, speedup and efficiency against the number of nodes.
+    
+    Speedup is relative to the single-node run, so with several processes per
+    node it isolates the gain from adding machines.
+    
+    Args:
+        results (dict): Distributed results keyed by node count.
+    """
+    speedups = calculate_speedup(results)
+    if not speedups:
+        print("No single-node baseline to calculate node speedup.")
+        return
+    efficiencies = calculate_efficiency(speedups)
+    
+    nodes = sorted(speedups)
+    times = [get_total_time(results, n) for n in nodes]
+    speedup_vals = [speedups[n] for n in nodes]
+    eff_vals = [efficiencies[n] for n in nodes]
+    
+    fig, axes = plt.subplots(1, 3, figsize=(18, 5))
+    
+    # ---------------- Execution Time ---------------- #
+    ax1 = axes[0]
+    bars = ax1.bar([str(n) for n in nodes], times, alpha=0.8, color=BACKEND_COLORS[3])
+    for bar in bars:
+        height = bar.get_height()
+        ax1.text(bar.get_x() + bar.get_width()/2., height + 0.05,
+                f'{height:.2f}', ha='center', va='bottom', fontsize=9)
+    ax1.set_xlabel('Number of Nodes', fontsize=12)
+    ax1.set_ylabel('Execution Time (seconds)', fontsize=12)
+    ax1.set_title('Execution Time', fontsize=14, fontweight='bold')
+    ax1.grid(True, alpha=0.3, linestyle='--')
+    
+    # ---------------- Speedup ---------------- #
+    ax2 = axes[1]
+    ax2.plot(nodes, speedup_vals, f'{BACKEND_MARKERS[3]}-', label='Distributed',
+            linewidth=2, markersize=8, color=BACKEND_COLORS[3])
+    ax2.plot(nodes, nodes, '--', label='Ideal Speedup', alpha=0.5, color='gray', linewidth=2)
+    for n, val in zip(nodes, speedup_vals):
+        ax2.text(n, val + 0.05, f'{val:.2f}', ha='center', va='bottom', fontsize=9)
+    ax2.set_xlabel('Number of Nodes', fontsize=12)
+    ax2.set_ylabel('Speedup', fontsize=12)
+    ax2.set_title('Speedup Across Nodes', fontsize=14, fontweight='bold')
+    ax2.legend(fontsize=11)
+    ax2.grid(True, alpha=0.3, linestyle='--')
+    
+    # ---------------- Efficiency ---------------- #
+    ax3 = axes[2]
+    ax3.plot(nodes, eff_vals, f'{BACKEND_MARKERS[3]}-', label='Distributed',
+            linewidth=2, markersize=8, color=BACKEND_COLORS[3])
+    ax3.axhline(y=1, color='r', linestyle='--', alpha=0.5, label='Ideal Efficiency', linewidth=2)
+    for n, val in zip(nodes, eff_vals):
+        ax3.text(n, val + 0.02, f'{val:.2f}', ha='center', va='bottom', fontsize=9)
+    ax3.set_xlabel('Number of Nodes', fontsize=12)
+    ax3.set_ylabel('Efficiency', fontsize=12)
+    ax3.set_title('Efficiency Across Nodes', fontsize=14, fontweight='bold')
+    ax3.legend(fontsize=11)
+    ax3.grid(True, alpha=0.3, linestyle='--')
+    
+    plt.suptitle('Multi-Node Scaling', fontsize=16, fontweight='bold')
+    plt.tight_layout(rect=[0, 0, 1, 0.93])
+    
+    plt.savefig('results/node_speedup.png', dpi=300, bbox_inches='tight')
+    print("Node speedup graph saved as: results/node_speedup.png")
+    plt.show()
+    
+    print("\nNODE SCALING SUMMARY:")
+    print(f"{'Nodes':<10} {'Time (s)':<12} {'Speedup':<12} {'Efficiency':<12}")
+    for n, t, sp, eff in zip(nodes, times, speedup_vals, eff_vals):
+        print(f"{n:<10} {t:<12.2f} {sp:<12.2f} {eff:<12.2f}")
+
+def plot_stage_breakdown(*backend_results, labels=None):
+    """Plot where per-image time goes, one stacked bar per profiled run.
+    
+    Only runs made with profile=True carry a stage_profile; the others are
+    skipped. Each bar stacks the mean milliseconds per image spent in
+    decode, every filter and every imwrite.
+    
+    Args:
+        *backend_results (dict): Results of each backend keyed by worker count.
+        labels (list): Display names for the backends; defaults to
+            BACKEND_ABBREVIATIONS in order.
+    """
+    if labels is None:
+        labels = [BACKEND_ABBREVIATIONS[i] if i < len(BACKEND_ABBREVIATIONS) else f'B{i + 1}'
+                  for i in range(len(backend_results))]
+    
+    # Collect (bar label, {stage: ms per image}) for every profiled run
+    bars = []
+    for label, results in zip(labels, backend_results):
+        for key in sorted(results, key=lambda k: int(k) if str(k).isdigit() else str(k)):
+            profile = results[key].get('stage_profile')
+            if not profile or not profile['images']:
+                continue
+            per_image = {stage: stats['sum'] / profile['images'] * 1000
+                         for stage, stats in profile['stages'].items() if stage != 'total'}
+            bars.append((f"{label} x{key}", per_image))
+    
+    if not bars:
+        print("No stage profiles to plot (run a pipeline with profile=True).")
+        return
+    
+    # Order stages by overall cost so the biggest ones sit at the bottom
+    totals = {}
+    for _, per_image in bars:
+        for stage, ms in per_image.items():
+            totals[stage] = totals.get(stage, 0) + ms
+    stages = sorted(totals, key=totals.get, reverse=True)
+    
+    fig, ax = plt.subplots(figsize=(max(8, 1.2 * len(bars) + 4), 7))
+    x_pos = np.arange(len(bars))
+    bottom = np.zeros(len(bars))
+    cmap = plt.get_cmap('tab20')
+    for i, stage in enumerate(stages):
+        values = np.array([per_image.get(stage, 0) for _, per_image in bars])
+        ax.bar(x_pos, values, 0.6, bottom=bottom, label=stage, color=cmap(i % 20))
+        bottom += values
+    
+    # Annotate each bar with its total
+    for x, total in zip(x_pos, bottom):
+        ax.text(x, total, f'{total:.1f}', ha='center', va='bottom', fontsize=9)
+    
+    ax.set_xticks(x_pos)
+    ax.set_xticklabels([name for name, _ in bars], rotation=30, ha='right', fontsize=10)
+    ax.set_ylabel('Mean time per image (ms)', fontsize=12)
+    ax.set_title('Per-Stage Time Breakdown', fontsize=14, fontweight='bold')
+    ax.legend(fontsize=9, bbox_to_anchor=(1.02, 1), loc='upper left')
+    ax.grid(True, axis='y', alpha=0.3, linestyle='--')
+    plt.tight_layout()
+    
+    plt.savefig('results/stage_breakdown.png', dpi=300, bbox_inches='tight')
+    print("Stage breakdown graph saved as: results/stage_breakdown.png")
+    plt.show()
+
 if __name__ == "__main__":
-    # Load results and generate performance plots & summary
-    mp_results, futures_results = load_results()
-    plot_comparison(mp_results, futures_results)
+    # Load results of every backend and generate performance plots & summary
+    all_results = load_all_results()
+    plot_comparison(*all_results.values(), labels=list(all_results.keys()))
+    
+    # Per-stage breakdown for runs made with profile=True
+    plot_stage_breakdown(*all_results.values(),
+                         labels=[BACKEND_ABBREVIATIONS[BACKEND_LABELS.index(label)]
+                                 for label in all_results])
+    
+    # Plot multi-node scaling when distributed.py has been run
+    distributed_results = load_distributed_results()
+    if distributed_results:
+        plot_node_speedup(distributed_results)
@@ -0,0 +1,96 @@
+import os
+import json
+import hashlib
+import tempfile
+import cv2
+from image_filters import FILTER_CODE_VERSION
+
+# Default location and size cap of the on-disk filter result cache.
+DEFAULT_CACHE_DIR = os.path.join(".cache", "results")
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+def hash_bytes(data):
+    """Content hash of a source image's encoded bytes"""
+    return hashlib.sha256(data).hexdigest()
+
+class ResultCache:
+    # Content-addressed store of encoded filter outputs. An entry is keyed by
+    # the source image hash, the filter name, the filter's parameters and the
+    # code version, so any change to one of them simply misses the cache.
+    # File modification times record the last access for LRU eviction.
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES,
+                 code_version=FILTER_CODE_VERSION):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.code_version = code_version
+
+    def key(self, source_hash, filter_name, params):
+        """Cache key for one filter output of one source image"""
+        # OpenCV's version is part of the key because its encoder and
+        # kernels determine the exact bytes of every output.
+        identity = [source_hash, filter_name, params, self.code_version, cv2.__version__]
+        return hashlib.sha256(json.dumps(identity, sort_keys=True).encode()).hexdigest()
+
+    def path(self, key):
+        # Fan entries out over 256 subdirectories to keep directories small.
+        # Entries are opaque blobs in whatever format their codec produced
+        # (part of the key), so they carry no file extension.
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def get(self, key):
+        """Return the path of a cached output, or None on a miss"""
+        path = self.path(key)
+        try:
+            # Touch the entry so eviction treats it as recently used.
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, key, data):
+        """Store encoded output bytes under key"""
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write to a temporary file and rename so concurrent workers never
+        # observe a partially written entry.
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def evict(self):
+        """
+        Delete least recently used entries until the cache fits max_bytes
+        Returns (entries_removed, bytes_remaining)
+        """
+        entries = []
+        total_bytes = 0
+        for root, dirs, files in os.walk(self.cache_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total_bytes += stat.st_size
+
+        # Oldest access first.
+        entries.sort()
+        removed = 0
+        for mtime, size, path in entries:
+            if total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total_bytes -= size
+            removed += 1
+        return removed, total_bytes
+
+def count_entries(cache_dir=DEFAULT_CACHE_DIR):
+    """Number of entries stored in a cache directory"""
+    return sum(len(files) for _, _, files in os.walk(cache_dir))
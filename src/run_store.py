@@ -0,0 +1,322 @@
+import os
+import sys
+import json
+import time
+import uuid
+import sqlite3
+import platform
+import argparse
+import subprocess
+import numpy as np
+from collections import Counter
+
+# Local history of every recorded run; kept across runs, unlike the JSON files.
+DEFAULT_DB_PATH = os.path.join("results", "run_history.sqlite")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    session TEXT NOT NULL,
+    label TEXT,
+    created_at TEXT NOT NULL,
+    backend TEXT NOT NULL,
+    num_workers INTEGER NOT NULL,
+    num_images INTEGER,
+    total_time REAL,
+    startup_time REAL,
+    throughput REAL,
+    p50 REAL,
+    p95 REAL,
+    total_time_samples TEXT,
+    config TEXT,
+    host TEXT,
+    versions TEXT,
+    git_commit TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_session ON runs (session);
+CREATE TABLE IF NOT EXISTS timings (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    seconds REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS timings_run ON timings (run_id);
+"""
+
+# Result keys that describe the configuration rather than the measurement.
+CONFIG_KEYS = ('filters', 'batch_size', 'streaming', 'shared_memory', 'use_cache',
+               'cpu_budget', 'threads_per_worker', 'tile_threshold', 'max_in_flight', 'output_format',
+               'preview_scale', 'edge_precision', 'point_ops', 'repetitions', 'warmup')
+
+def host_info():
+    """CPU model and count, OS and hostname of this machine"""
+    cpu_model = platform.processor()
+    try:
+        with open('/proc/cpuinfo', 'r') as f:
+            for line in f:
+                if line.startswith('model name'):
+                    cpu_model = line.split(':', 1)[1].strip()
+                    break
+    except OSError:
+        pass
+    return {
+        'hostname': platform.node(),
+        'cpu_model': cpu_model,
+        'cpu_count': os.cpu_count(),
+        'platform': platform.platform(),
+    }
+
+def library_versions():
+    """Versions of Python and of the libraries that determine filter speed"""
+    import cv2
+    import PIL
+    return {
+        'python': platform.python_version(),
+        'opencv': cv2.__version__,
+        'pillow': PIL.__version__,
+        'numpy': np.__version__,
+    }
+
+def git_commit():
+    """Current commit, suffixed with -dirty for uncommitted changes; None outside git"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return f"{commit}-dirty" if dirty else commit
+
+class RunStore:
+    # SQLite store of pipeline results. A session groups the runs of one
+    # invocation (e.g. every backend and worker count of main.py), and is
+    # the unit that compare() checks against a baseline.
+
+    def __init__(self, path=DEFAULT_DB_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript(SCHEMA)
+        # Host, versions and commit, collected once per session rather than per run
+        self._environments = {}
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @staticmethod
+    def new_session():
+        """Identifier for a new group of runs, sortable by time"""
+        return f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+
+    def environment(self, session):
+        """JSON host info, JSON library versions and git commit, shared by a session's runs"""
+        if session not in self._environments:
+            self._environments[session] = (json.dumps(host_info()), json.dumps(library_versions()),
+                                           git_commit())
+        return self._environments[session]
+
+    def record(self, backend, num_workers, result, session, label=None):
+        """Store one pipeline result with its environment; returns the run id"""
+        times = result.get('processing_times') or []
+        stats = result.get('time_stats') or {}
+        p50 = stats.get('p50', float(np.percentile(times, 50)) if times else None)
+        p95 = stats.get('p95', float(np.percentile(times, 95)) if times else None)
+        total_time = result['total_time']
+        samples = (result.get('total_time_stats') or {}).get('samples', [total_time])
+        host, versions, commit = self.environment(session)
+
+        with self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO runs (session, label, created_at, backend, num_workers, num_images,"
+                " total_time, startup_time, throughput, p50, p95, total_time_samples, config,"
+                " host, versions, git_commit) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (session, label, time.strftime('%Y-%m-%dT%H:%M:%S'), backend, int(num_workers),
+                 result['num_images'], total_time, result.get('startup_time'),
+                 result['num_images'] / total_time if total_time > 0 else 0.0, p50, p95,
+                 json.dumps(samples),
+                 json.dumps({key: result.get(key) for key in CONFIG_KEYS if key in result}),
+                 host, versions, commit))
+            run_id = cursor.lastrowid
+            self.conn.executemany("INSERT INTO timings (run_id, seconds) VALUES (?, ?)",
+                                  ((run_id, t) for t in times))
+        return run_id
+
+    def record_results(self, backend, results, session, label=None):
+        """Store every worker count of an experiment's results"""
+        return [self.record(backend, num_workers, result, session, label)
+                for num_workers, result in results.items()]
+
+    def sessions(self):
+        """Recorded sessions, newest first, with their label, commit and versions"""
+        return self.conn.execute(
+            "SELECT session, MAX(label) AS label, MIN(created_at) AS created_at,"
+            " MAX(git_commit) AS git_commit, MAX(versions) AS versions, COUNT(*) AS runs"
+            " FROM runs GROUP BY session ORDER BY created_at DESC, session DESC").fetchall()
+
+    def resolve_session(self, selector):
+        """
+        Find a session from a selector: 'latest', 'previous', a session id,
+        a label or a (prefix of a) git commit; the newest match wins
+        """
+        sessions = self.sessions()
+        if selector == 'latest':
+            return sessions[0]['session'] if sessions else None
+        if selector == 'previous':
+            return sessions[1]['session'] if len(sessions) > 1 else None
+        for row in sessions:
+            if selector in (row['session'], row['label']) or \
+                    (row['git_commit'] or '').startswith(selector):
+                return row['session']
+        return None
+
+    def session_runs(self, session):
+        """
+        Runs of a session keyed by (backend, num_workers, config), where
+        config is the run's configuration as canonical JSON; of several runs
+        with the same key, the later one wins
+        """
+        rows = self.conn.execute("SELECT * FROM runs WHERE session = ? ORDER BY id",
+                                 (session,)).fetchall()
+        return {(row['backend'], row['num_workers'], config_key(row['config'])): row for row in rows}
+
+    def timings(self, run_id):
+        """Per-image timings of a run as an array"""
+        rows = self.conn.execute("SELECT seconds FROM timings WHERE run_id = ?", (run_id,))
+        return np.array([row[0] for row in rows], dtype=float)
+
+    def compare(self, baseline, candidate, min_change=0.05, confidence=0.95, resamples=2000):
+        """
+        Compare every configuration present in both sessions
+
+        Runs are only matched when backend, worker count and configuration
+        (CONFIG_KEYS) all agree, so e.g. a cached run is never compared
+        against an uncached one. Throughput is compared on the repeated total_time samples of each run
+        and p95 latency on the per-image timings. A change is flagged as a
+        regression only if it is at least min_change (relative) and the
+        bootstrap confidence interval of the relative change lies entirely
+        on the slower side.
+        """
+        base_runs = self.session_runs(baseline)
+        cand_runs = self.session_runs(candidate)
+        rng = np.random.default_rng(0)
+        rows = []
+        for key in sorted(base_runs.keys() & cand_runs.keys()):
+            base, cand = base_runs[key], cand_runs[key]
+
+            # Images per second for each repetition of the run.
+            base_tput = base['num_images'] / np.array(json.loads(base['total_time_samples']))
+            cand_tput = cand['num_images'] / np.array(json.loads(cand['total_time_samples']))
+            tput = relative_change(base_tput, cand_tput, np.median, rng, confidence, resamples)
+            # Lower throughput is worse.
+            tput['regression'] = tput['ci_high'] < 0 and tput['change'] <= -min_change
+
+            p95 = relative_change(self.timings(base['id']), self.timings(cand['id']),
+                                  lambda a: np.percentile(a, 95), rng, confidence, resamples)
+            # Higher latency is worse.
+            p95['regression'] = p95['ci_low'] > 0 and p95['change'] >= min_change
+
+            rows.append({'backend': key[0], 'num_workers': key[1], 'config': json.loads(key[2]),
+                         'throughput': tput, 'p95_latency': p95})
+        return rows
+
+def config_key(config):
+    """Canonical JSON of a stored run configuration, for matching runs across sessions"""
+    return json.dumps(json.loads(config or '{}'), sort_keys=True)
+
+def relative_change(base, cand, stat, rng, confidence=0.95, resamples=2000):
+    """
+    Relative change stat(cand) / stat(base) - 1 with a bootstrap interval
+    With fewer than two samples on either side the interval is unbounded,
+    so the change can never be reported as significant.
+    """
+    base = np.asarray(base, dtype=float)
+    cand = np.asarray(cand, dtype=float)
+    if len(base) == 0 or len(cand) == 0:
+        return {'base': None, 'cand': None, 'change': 0.0, 'ci_low': -np.inf, 'ci_high': np.inf}
+    base_value, cand_value = float(stat(base)), float(stat(cand))
+    change = cand_value / base_value - 1 if base_value else 0.0
+    if len(base) < 2 or len(cand) < 2:
+        return {'base': base_value, 'cand': cand_value, 'change': change,
+                'ci_low': -np.inf, 'ci_high': np.inf}
+
+    changes = np.empty(resamples)
+    for i in range(resamples):
+        b = stat(rng.choice(base, len(base)))
+        c = stat(rng.choice(cand, len(cand)))
+        changes[i] = c / b - 1 if b else 0.0
+    alpha = (1 - confidence) / 2
+    ci_low, ci_high = np.quantile(changes, [alpha, 1 - alpha])
+    return {'base': base_value, 'cand': cand_value, 'change': change,
+            'ci_low': float(ci_low), 'ci_high': float(ci_high)}
+
+def print_comparison(rows, baseline, candidate):
+    """Print the comparison table; returns the number of regressions"""
+    print(f"Baseline:  {baseline}")
+    print(f"Candidate: {candidate}")
+    print(f"{'Backend':<20} {'Workers':<8} {'Images/s':<24} {'p95 latency (ms)':<26} {'Status':<10}")
+    regressions = 0
+    for row in rows:
+        tput, p95 = row['throughput'], row['p95_latency']
+        flags = [name for name, check in (('throughput', tput), ('p95', p95)) if check['regression']]
+        regressions += bool(flags)
+        tput_text = (f"{tput['base']:.1f} -> {tput['cand']:.1f} ({tput['change']:+.1%})"
+                     if tput['base'] is not None else "N/A")
+        p95_text = (f"{p95['base'] * 1000:.1f} -> {p95['cand'] * 1000:.1f} ({p95['change']:+.1%})"
+                    if p95['base'] is not None else "N/A")
+        status = "REGRESSED " + ",".join(flags) if flags else "ok"
+        print(f"{row['backend']:<20} {row['num_workers']:<8} {tput_text:<24} {p95_text:<26} {status}")
+    # The same backend and worker count can appear under several configurations.
+    counts = Counter((row['backend'], row['num_workers']) for row in rows)
+    for row in rows:
+        if counts[(row['backend'], row['num_workers'])] > 1:
+            print(f"  {row['backend']} / {row['num_workers']}: {json.dumps(row['config'], sort_keys=True)}")
+    if not rows:
+        print("No configurations in common between the two sessions.")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run history and regression checks")
+    parser.add_argument('--db', default=DEFAULT_DB_PATH)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    sub.add_parser('list', help="list recorded sessions")
+
+    compare = sub.add_parser('compare', help="flag regressions of a session against a baseline")
+    compare.add_argument('--baseline', default='previous',
+                         help="'previous', a session id, label or git commit")
+    compare.add_argument('--candidate', default='latest')
+    compare.add_argument('--min-change', type=float, default=0.05,
+                         help="smallest relative change reported as a regression")
+
+    args = parser.parse_args(argv)
+    with RunStore(args.db) as store:
+        if args.command == 'list':
+            print(f"{'Session':<24} {'Label':<16} {'Commit':<14} {'OpenCV':<10} {'Pillow':<8} {'Runs':<5}")
+            for row in store.sessions():
+                versions = json.loads(row['versions'] or '{}')
+                print(f"{row['session']:<24} {row['label'] or '':<16} {(row['git_commit'] or '')[:12]:<14} "
+                      f"{versions.get('opencv', ''):<10} {versions.get('pillow', ''):<8} {row['runs']:<5}")
+            return 0
+
+        baseline = store.resolve_session(args.baseline)
+        candidate = store.resolve_session(args.candidate)
+        if baseline is None or candidate is None:
+            print("Baseline or candidate session not found (see 'list').")
+            return 2
+        rows = store.compare(baseline, candidate, min_change=args.min_change)
+        regressions = print_comparison(rows, baseline, candidate)
+        unmatched = (store.session_runs(baseline).keys() ^ store.session_runs(candidate).keys())
+        if unmatched:
+            print(f"{len(unmatched)} runs have no counterpart with the same configuration "
+                  f"in the other session and were not compared.")
+        # A non-zero exit status lets CI jobs fail on a regression.
+        return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,74 @@
+import math
+import random
+
+class RunningStats:
+    # Streaming summary of per-image timings. Count, sum, mean, variance
+    # (Welford's algorithm), min and max are exact; percentiles come from a
+    # fixed-size uniform reservoir sample, so memory stays constant no
+    # matter how many values are added. The pipelines record a failed image
+    # as a timing of 0, so those are counted separately as well.
+
+    def __init__(self, reservoir_size=10000, seed=0):
+        self.count = 0
+        self.total = 0.0
+        self.failed = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.reservoir_size = reservoir_size
+        self.reservoir = []
+        self._random = random.Random(seed)
+
+    def add(self, value):
+        """Add one observation"""
+        self.count += 1
+        self.total += value
+        if value == 0:
+            self.failed += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+        # Reservoir sampling (Algorithm R) keeps a uniform sample for percentiles.
+        if len(self.reservoir) < self.reservoir_size:
+            self.reservoir.append(value)
+        else:
+            index = self._random.randrange(self.count)
+            if index < self.reservoir_size:
+                self.reservoir[index] = value
+
+    def extend(self, values):
+        """Add several observations"""
+        for value in values:
+            self.add(value)
+
+    @property
+    def stdev(self):
+        return math.sqrt(self._m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+    def percentile(self, q):
+        """Approximate q-th percentile (0-100) from the reservoir sample"""
+        if not self.reservoir:
+            return 0.0
+        ordered = sorted(self.reservoir)
+        rank = (len(ordered) - 1) * q / 100
+        low = math.floor(rank)
+        high = min(low + 1, len(ordered) - 1)
+        return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+    def as_dict(self):
+        """Summary suitable for the JSON results"""
+        return {
+            'count': self.count,
+            'sum': self.total,
+            'failed': self.failed,
+            'mean': self.mean,
+            'stdev': self.stdev,
+            'min': self.min if self.count else 0.0,
+            'max': self.max if self.count else 0.0,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+        }
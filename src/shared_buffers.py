@@ -0,0 +1,104 @@
+import queue
+import numpy as np
+from multiprocessing import shared_memory, resource_tracker
+
+# Offsets inside a slot are rounded up to this many bytes so every array
+# starts on a cache-line boundary.
+ALIGNMENT = 64
+
+# Shared memory blocks already attached in this process, keyed by name.
+# Workers attach once and reuse the mapping for every task.
+_attached = {}
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+def attach(name):
+    """Return this process's mapping of the named shared memory block"""
+    if name not in _attached:
+        _attached[name] = shared_memory.SharedMemory(name=name)
+    return _attached[name]
+
+def share_resource_tracker():
+    """
+    Start the resource tracker in the parent before creating a worker pool
+    Workers then inherit it, so attaching to a block registers it with the
+    same tracker as its creator instead of a per-worker tracker that would
+    unlink the block when that worker exits.
+    """
+    resource_tracker.ensure_running()
+
+def array_from_descriptor(descriptor, buf=None):
+    """
+    Return an ndarray view described by (name, shape, dtype, offset)
+    No data is copied; the view aliases the shared memory block.
+    """
+    name, shape, dtype, offset = descriptor
+    if buf is None:
+        buf = attach(name).buf
+    return np.ndarray(shape, dtype=np.dtype(dtype), buffer=buf, offset=offset)
+
+def pack_arrays(slot, arrays):
+    """
+    Copy arrays into a shared slot and return their descriptors
+    slot is (name, offset, size) as handed out by SharedBufferPool.
+    Returns None when the arrays do not fit so the caller can fall back
+    to sending them by value.
+    """
+    name, slot_offset, slot_size = slot
+
+    # Lay the arrays out back to back and check the slot is big enough
+    # before touching shared memory.
+    layout = {}
+    offset = 0
+    for key, arr in arrays.items():
+        offset = _align(offset)
+        layout[key] = offset
+        offset += arr.nbytes
+    if offset > slot_size:
+        return None
+
+    buf = attach(name).buf
+    descriptors = {}
+    for key, arr in arrays.items():
+        descriptor = (name, arr.shape, arr.dtype.str, slot_offset + layout[key])
+        np.copyto(array_from_descriptor(descriptor, buf), arr)
+        descriptors[key] = descriptor
+    return descriptors
+
+class SharedBufferPool:
+    # A fixed number of equally sized slots carved out of one shared memory
+    # block. Workers receive only a slot descriptor and write their outputs
+    # into it; the parent recycles slots instead of allocating per image.
+
+    def __init__(self, num_slots, slot_bytes):
+        self.num_slots = num_slots
+        self.slot_bytes = _align(slot_bytes)
+        self.shm = shared_memory.SharedMemory(create=True, size=self.num_slots * self.slot_bytes)
+        self.free_slots = queue.Queue()
+        for index in range(num_slots):
+            self.free_slots.put(index)
+
+    def acquire(self):
+        """Take a free slot, blocking until one is released"""
+        index = self.free_slots.get()
+        return (self.shm.name, index * self.slot_bytes, self.slot_bytes)
+
+    def release(self, slot):
+        """Return a slot to the pool once its contents have been consumed"""
+        self.free_slots.put(slot[1] // self.slot_bytes)
+
+    def view(self, descriptor):
+        """ndarray view of an array a worker wrote into this pool"""
+        return array_from_descriptor(descriptor, self.shm.buf)
+
+    def close(self):
+        """Release and remove the shared memory block"""
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
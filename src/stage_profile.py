@@ -0,0 +1,139 @@
+import os
+import json
+import time
+import shutil
+import contextlib
+from running_stats import RunningStats
+
+# Per-run folders of raw stage records, merged into the results JSON afterwards.
+PROFILE_ROOT = os.path.join("results", "profiles")
+
+class StageTimer:
+    # Stage durations for one image, written as one JSON line per image to a
+    # file named after the writing process. Only created when profiling is
+    # on; call sites time blocks through stage(timer, name), which is a
+    # no-op context when the timer is None.
+
+    def __init__(self, image_path, pid_key='pid'):
+        self.record = {'image': image_path, pid_key: os.getpid(), 'stages': {}, 'outputs': {}}
+        # (name, start, seconds) of every timed block, for trace export.
+        self.spans = []
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Time the enclosed block and add it to stage name"""
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start_time
+            self.spans.append((name, start_time, seconds))
+            self.add(name, seconds)
+
+    def add(self, name, seconds):
+        stages = self.record['stages']
+        stages[name] = stages.get(name, 0.0) + seconds
+
+    def add_output(self, codec, encode_seconds, num_bytes):
+        """Count one encoded output under its codec label"""
+        output = self.record['outputs'].setdefault(codec, {'count': 0, 'encode_time': 0.0, 'bytes': 0})
+        output['count'] += 1
+        output['encode_time'] += encode_seconds
+        output['bytes'] += num_bytes
+
+    def set_shape(self, img):
+        """Record the decoded image dimensions"""
+        self.record['height'], self.record['width'] = img.shape[:2]
+
+    def write(self, profile_dir):
+        # Append and close per image: workers may be terminated with the pool,
+        # so nothing may be left sitting in an unflushed buffer.
+        path = os.path.join(profile_dir, f"{os.getpid()}.jsonl")
+        with open(path, 'a') as f:
+            f.write(json.dumps(self.record) + "\n")
+
+def stage(timer, name):
+    """timer.stage(name), or a no-op context when timer is None (profiling off)"""
+    return contextlib.nullcontext() if timer is None else timer.stage(name)
+
+def new_profile_dir(root=PROFILE_ROOT):
+    """Create an empty folder for one run's stage records"""
+    profile_dir = os.path.join(root, f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{time.perf_counter_ns()}")
+    os.makedirs(profile_dir)
+    return profile_dir
+
+def load_profile(profile_dir):
+    """
+    Read every stage record of a run, merging records for the same image
+    (e.g. compute stages from a worker and write stages from a writer thread)
+    """
+    records = {}
+    for name in sorted(os.listdir(profile_dir)):
+        with open(os.path.join(profile_dir, name), 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # A line cut short by a killed worker
+                merged = records.setdefault(record['image'], {'image': record['image'], 'stages': {},
+                                                              'outputs': {}})
+                for stage, seconds in record.pop('stages').items():
+                    merged['stages'][stage] = merged['stages'].get(stage, 0.0) + seconds
+                for codec, output in record.pop('outputs', {}).items():
+                    totals = merged['outputs'].setdefault(codec, {'count': 0, 'encode_time': 0.0, 'bytes': 0})
+                    for key, value in output.items():
+                        totals[key] += value
+                for key, value in record.items():
+                    merged.setdefault(key, value)
+    return list(records.values())
+
+def summarize_profile(records):
+    """Per-stage timing statistics, per-codec encode cost, per-worker image counts and image sizes"""
+    stages = {}
+    outputs = {}
+    workers = {}
+    megapixels = RunningStats()
+    for record in records:
+        for stage, seconds in record['stages'].items():
+            stages.setdefault(stage, RunningStats()).add(seconds)
+        for codec, output in record.get('outputs', {}).items():
+            totals = outputs.setdefault(codec, {'count': 0, 'encode_time': 0.0, 'bytes': 0})
+            for key, value in output.items():
+                totals[key] += value
+        if 'pid' in record:
+            workers[record['pid']] = workers.get(record['pid'], 0) + 1
+        if 'width' in record:
+            megapixels.add(record['width'] * record['height'] / 1e6)
+    return {
+        'images': len(records),
+        'stages': {stage: stats.as_dict() for stage, stats in stages.items()},
+        'outputs': outputs,
+        'images_per_worker': workers,
+        'megapixels': megapixels.as_dict(),
+    }
+
+def collect_profile(profile_dir, keep_records=True):
+    """
+    Summarise a finished run's records and remove the raw files
+    Returns (summary, records); records is None when keep_records is False.
+    """
+    records = load_profile(profile_dir)
+    summary = summarize_profile(records)
+    shutil.rmtree(profile_dir, ignore_errors=True)
+    return summary, (records if keep_records else None)
+
+def print_profile(summary):
+    """Print mean milliseconds per image for each stage, slowest first"""
+    images = summary['images'] or 1
+    print(f"Stage breakdown over {summary['images']} images (mean ms per image):")
+    for stage, stats in sorted(summary['stages'].items(), key=lambda item: -item[1]['sum']):
+        if stage != 'total':
+            print(f"  {stage:<20} {stats['sum'] / images * 1000:8.2f}")
+    if 'total' in summary['stages']:
+        print(f"  {'(whole image)':<20} {summary['stages']['total']['mean'] * 1000:8.2f}")
+    if summary.get('outputs'):
+        print(f"  {'Codec':<12} {'Outputs':<9} {'Encode (ms/output)':<20} {'Bytes written':<15} {'KB/output':<10}")
+        for codec, output in sorted(summary['outputs'].items()):
+            count = output['count'] or 1
+            print(f"  {codec:<12} {output['count']:<9} {output['encode_time'] / count * 1000:<20.2f} "
+                  f"{output['bytes']:<15} {output['bytes'] / count / 1024:<10.1f}")
@@ -0,0 +1,251 @@
+import time
+import queue
+import threading
+import concurrent.futures
+from image_filters import ImageProcessor, filter_graph, check_point_ops
+from input_shards import read_source_bytes
+from shared_buffers import SharedBufferPool, pack_arrays
+from stage_profile import StageTimer, stage
+from tracing import write_task_trace
+
+# Default size of one shared memory slot: room for all five outputs of
+# an image of roughly 0.7 megapixels (11 bytes per pixel).
+DEFAULT_SLOT_BYTES = 8 * 1024 * 1024
+
+# Marker placed on a queue to tell the consuming threads to stop.
+_STOP = object()
+
+def read_image_bytes(image_path):
+    """Read the raw encoded bytes of an image file or packed image (stage 1, I/O thread)"""
+    # Packed images are copied out of the mapping here: the bytes are sent
+    # to another process, and a memoryview cannot be pickled.
+    return bytes(read_source_bytes(image_path))
+
+def filter_image_bytes(image_path, data, filters=None, tile_threshold=None, profile_dir=None,
+                       trace_dir=None, preview_scale=None, edge_precision=None, point_ops=None):
+    """
+    Decode prefetched bytes and run the filters (stage 2, worker process)
+    Returns (image_path, outputs, processing_time)
+    preview_scale 2, 4 or 8 decodes at a reduced size (see ImageProcessor.load_image).
+    edge_precision selects the edge detection arithmetic (see EDGE_PRECISIONS)
+    and point_ops the brightened output's lookup table (see check_point_ops).
+    With profile_dir the decode and filter stages are recorded (see
+    stage_profile); with trace_dir they are traced as timeline spans.
+    """
+    start_time = time.perf_counter()
+    timer = None
+    if profile_dir is not None or trace_dir is not None:
+        timer = StageTimer(image_path)
+    with stage(timer, 'decode'):
+        img = ImageProcessor.decode_image_bytes(data, preview_scale)
+    if img is None:
+        raise ValueError(f"Could not decode image: {image_path}")
+    if timer is not None:
+        timer.set_shape(img)
+    outputs = ImageProcessor.run_filters(img, filters, tile_threshold, timer,
+                                         filter_graph(edge_precision, check_point_ops(point_ops)))
+    processing_time = time.perf_counter() - start_time
+    if profile_dir is not None:
+        timer.write(profile_dir)
+    if trace_dir is not None:
+        write_task_trace(trace_dir, image_path, start_time, start_time + processing_time,
+                         timer, cat='compute')
+    return image_path, outputs, processing_time
+
+def filter_image_bytes_shared(image_path, data, filters, slot, **filter_options):
+    """
+    Like filter_image_bytes, but write the outputs into a shared memory slot
+    Returns descriptors instead of pixel arrays so nothing large is pickled;
+    outputs that do not fit in the slot are returned by value instead.
+    """
+    image_path, outputs, processing_time = filter_image_bytes(image_path, data, filters, **filter_options)
+    descriptors = pack_arrays(slot, outputs)
+    return image_path, (descriptors if descriptors is not None else outputs), processing_time
+
+def pool_submitter(pool):
+    """Adapt a multiprocessing.Pool to the executor-style submit(fn, *args, **kwargs) -> Future"""
+    def submit(fn, *args, **kwargs):
+        future = concurrent.futures.Future()
+        pool.apply_async(fn, args, kwargs, callback=future.set_result,
+                         error_callback=future.set_exception)
+        return future
+    return submit
+
+def run_streaming(image_paths, submit, num_workers, filters=None,
+                  output_dir="results/output_images", io_threads=4, writer_threads=4,
+                  queue_size=None, shared_memory=False, slot_bytes=DEFAULT_SLOT_BYTES,
+                  filter_options=None, stats=None):
+    """
+    Three-stage streaming pipeline: prefetch/decode, compute, encode/write
+
+    submit(fn, *args) must schedule fn on the process pool and return a
+    concurrent.futures.Future. Stages are connected by bounded queues so a
+    slow stage applies backpressure instead of buffering the whole dataset.
+    With shared_memory=True workers write their outputs into recycled
+    shared memory slots and only send back (name, shape, dtype, offset)
+    descriptors, avoiding pickling full frames.
+    filter_options are extra keyword arguments for filter_image_bytes
+    (e.g. tile_threshold, profile_dir, trace_dir); the writers also record
+    their encode and write stages and spans when profiling or tracing.
+    Its codecs and archive_dir entries (see output_codecs, archive_sink)
+    are used by the writers only; each writer thread owns one shard.
+    image_paths may be any iterable, including a generator from the indexer;
+    it is consumed lazily. Returns the per-image processing times (compute
+    plus encode/write), or, when a RunningStats is passed as stats, adds
+    them to it and returns an empty list so nothing grows with the dataset.
+    """
+    # Bound every queue to a few items per worker: enough to keep the pool
+    # busy while disks and encoders catch up, without unbounded buffering.
+    if queue_size is None:
+        queue_size = num_workers * 2
+    filter_options = dict(filter_options or {})
+    codecs = filter_options.pop('codecs', None)
+    archive_dir = filter_options.pop('archive_dir', None)
+    profile_dir = filter_options.get('profile_dir')
+    trace_dir = filter_options.get('trace_dir')
+
+    path_queue = queue.Queue(maxsize=queue_size)
+    read_queue = queue.Queue(maxsize=queue_size)
+    write_queue = queue.Queue(maxsize=queue_size)
+    in_flight = threading.BoundedSemaphore(queue_size)
+    results = []
+    stats_lock = threading.Lock()
+
+    def record(processing_time):
+        if stats is None:
+            results.append(processing_time)
+        else:
+            with stats_lock:
+                stats.add(processing_time)
+    
+    # Enough slots for every image that can be computing, queued for
+    # writing or being written at the same time, so memory stays flat.
+    buffer_pool = None
+    if shared_memory:
+        buffer_pool = SharedBufferPool(queue_size * 2 + writer_threads, slot_bytes)
+
+    # An exception from the path iterable, re-raised in the calling thread
+    # once the images already read have been processed.
+    feeder_error = []
+
+    # ---------------- Stage 1: prefetch raw bytes ---------------- #
+    def feeder():
+        # Paths are pulled from the iterable only as fast as readers take them.
+        try:
+            for image_path in image_paths:
+                path_queue.put(image_path)
+        except BaseException as e:
+            feeder_error.append(e)
+        finally:
+            # Readers always get their sentinels, or the dispatch loop would wait forever.
+            for _ in range(io_threads):
+                path_queue.put(_STOP)
+
+    def reader():
+        while True:
+            image_path = path_queue.get()
+            if image_path is _STOP:
+                read_queue.put(_STOP)
+                return
+            try:
+                data = read_image_bytes(image_path)
+            except Exception as e:
+                # Any failure (unreadable file, malformed packed ref, empty
+                # shard) skips the image; the reader must survive to post _STOP.
+                print(f"Error reading {image_path}: {e}")
+                data = None
+            read_queue.put((image_path, data))
+
+    # ---------------- Stage 3: encode and write outputs ---------------- #
+    def writer():
+        while True:
+            item = write_queue.get()
+            if item is _STOP:
+                return
+            (image_path, outputs, processing_time), slot = item
+            try:
+                start_time = time.perf_counter()
+                if slot is not None:
+                    # Encode straight from the shared slot without copying.
+                    outputs = {name: buffer_pool.view(value) if isinstance(value, tuple) else value
+                               for name, value in outputs.items()}
+                if profile_dir is None and trace_dir is None:
+                    ImageProcessor.save_outputs(image_path, outputs, output_dir, codecs=codecs,
+                                                archive_dir=archive_dir)
+                else:
+                    # Write stages run here, in the parent, so they get their own record.
+                    timer = StageTimer(image_path, pid_key='writer_pid')
+                    ImageProcessor.save_outputs(image_path, outputs, output_dir, timer, codecs,
+                                                archive_dir)
+                    if profile_dir is not None:
+                        timer.write(profile_dir)
+                    if trace_dir is not None:
+                        write_task_trace(trace_dir, image_path, start_time, time.perf_counter(),
+                                         timer, cat='write')
+                record(processing_time + time.perf_counter() - start_time)
+            except Exception as e:
+                print(f"Error writing outputs for {image_path}: {e}")
+                record(0)
+            finally:
+                # Drop the views before recycling the slot for another image.
+                outputs = None
+                if slot is not None:
+                    buffer_pool.release(slot)
+
+    # Hand a finished compute task to the writers and free its in-flight slot.
+    def on_done(future, image_path, slot):
+        try:
+            write_queue.put((future.result(), slot))
+        except Exception as e:
+            print(f"Error processing {image_path}: {e}")
+            record(0)
+            if slot is not None:
+                buffer_pool.release(slot)
+        finally:
+            in_flight.release()
+
+    readers = [threading.Thread(target=reader, daemon=True) for _ in range(io_threads)]
+    writers = [threading.Thread(target=writer, daemon=True) for _ in range(writer_threads)]
+    for thread in [threading.Thread(target=feeder, daemon=True)] + readers + writers:
+        thread.start()
+
+    try:
+        # ---------------- Stage 2: dispatch compute to the process pool ---------------- #
+        finished_readers = 0
+        while finished_readers < io_threads:
+            item = read_queue.get()
+            if item is _STOP:
+                finished_readers += 1
+                continue
+            image_path, data = item
+            if data is None:
+                record(0)
+                continue
+
+            # Block while the pool and write queue already hold enough work.
+            in_flight.acquire()
+            if buffer_pool is not None:
+                slot = buffer_pool.acquire()
+                future = submit(filter_image_bytes_shared, image_path, data, filters, slot,
+                                    **filter_options)
+            else:
+                slot = None
+                future = submit(filter_image_bytes, image_path, data, filters, **filter_options)
+            future.add_done_callback(lambda f, p=image_path, s=slot: on_done(f, p, s))
+
+        # Reclaim every in-flight slot: once all are back, each compute callback
+        # has handed its result to the write queue. Then drain and stop the writers.
+        for _ in range(queue_size):
+            in_flight.acquire()
+        for _ in range(writer_threads):
+            write_queue.put(_STOP)
+        for thread in writers:
+            thread.join()
+        if feeder_error:
+            raise feeder_error[0]
+    finally:
+        # Always unlink the shared memory block, even if a stage failed.
+        if buffer_pool is not None:
+            buffer_pool.close()
+
+    return results
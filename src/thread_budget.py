@@ -0,0 +1,91 @@
+import os
+import time
+import cv2
+from contextlib import contextmanager
+
+def threads_per_worker(num_workers, cpu_budget=None):
+    """Split a CPU budget (default: all cores) evenly between worker processes"""
+    if cpu_budget is None:
+        cpu_budget = os.cpu_count() or 1
+    return max(1, cpu_budget // max(1, num_workers))
+
+def resolve_budget(num_workers, cpu_budget=None, num_threads=None):
+    """
+    (cpu_budget, threads per worker) of a run: the budget defaults to all
+    cores and is split evenly between workers unless num_threads is given
+    """
+    if cpu_budget is None:
+        cpu_budget = os.cpu_count() or 1
+    if num_threads is None:
+        num_threads = threads_per_worker(num_workers, cpu_budget)
+    return cpu_budget, num_threads
+
+@contextmanager
+def opencv_threads(num_threads):
+    """
+    Cap OpenCV's thread pool in this process for the duration of a block
+    For thread-pool runs, where every worker shares the process-wide setting.
+    """
+    previous = cv2.getNumThreads()
+    cv2.setNumThreads(num_threads)
+    try:
+        yield
+    finally:
+        cv2.setNumThreads(previous)
+
+def init_worker_threads(num_threads):
+    """
+    Pool initializer that caps the threads each worker may start internally
+
+    cv2.setNumThreads limits OpenCV's own parallel_for pool, which takes
+    effect immediately even though cv2 is already imported. The filters make
+    no BLAS calls, and OpenMP/BLAS thread variables set here would come too
+    late anyway: NumPy is loaded in the worker before the initializer runs.
+    """
+    cv2.setNumThreads(num_threads)
+
+def worker_threads():
+    """
+    Threads this process may use for its own parallel work: the cap set by
+    init_worker_threads (or cv2.setNumThreads), else OpenCV's default
+    """
+    return max(1, cv2.getNumThreads())
+
+def thread_splits(cpu_budget=None):
+    """
+    Every (processes, threads per process) pair that uses the whole budget
+    e.g. a budget of 4 gives [(4, 1), (2, 2), (1, 4)]
+    """
+    if cpu_budget is None:
+        cpu_budget = os.cpu_count() or 1
+    return [(cpu_budget // threads, threads)
+            for threads in range(1, cpu_budget + 1) if cpu_budget % threads == 0]
+
+def run_thread_split_experiment(image_folder, pipeline, cpu_budget=None, **pipeline_options):
+    """
+    Compare "many processes x 1 thread" with "few processes x N threads"
+
+    pipeline is multiprocessing_pipeline or futures_pipeline. Each split of
+    the CPU budget is run once; results are keyed by "<processes>x<threads>".
+    """
+    results = {}
+    for num_workers, num_threads in thread_splits(cpu_budget):
+        print(f"\n{'='*50}")
+        print(f"Running with {num_workers} processes x {num_threads} OpenCV threads...")
+        print('='*50)
+
+        results[f"{num_workers}x{num_threads}"] = pipeline(
+            image_folder, num_workers, threads_per_worker=num_threads, **pipeline_options
+        )
+
+        # Short pause between runs, as in the other experiments.
+        time.sleep(2)
+
+    # Summarise throughput so the best split is easy to spot.
+    print("\nTHREAD SPLIT SUMMARY:")
+    print(f"{'Split':<10} {'Time (s)':<12} {'Images/s':<12}")
+    for split, result in results.items():
+        throughput = result['num_images'] / result['total_time'] if result['total_time'] > 0 else 0
+        print(f"{split:<10} {result['total_time']:<12.2f} {throughput:<12.2f}")
+
+    return results
@@ -0,0 +1,274 @@
+import os
+import time
+import concurrent.futures
+from image_filters import (resolve_filters, check_preview_scale, check_edge_precision,
+                           check_point_ops, point_ops_label)
+from batching import make_batches, iter_batches, peek_first, auto_batch_size, noop_task
+from dataset_index import index_images, iter_image_paths
+from backpressure import submit_bounded
+from running_stats import RunningStats
+from output_codecs import resolve_codecs
+from archive_sink import new_archive_dir, finalize_archive
+from stage_profile import new_profile_dir, collect_profile, print_profile
+from tracing import new_trace_dir, export_trace, print_trace_summary
+from result_cache import ResultCache
+from tiling import DEFAULT_TILE_THRESHOLD
+from thread_budget import resolve_budget, opencv_threads
+from streaming_pipeline import run_streaming
+from concurrent_futures_impl import process_single_image_futures, process_image_batch_futures
+from pathlib import Path
+import multiprocessing
+
+def threads_pipeline(image_folder, num_threads=None, filters=None, batch_size=None,
+                     streaming=False, use_cache=False, tile_threshold=DEFAULT_TILE_THRESHOLD,
+                     max_in_flight=None, profile=False, trace=False, output_format=None, archive=False,
+                     preview_scale=None, edge_precision=None, point_ops=None, cpu_budget=None,
+                     threads_per_worker=None):
+    """
+    Process all images using a concurrent.futures ThreadPoolExecutor
+
+    The heavy calls in ImageProcessor (imread/imdecode, GaussianBlur, Sobel,
+    filter2D, LUT, imwrite) are OpenCV functions that release the GIL, so
+    threads run them in parallel without process spawn or pickling costs.
+    Options mirror futures_pipeline, including tile_threshold, max_in_flight,
+    output_format, archive (one tar shard per thread), preview_scale,
+    edge_precision and point_ops.
+
+    cpu_budget (default: all cores) is split between the threads as in the
+    process pipelines: OpenCV's own thread pool, which every thread shares,
+    is capped at cpu_budget // threads for the run and restored afterwards.
+    threads_per_worker sets that cap directly instead.
+    """
+    # Validate the filter selection up front rather than once per image.
+    filters = resolve_filters(filters)
+    preview_scale = check_preview_scale(preview_scale)
+    edge_precision = check_edge_precision(edge_precision)
+    point_ops = check_point_ops(point_ops)
+
+    # Per-image options forwarded to ImageProcessor.apply_all_filters.
+    # With profiling on, workers append per-stage timings to a per-run folder.
+    profile_dir = new_profile_dir() if profile else None
+    # With tracing on, every task is also recorded as a timeline span.
+    trace_dir = new_trace_dir() if trace else None
+    # Encoder of every output; outputs set to 'none' are computed but never written.
+    codecs = resolve_codecs(output_format, filters)
+    # With archiving on, outputs are appended to per-worker tar shards.
+    archive_dir = new_archive_dir() if archive else None
+    filter_options = {'tile_threshold': tile_threshold, 'profile_dir': profile_dir,
+                      'trace_dir': trace_dir, 'codecs': codecs, 'archive_dir': archive_dir,
+                      'preview_scale': preview_scale, 'edge_precision': edge_precision,
+                      'point_ops': point_ops}
+
+    # Threads share the cache object directly.
+    cache = ResultCache() if use_cache else None
+    if cache is not None and streaming:
+        print("Result cache is not used in streaming mode")
+
+    # Index the dataset in a single scandir pass, reusing the saved manifest.
+    windowed = max_in_flight is not None
+    if windowed:
+        # Pull paths lazily so the full list never exists in memory; the
+        # indexer itself keeps per-directory, not per-file, state.
+        image_paths = iter_image_paths(image_folder)
+        print(f"Streaming images with at most {max_in_flight} tasks in flight")
+    else:
+        image_paths = index_images(image_folder)
+
+        # Log the total number of images discovered in the dataset.
+        print(f"Found {len(image_paths)} images to process")
+
+    # Timings are summarised incrementally instead of from a full list.
+    times = RunningStats()
+
+    # If the number of threads is not specified, default to the number of CPU cores.
+    if num_threads is None:
+        num_threads = multiprocessing.cpu_count()
+
+    # Keep threads x OpenCV threads within the CPU budget.
+    cpu_budget, threads_per_worker = resolve_budget(num_threads, cpu_budget, threads_per_worker)
+
+    # Ensure the output directory exists before starting parallel execution.
+    Path("results/output_images").mkdir(parents=True, exist_ok=True)
+
+    # Executor startup is timed separately so total_time measures steady-state work.
+    pool_start = time.perf_counter()
+
+    # All threads live in this process, so starting the pool is almost free
+    # and arguments are passed by reference instead of being pickled.
+    with opencv_threads(threads_per_worker), \
+            concurrent.futures.ThreadPoolExecutor(max_workers=num_threads) as executor:
+        list(executor.map(noop_task, range(num_threads)))
+        startup_time = time.perf_counter() - pool_start
+
+        # Record the wall-clock start time for overall performance measurement.
+        start_time = time.perf_counter()
+
+        if streaming:
+            # I/O threads prefetch bytes, compute threads filter, writer threads encode.
+            results = run_streaming(image_paths, executor.submit, num_threads, filters,
+                                    queue_size=max_in_flight, filter_options=filter_options,
+                                    stats=times if windowed else None)
+        else:
+            if batch_size is None:
+                # One task per image.
+                task_func, tasks = process_single_image_futures, image_paths
+            else:
+                if batch_size == 'auto':
+                    # Probe the executor with empty tasks to measure dispatch overhead.
+                    sample_path, image_paths = peek_first(image_paths)
+                    batch_size = auto_batch_size(
+                        lambda n: list(executor.map(noop_task, range(n))),
+                        sample_path, None if windowed else len(image_paths), num_threads, filters,
+                        filter_options
+                    )
+
+                # One task per batch of paths.
+                task_func = process_image_batch_futures
+                tasks = iter_batches(image_paths, batch_size) if windowed else make_batches(image_paths, batch_size)
+
+            if windowed:
+                # Keep at most max_in_flight futures pending, refilling as each completes.
+                completed = submit_bounded(executor.submit, task_func, tasks, max_in_flight,
+                                           filters, cache, **filter_options)
+            else:
+                # Submit every task up front and collect results as each completes.
+                future_to_image = {
+                    executor.submit(task_func, task, filters, cache, **filter_options): task
+                    for task in tasks
+                }
+                completed = ((future_to_image[future], future)
+                             for future in concurrent.futures.as_completed(future_to_image))
+
+            results = []
+            for img_path, future in completed:
+                try:
+                    result = future.result()
+                    timings = [result] if batch_size is None else result
+                except Exception as e:
+                    print(f"Image {img_path} generated exception: {e}")
+                    timings = [0] if batch_size is None else [0] * len(img_path)
+                times.extend(timings)
+                if not windowed:
+                    results.extend(timings)
+
+    # Compute total wall-clock execution time for the entire pipeline.
+    total_time = time.perf_counter() - start_time
+
+    # Export the task timeline with pool startup and the steady-state run as parent spans.
+    trace_file, trace_summary = None, None
+    if trace_dir is not None:
+        trace_file = f"results/traces/threads-{num_threads}.json"
+        trace_summary = export_trace(trace_dir, trace_file, [('pool startup', pool_start, startup_time),
+                                                             ('run', start_time, total_time)])
+
+    # Enforce the cache size cap once all threads have finished.
+    if cache is not None:
+        removed, cache_bytes = cache.evict()
+        print(f"Result cache: {cache_bytes / 1024**2:.1f} MB, {removed} entries evicted")
+
+    # Close the shards and index their members once no worker can append.
+    archive_summary = None
+    if archive_dir is not None:
+        archive_summary = finalize_archive(archive_dir)
+
+    # Merge the workers' stage records now that every task has finished.
+    stage_profile, stage_records = None, None
+    if profile_dir is not None:
+        stage_profile, stage_records = collect_profile(profile_dir, keep_records=not windowed)
+
+    # Aggregate individual processing times to derive summary statistics.
+    if streaming and not windowed:
+        times.extend(results)
+    total_processing_time = times.total
+    avg_time_per_image = times.mean
+
+    # Display performance metrics for the current thread configuration.
+    print(f"\n=== Thread Pool Results ===")
+    print(f"Number of threads: {num_threads}")
+    print(f"Mode: {'streaming' if streaming else 'batch size ' + str(batch_size or 1)}")
+    if preview_scale is not None:
+        print(f"Preview decode: 1/{preview_scale} scale")
+    if edge_precision is not None:
+        print(f"Edge precision: {edge_precision}")
+    if point_ops is not None:
+        print(f"Point operations: {point_ops_label(point_ops)}")
+    print(f"Total images processed: {times.count}")
+    print(f"OpenCV threads per worker: {threads_per_worker} (CPU budget {cpu_budget})")
+    print(f"Pool startup time: {startup_time:.2f} seconds")
+    print(f"Total wall-clock time: {total_time:.2f} seconds")
+    print(f"Total processing time (sum): {total_processing_time:.2f} seconds")
+    print(f"Average time per image: {avg_time_per_image:.2f} seconds")
+    if archive_summary is not None:
+        print(f"Archived {archive_summary['members']} outputs in {archive_summary['shards']} shards "
+              f"({archive_summary['bytes'] / 1024**2:.1f} MB): {archive_dir}")
+    if stage_profile is not None:
+        print_profile(stage_profile)
+    if trace_summary is not None:
+        print_trace_summary(trace_summary)
+
+    # Same schema as the process-based implementations.
+    return {
+        'num_threads': num_threads,
+        'num_images': times.count,
+        'total_time': total_time,
+        'startup_time': startup_time,
+        'filters': filters,
+        'batch_size': batch_size,
+        'streaming': streaming,
+        'use_cache': use_cache,
+        'cpu_budget': cpu_budget,
+        'threads_per_worker': threads_per_worker,
+        'tile_threshold': tile_threshold,
+        'max_in_flight': max_in_flight,
+        'output_format': {name: codec.label for name, codec in codecs.items()},
+        'archive': archive_summary,
+        'preview_scale': preview_scale,
+        'edge_precision': edge_precision,
+        'point_ops': point_ops_label(point_ops),
+        'time_stats': times.as_dict(),
+        'stage_profile': stage_profile,
+        'stage_records': stage_records,
+        'trace_file': trace_file,
+        'trace_summary': trace_summary,
+        'processing_times': results
+    }
+
+def run_threads_experiment(image_folder, thread_counts=None, **pipeline_options):
+    """
+    Run the thread pool backend with different thread counts
+    Extra keyword options (e.g. filters, batch_size, streaming) are passed to every pipeline run.
+    """
+    # Use the same default configurations as the process-based experiments.
+    if thread_counts is None:
+        thread_counts = [1, 2, 4, 8]
+
+    results = {}
+
+    for num_threads in thread_counts:
+        print(f"\n{'='*50}")
+        print(f"Running with {num_threads} threads...")
+        print('='*50)
+
+        result = threads_pipeline(image_folder, num_threads, **pipeline_options)
+        results[num_threads] = result
+
+        # Short pause between runs, as in the other experiments.
+        time.sleep(2)
+
+    return results
+
+if __name__ == "__main__":
+    # Entry point for standalone execution of the thread pool experiment.
+    dataset_path = "food101_subset"
+
+    if os.path.exists(dataset_path):
+        results = run_threads_experiment(dataset_path)
+
+        # Persist results next to the other implementations' JSON files.
+        import json
+        Path("results/performance_data").mkdir(parents=True, exist_ok=True)
+        with open('results/performance_data/threads_results.json', 'w') as f:
+            json.dump(results, f, indent=2)
+        print("Results saved to: results/performance_data/threads_results.json")
+    else:
+        print(f"Dataset path '{dataset_path}' not found!")
@@ -0,0 +1,61 @@
+import concurrent.futures
+import numpy as np
+from image_filters import DEFAULT_GRAPH
+from thread_budget import worker_threads
+
+# Images with at least this many pixels are tiled (16 megapixels).
+DEFAULT_TILE_THRESHOLD = 16_000_000
+
+# Edge length of a tile before its halo is added.
+DEFAULT_TILE_SIZE = 1024
+
+def tile_grid(height, width, tile_size=DEFAULT_TILE_SIZE):
+    """Core regions (y0, y1, x0, x1) covering the image without overlap"""
+    return [(y, min(y + tile_size, height), x, min(x + tile_size, width))
+            for y in range(0, height, tile_size)
+            for x in range(0, width, tile_size)]
+
+def run_filters_tiled(img, filters, graph=DEFAULT_GRAPH, tile_size=DEFAULT_TILE_SIZE,
+                      max_workers=None):
+    """
+    Run graph filters on overlapping tiles in parallel and stitch the results
+
+    Each tile is read with the halo the requested filters need (1 px for the
+    3x3 Gaussian, Sobel and sharpen kernels) and the halo is cropped off
+    afterwards. Tiles on the image border get no halo on that side, so the
+    kernels apply their normal border handling there. Every filter then
+    computes each pixel from the same neighbourhood with the same
+    arithmetic, so the stitched output matches a full-frame run exactly,
+    for every edge precision; a filter whose result depended on the whole
+    frame (e.g. its mean) would not. The OpenCV calls release the GIL, so
+    threads run the tiles in parallel inside one worker.
+
+    max_workers defaults to the worker's thread budget (see
+    thread_budget.worker_threads), so tiling in every process of a pool
+    stays within the threads_per_worker / cpu_budget cap.
+    """
+    height, width = img.shape[:2]
+    halo = max(graph.halo(name) for name in filters)
+    outputs = {}
+
+    def process_tile(region):
+        y0, y1, x0, x1 = region
+        # Expand the core region by the halo, clamped to the image bounds.
+        py0, py1 = max(0, y0 - halo), min(height, y1 + halo)
+        px0, px1 = max(0, x0 - halo), min(width, x1 + halo)
+        results = graph.run({'bgr': img[py0:py1, px0:px1]}, filters)
+
+        # Crop the halo and copy the core into the full-size outputs.
+        for name, result in results.items():
+            if name not in outputs:
+                # setdefault keeps the first allocation if two tiles race here.
+                outputs.setdefault(name, np.empty((height, width) + result.shape[2:], dtype=result.dtype))
+            outputs[name][y0:y1, x0:x1] = result[y0 - py0:y1 - py0, x0 - px0:x1 - px0]
+
+    if max_workers is None:
+        max_workers = worker_threads()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # list() re-raises any exception from a tile.
+        list(executor.map(process_tile, tile_grid(height, width, tile_size)))
+
+    return {name: outputs[name] for name in filters}
@@ -0,0 +1,134 @@
+import os
+import json
+import time
+import shutil
+import threading
+
+# Exported Chrome/Perfetto traces; raw per-process event files live in a
+# temporary subfolder until the run is exported.
+TRACE_ROOT = os.path.join("results", "traces")
+
+# All timestamps are time.perf_counter() values. On Linux (and Windows and
+# macOS) it reads a system-wide monotonic clock, so spans recorded in
+# different worker processes line up on one timeline.
+
+def new_trace_dir(root=TRACE_ROOT):
+    """Create an empty folder for one run's raw trace events"""
+    trace_dir = os.path.join(root, ".raw", f"{os.getpid()}-{time.perf_counter_ns()}")
+    os.makedirs(trace_dir)
+    return trace_dir
+
+def span(name, cat, start, seconds, args=None):
+    """One complete event on the calling process and thread (times in seconds)"""
+    event = {'name': name, 'cat': cat, 'ts': start, 'dur': seconds,
+             'pid': os.getpid(), 'tid': threading.get_native_id()}
+    if args:
+        event['args'] = args
+    return event
+
+def write_events(trace_dir, events):
+    """Append events to this process's raw trace file"""
+    # Opened and closed per call so nothing is lost when a pool is terminated.
+    path = os.path.join(trace_dir, f"{os.getpid()}.jsonl")
+    with open(path, 'a') as f:
+        f.write("".join(json.dumps(event) + "\n" for event in events))
+
+def write_task_trace(trace_dir, image_path, start, end, timer=None, cat='task'):
+    """Record one image task and, if a StageTimer ran, its nested stages"""
+    events = [span(os.path.basename(image_path), cat, start, end - start, {'image': image_path})]
+    if timer is not None:
+        events.extend(span(name, 'stage', stage_start, seconds)
+                      for name, stage_start, seconds in timer.spans)
+    write_events(trace_dir, events)
+
+def load_events(trace_dir):
+    """Read every raw event of a run"""
+    events = []
+    for name in sorted(os.listdir(trace_dir)):
+        with open(os.path.join(trace_dir, name), 'r') as f:
+            for line in f:
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    continue  # A line cut short by a killed worker
+    return events
+
+def summarize_trace(events, run_start, run_end):
+    """
+    Per-worker busy time, utilisation and idle tail from task spans
+    Workers are keyed "pid/tid", so thread pool workers are told apart too.
+    The tail is the time between a worker's last task and the end of the
+    run: large, uneven tails are load imbalance at the end of the dataset.
+    """
+    workers = {}
+    for event in events:
+        if event['cat'] not in ('task', 'compute'):
+            continue
+        worker_id = f"{event['pid']}/{event['tid']}"
+        worker = workers.setdefault(worker_id, {'tasks': 0, 'busy': 0.0,
+                                                'first_start': event['ts'], 'last_end': 0.0})
+        worker['tasks'] += 1
+        worker['busy'] += event['dur']
+        worker['first_start'] = min(worker['first_start'], event['ts'])
+        worker['last_end'] = max(worker['last_end'], event['ts'] + event['dur'])
+
+    run_time = run_end - run_start
+    summary = {}
+    for worker_id, worker in sorted(workers.items()):
+        summary[worker_id] = {
+            'tasks': worker['tasks'],
+            'busy_time': worker['busy'],
+            'utilization': worker['busy'] / run_time if run_time > 0 else 0.0,
+            'start_delay': worker['first_start'] - run_start,
+            'tail_idle': run_end - worker['last_end'],
+        }
+    return summary
+
+def export_trace(trace_dir, output_path, parent_spans, process_names=None):
+    """
+    Merge a run's raw events into a Chrome trace JSON (chrome://tracing, Perfetto)
+
+    parent_spans are (name, start, seconds) spans recorded in the parent,
+    e.g. pool startup and the steady-state run; the first one sets time zero
+    and the last one is the run window used for the per-worker summary.
+    process_names maps a pid to a display name.
+    Returns the per-worker summary (see summarize_trace).
+    """
+    events = load_events(trace_dir) + [span(name, 'run', start, seconds)
+                                       for name, start, seconds in parent_spans]
+    shutil.rmtree(trace_dir, ignore_errors=True)
+    try:
+        os.rmdir(os.path.dirname(trace_dir))  # Only succeeds once no other run is in progress
+    except OSError:
+        pass
+
+    origin = parent_spans[0][1]
+    run_name, run_start, run_seconds = parent_spans[-1]
+    summary = summarize_trace(events, run_start, run_start + run_seconds)
+
+    # Chrome trace timestamps are microseconds; start the timeline at zero.
+    trace_events = []
+    for event in events:
+        event['ph'] = 'X'
+        event['ts'] = (event['ts'] - origin) * 1e6
+        event['dur'] = event['dur'] * 1e6
+        trace_events.append(event)
+
+    names = dict(process_names or {})
+    names.setdefault(os.getpid(), "main")
+    for pid in sorted({event['pid'] for event in events}):
+        trace_events.append({'name': 'process_name', 'ph': 'M', 'pid': pid,
+                             'args': {'name': names.get(pid, f"worker {pid}")}})
+
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    with open(output_path, 'w') as f:
+        json.dump({'traceEvents': trace_events, 'displayTimeUnit': 'ms'}, f)
+    print(f"Trace saved to: {output_path} (open in https://ui.perfetto.dev)")
+    return summary
+
+def print_trace_summary(summary):
+    """Print utilisation and idle tail of every worker"""
+    print(f"{'Worker':<16} {'Tasks':<7} {'Busy (s)':<10} {'Util':<7} {'Start (s)':<10} {'Tail (s)':<10}")
+    for worker_id, worker in summary.items():
+        print(f"{worker_id:<16} {worker['tasks']:<7} {worker['busy_time']:<10.2f} "
+              f"{worker['utilization']:<7.0%} {worker['start_delay']:<10.3f} {worker['tail_idle']:<10.3f}")